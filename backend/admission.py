@@ -0,0 +1,272 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Awaitable, Deque, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is turned away instead of queued.
+
+    Attributes:
+        status_code (int): 429 for a client over its rate limit, 503 when the service is saturated.
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, reason: str, status_code: int, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """
+    The point in time after which nobody is waiting for a request's answer any more.
+
+    Clients can shorten the server's default with an `X-Request-Timeout`
+    header in seconds (test_request.py sends its own 30 s timeout), so the
+    work is abandoned when the client has given up rather than finished for
+    nobody.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default: Optional[float] = None) -> "Deadline":
+        if default is None:
+            default = float(os.getenv("ASK_DEADLINE_SECONDS", "30"))
+        seconds = default
+        if value:
+            try:
+                seconds = min(default, max(0.0, float(value)))
+            except ValueError:
+                pass
+        return cls(seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Awaits `awaitable`, cancelling it and raising `DeadlineExceeded` when time runs out."""
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("deadline exceeded") from None
+
+    async def iterate(self, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+        """Yields from `iterator` until it ends or the deadline passes, then closes it."""
+        try:
+            while True:
+                try:
+                    item = await self.run(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            await iterator.aclose()
+
+
+class TokenBucketLimiter:
+    """
+    Per-client rate limiting with a token bucket.
+
+    Each client gets `burst` tokens, refilled at `rate_per_minute`; a request
+    takes one token or is refused with the time until the next one. Only the
+    `max_clients` most recently seen clients are tracked. A rate of 0
+    disables the limit.
+    """
+
+    def __init__(self, rate_per_minute: Optional[float] = None, burst: Optional[int] = None, max_clients: int = 10000):
+        if rate_per_minute is None:
+            rate_per_minute = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+        if burst is None:
+            burst = int(os.getenv("RATE_LIMIT_BURST", "10"))
+        self.rate = max(0.0, rate_per_minute) / 60
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """
+        Takes a token for `client`.
+
+        Args:
+            client (str): The client's identity, e.g. its IP address.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the seconds until it may retry.
+        """
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests being worked on, with a bounded FIFO queue in front.
+
+    A request that arrives when all `max_concurrency` slots are busy waits in
+    the queue, unless the queue already holds `max_queue` requests or the
+    expected wait (queue position times the recent average service time)
+    wouldn't fit in its deadline; then it is refused at once. Refusing early
+    keeps the latency of the requests that are admitted bounded, instead of
+    letting every request in a burst time out.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, max_queue: Optional[int] = None):
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("ASK_MAX_CONCURRENCY", "16"))
+        if max_queue is None:
+            max_queue = int(os.getenv("ASK_MAX_QUEUE", "32"))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds: Optional[float] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        # Slots free up roughly every service_time / max_concurrency seconds
+        return (self._service_seconds or 0.0) * position / self.max_concurrency
+
+    async def acquire(self, deadline: Deadline) -> float:
+        """
+        Waits for a slot.
+
+        Args:
+            deadline (Deadline): The request's deadline; it won't be queued past it.
+
+        Returns:
+            float: The time the slot was granted, to pass back to `release()`.
+
+        Raises:
+            Overloaded: If the queue is full or the wait wouldn't fit in the deadline.
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return time.perf_counter()
+
+        position = len(self._waiters) + 1
+        wait = self.expected_wait(position)
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded("too many requests queued", 503, wait)
+        if wait > deadline.remaining():
+            raise Overloaded("expected queue wait exceeds the deadline", 503, wait)
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, deadline.remaining())
+        except asyncio.TimeoutError:
+            raise Overloaded("deadline passed while queued", 503, self.expected_wait(len(self._waiters))) from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the client went away
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+        return time.perf_counter()
+
+    def release(self, started: Optional[float] = None):
+        """
+        Frees a slot, handing it straight to the oldest waiter if there is one.
+
+        Args:
+            started (Optional[float]): What `acquire()` returned; feeds the service time estimate.
+        """
+        if started is not None:
+            seconds = time.perf_counter() - started
+            self._service_seconds = seconds if self._service_seconds is None else 0.9 * self._service_seconds + 0.1 * seconds
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """
+    Decides whether a question is answered now, queued, or turned away.
+
+    Rate limiting per client comes first (429), then the global concurrency
+    limit with its bounded queue (503). Both refusals carry a Retry-After.
+    """
+
+    def __init__(self, limiter: Optional[ConcurrencyLimiter] = None, rate_limiter: Optional[TokenBucketLimiter] = None):
+        self.limiter = limiter or ConcurrencyLimiter()
+        self.rate_limiter = rate_limiter or TokenBucketLimiter()
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "overloaded": 0}
+
+    async def enter(self, client: str, deadline: Deadline) -> float:
+        """
+        Admits a request, waiting in the queue if needed.
+
+        Args:
+            client (str): The client's identity for rate limiting.
+            deadline (Deadline): The request's deadline.
+
+        Returns:
+            float: A token to pass to `leave()` when the request is done.
+
+        Raises:
+            Overloaded: If the request is refused.
+        """
+        wait = self.rate_limiter.take(client)
+        if wait:
+            self.rejected["rate_limited"] += 1
+            raise Overloaded("rate limit exceeded", 429, wait)
+        try:
+            started = await self.limiter.acquire(deadline)
+        except Overloaded:
+            self.rejected["overloaded"] += 1
+            raise
+        self.admitted += 1
+        return started
+
+    def leave(self, started: float):
+        self.limiter.release(started)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.limiter.active,
+            "queued": self.limiter.queued,
+            "max_concurrency": self.limiter.max_concurrency,
+            "max_queue": self.limiter.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches LLM answers keyed on the question embedding and the retrieved context.
+
+    A lookup hits when a cached question's embedding is within
+    `similarity_threshold` cosine similarity of the new one *and* retrieval
+    returned the same set of document IDs, so a paraphrase of an earlier
+    question reuses its answer but a question that pulls different context
+    does not. Entries are evicted least-recently-used once `max_entries` is
+    reached and expire after `ttl_seconds`. If `generation_fn` is given, its
+    value is checked on every call and the whole cache is dropped when it
+    changes (e.g. after the collection is re-ingested).
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: Optional[float] = None,
+        generation_fn: Optional[Callable[[], object]] = None,
+    ):
+        if max_entries is None:
+            max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+        if similarity_threshold is None:
+            similarity_threshold = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.generation_fn = generation_fn
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, Tuple[str, ...], str, float]]" = OrderedDict()
+        self._by_context: Dict[Tuple[str, ...], List[int]] = {}
+        self._next_key = 0
+        self._generation = generation_fn() if generation_fn else None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _context_key(doc_ids: Sequence[str]) -> Tuple[str, ...]:
+        return tuple(sorted(doc_ids))
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_generation(self):
+        if self.generation_fn is None:
+            return
+        generation = self.generation_fn()
+        if generation != self._generation:
+            self._generation = generation
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._by_context.clear()
+
+    def _remove(self, key: int):
+        _, context_key, _, _ = self._entries.pop(key)
+        keys = self._by_context[context_key]
+        keys.remove(key)
+        if not keys:
+            del self._by_context[context_key]
+
+    def get(self, embedding, doc_ids: Sequence[str]) -> Optional[str]:
+        """
+        Returns a cached answer for a similar question with the same context.
+
+        Args:
+            embedding: The question embedding.
+            doc_ids (Sequence[str]): IDs of the documents retrieved for the question.
+
+        Returns:
+            Optional[str]: The cached answer, or None on a miss.
+        """
+        with self._lock:
+            self._check_generation()
+            context_key = self._context_key(doc_ids)
+            candidates = self._by_context.get(context_key, [])
+
+            now = time.monotonic()
+            for key in [k for k in candidates if now - self._entries[k][3] > self.ttl_seconds]:
+                self._remove(key)
+            candidates = self._by_context.get(context_key, [])
+
+            if candidates:
+                query = self._normalize(embedding)
+                matrix = np.stack([self._entries[key][0] for key in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][2]
+
+            self.misses += 1
+            return None
+
+    def put(self, embedding, doc_ids: Sequence[str], answer: str):
+        """
+        Stores an answer for a question embedding and its retrieved context.
+
+        Args:
+            embedding: The question embedding.
+            doc_ids (Sequence[str]): IDs of the documents retrieved for the question.
+            answer (str): The LLM's answer.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_generation()
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+            context_key = self._context_key(doc_ids)
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (self._normalize(embedding), context_key, answer, time.monotonic())
+            self._by_context.setdefault(context_key, []).append(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
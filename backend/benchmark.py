@@ -0,0 +1,452 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from test_request import SAMPLE_QUESTIONS, SPECIFIC_QUESTIONS
+from timing import parse_server_timing
+
+STAGES = ("embed", "search", "prompt", "generate")
+PERCENTILES = (50, 95, 99)
+
+PROGRAMS = [
+    "Sunday School", "Quran Academy", "Safwah Youth Seminary", "Uswah Adult Seminary", "free health clinic",
+    "youth group", "nikkah services", "Islamic counseling", "summer school", "Jumuah prayer", "Taraweeh",
+    "sisters' halaqa", "food pantry", "new Muslim class", "Arabic class", "family night",
+]
+ROOMS = ["Main Hall", "Multipurpose Room", "Gym", "Classroom 4", "Library", "Sisters' Prayer Hall", "Clinic"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+QUESTION_TEMPLATES = [
+    "When does the {program} meet?",
+    "Where is the {program} held?",
+    "How do I register for the {program}?",
+    "Is the {program} open to everyone?",
+    "Who runs the {program}?",
+    "What happens in the {program} on {day}?",
+    "Is there a {program} this {day}?",
+    "Which room is the {program} in?",
+]
+FIXTURE_FACTS = [
+    "The Islamic Center of Frisco was established in May 2007. We are located approximately 27 miles north of downtown Dallas.",
+    "Contact Us Address: 11137 Frisco St, Frisco TX 75033 Main Phone: (469) 252-4532 | contact@friscomasjid.org EIN: 20-8679388",
+    "Sunday School is run by more than 100 volunteers and serves over 1,000 students, with a waitlist every year.",
+    "The Safwah Youth Seminary focuses on Islamic studies, character building and leadership for high school students.",
+    "The free health clinic serves uninsured patients every Saturday; call the clinic phone at (469) 213-8707.",
+    "The Uswah Adult Seminary is a part-time program of Islamic studies for adults.",
+    "The Quran Academy offers full-time hifz, part-time hifz and tajweed programs.",
+]
+# Which of FIXTURE_FACTS answers each question; these only hold for the fixture, not for the real site
+FIXTURE_GOLD = {
+    "When was the Islamic Center of Frisco established?": [0],
+    "How many volunteers run the Sunday School?": [2],
+    "How many students are in Sunday School and how many are on the waitlist?": [2],
+    "What does the Safwah Youth Seminary program focus on?": [3],
+    "Tell me about the free health clinic": [4],
+    "What is the Uswah Adult Seminary program?": [5],
+    "Where is ICF located relative to downtown Dallas?": [0],
+    "What programs does the Quran Academy offer?": [6],
+    "When was ICF established?": [0],
+    "Tell me about the Sunday School program": [2],
+    "What health services do you offer?": [4],
+    "How many students are in Sunday School?": [2],
+}
+
+
+def synthetic_questions(count: int, seed: int = 0) -> List[str]:
+    """
+    Generates a deterministic set of questions about ICF programs.
+
+    Args:
+        count (int): How many questions to generate.
+        seed (int): Random seed, so runs are comparable.
+
+    Returns:
+        List[str]: The questions.
+    """
+    rng = random.Random(seed)
+    return [
+        rng.choice(QUESTION_TEMPLATES).format(program=rng.choice(PROGRAMS), day=rng.choice(DAYS))
+        for _ in range(count)
+    ]
+
+
+def question_corpus(name: str, synthetic_count: int = 200, seed: int = 0) -> List[str]:
+    corpora = {
+        "sample": list(SAMPLE_QUESTIONS),
+        "specific": list(SPECIFIC_QUESTIONS),
+        "synthetic": synthetic_questions(synthetic_count, seed),
+    }
+    if name == "all":
+        return [question for corpus in corpora.values() for question in corpus]
+    return corpora[name]
+
+
+def fixture_documents(count: int, seed: int = 0) -> List[Tuple[str, str, dict]]:
+    """
+    Builds the documents of the fixture collection: the known facts plus generated program listings.
+
+    Args:
+        count (int): How many generated listings to add.
+        seed (int): Random seed.
+
+    Returns:
+        List[Tuple[str, str, dict]]: (id, text, metadata) triples.
+    """
+    rng = random.Random(seed)
+    documents = [(f"fact_{i}", text, {"source": "fixture://about", "chunk_index": i})
+                 for i, text in enumerate(FIXTURE_FACTS)]
+    for i in range(count):
+        program, room, day = rng.choice(PROGRAMS), rng.choice(ROOMS), rng.choice(DAYS)
+        text = (f"The {program} meets every {day} at {rng.randint(1, 9)}:{rng.choice(['00', '30'])} PM in the {room}. "
+                f"Please register at the front desk or online; contact the {program} coordinator with questions.")
+        documents.append((f"event_{i}", text, {"source": f"fixture://events/{i // 10}", "chunk_index": i % 10}))
+    return documents
+
+
+def build_fixture_collection(path: str, count: int, seed: int = 0):
+    """Embeds the fixture documents into a fresh Chroma collection and keyword index at `path`."""
+    from encoder import encode_texts
+    from keyword_index import get_keyword_index
+    from retrieval import get_store
+
+    documents = fixture_documents(count, seed)
+    ids = [doc_id for doc_id, _, _ in documents]
+    texts = [text for _, text, _ in documents]
+    store = get_store(path)
+    store.collection.upsert(
+        ids=ids, documents=texts, metadatas=[metadata for _, _, metadata in documents], embeddings=encode_texts(texts)
+    )
+    keyword_index = get_keyword_index(store.path, store.collection_name)
+    keyword_index.add(ids, texts)
+    keyword_index.save()
+    store.mark_ingested()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+@dataclass
+class Sample:
+    latency_ms: float
+    status: int
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    questions: List[str],
+    total_requests: int,
+    concurrency: int,
+) -> Tuple[List[Sample], float]:
+    """
+    Replays questions against /ask with `concurrency` requests in flight.
+
+    Every request starts a new session, so each one runs the full pipeline.
+
+    Args:
+        client (httpx.AsyncClient): Client pointed at the app.
+        questions (List[str]): The corpus, cycled through in order.
+        total_requests (int): How many requests to send.
+        concurrency (int): How many requests to keep in flight.
+
+    Returns:
+        Tuple[List[Sample], float]: One sample per request and the wall-clock duration in seconds.
+    """
+    samples: List[Sample] = []
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request
+        while next_request < total_requests:
+            question = questions[next_request % len(questions)]
+            next_request += 1
+            started = time.perf_counter()
+            try:
+                response = await client.post("/ask", json={"question": question})
+                status = response.status_code
+                stages = parse_server_timing(response.headers.get("server-timing", ""))
+            except httpx.HTTPError:
+                status, stages = 0, {}
+            samples.append(Sample((time.perf_counter() - started) * 1000, status, stages))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: List[Sample], elapsed: float) -> dict:
+    ok = [sample for sample in samples if sample.status == 200]
+    rejected = [sample for sample in samples if sample.status in (429, 503)]
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok) - len(rejected),
+        "rejected": len(rejected),
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {},
+        "stages_ms": {},
+    }
+    latencies = [sample.latency_ms for sample in ok]
+    summary["latency_ms"] = {f"p{pct}": round(percentile(latencies, pct), 2) for pct in PERCENTILES}
+    summary["latency_ms"]["mean"] = round(sum(latencies) / len(latencies), 2) if latencies else 0.0
+    stage_names = list(STAGES) + sorted({stage for sample in ok for stage in sample.stages} - set(STAGES))
+    for stage in stage_names:
+        values = [sample.stages[stage] for sample in ok if stage in sample.stages]
+        if values:
+            summary["stages_ms"][stage] = {f"p{pct}": round(percentile(values, pct), 2) for pct in PERCENTILES}
+    return summary
+
+
+def print_report(summary: dict):
+    config = summary.get("config", {})
+    print(f"[✓] {summary['requests']} request(s) at concurrency {config.get('concurrency')} "
+          f"against {config.get('target')} in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['errors']} error(s), {summary.get('rejected', 0)} rejected)")
+    print(f"  throughput  {summary['rps']:9.1f} req/s")
+    print(f"  {'stage':<10} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    latency = summary["latency_ms"]
+    print(f"  {'total':<10} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}")
+    for stage, values in summary["stages_ms"].items():
+        print(f"  {stage:<10} {values['p50']:>9.1f} {values['p95']:>9.1f} {values['p99']:>9.1f}")
+
+
+def compare_vector_backends(path: str, questions: List[str], n_results: int = 5) -> dict:
+    """
+    Measures recall and latency of the Chroma (HNSW) and NumPy vector backends on the same questions.
+
+    Recall@k is measured against a batched exact float32 search. The NumPy
+    float32 backend only misses where documents tie for the k-th place
+    (the fixture's generated listings often do), which the single-query
+    and batched matrix products may order differently.
+
+    Args:
+        path (str): The Chroma directory to search.
+        questions (List[str]): The questions to embed and search.
+        n_results (int): k, the documents returned per question.
+
+    Returns:
+        dict: Per backend, recall@k, per-query latency percentiles, batched latency and index size.
+    """
+    from encoder import encode_texts
+    from retrieval import get_store
+    from vector_index import get_vector_index
+
+    store = get_store(path)
+    embeddings = encode_texts(questions)
+    exact = get_vector_index(store, "float32")
+    truth_ids = [set(ids) for ids in exact.query_batch(embeddings, n_results=n_results)["ids"]]
+    backends = {"chroma": store, "numpy-float32": exact, "numpy-int8": get_vector_index(store, "int8")}
+
+    report = {"questions": len(questions), "k": n_results, "documents": len(exact), "backends": {}}
+    for name, backend in backends.items():
+        backend.query(embeddings[0].tolist(), n_results=n_results)  # loads the HNSW segments or the export
+        latencies, hits = [], 0
+        for embedding, expected in zip(embeddings, truth_ids):
+            started = time.perf_counter()
+            result = backend.query(embedding.tolist(), n_results=n_results)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(expected & set(result["ids"][0]))
+        entry = {
+            "recall_at_k": round(hits / max(1, sum(len(expected) for expected in truth_ids)), 4),
+            "latency_ms": {f"p{pct}": round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+        }
+        if hasattr(backend, "query_batch"):
+            started = time.perf_counter()
+            backend.query_batch(embeddings, n_results=n_results)
+            entry["batched_ms_per_query"] = round((time.perf_counter() - started) * 1000 / len(questions), 4)
+            entry["index_bytes"] = backend.stats()["bytes"]
+        report["backends"][name] = entry
+    return report
+
+
+def print_backend_report(report: dict):
+    print(f"[✓] {report['questions']} question(s), top {report['k']} of {report['documents']} document(s); "
+          f"recall against exact float32 search")
+    print(f"  {'backend':<14} {'recall':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'batched':>8} {'size':>10}  (ms, bytes)")
+    for name, entry in report["backends"].items():
+        latency = entry["latency_ms"]
+        batched = f"{entry['batched_ms_per_query']:>8.3f}" if "batched_ms_per_query" in entry else f"{'-':>8}"
+        size = f"{entry['index_bytes']:>10}" if "index_bytes" in entry else f"{'-':>10}"
+        print(f"  {name:<14} {entry['recall_at_k']:>7.3f} {latency['p50']:>8.3f} {latency['p95']:>8.3f} "
+              f"{latency['p99']:>8.3f} {batched} {size}")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Lists the metrics that got worse than the baseline by more than `tolerance`.
+
+    Args:
+        summary (dict): This run's summary.
+        baseline (dict): A saved summary.
+        tolerance (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: One line per regression; empty if none.
+    """
+    regressions = []
+
+    def check(name: str, current: float, previous: float):
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{name}: {previous:.1f} → {current:.1f} ms (+{(current / previous - 1) * 100:.0f}%)")
+
+    for pct in PERCENTILES:
+        key = f"p{pct}"
+        check(f"total {key}", summary["latency_ms"][key], baseline.get("latency_ms", {}).get(key, 0))
+    for stage, values in summary["stages_ms"].items():
+        previous = baseline.get("stages_ms", {}).get(stage, {})
+        check(f"{stage} p95", values["p95"], previous.get("p95", 0))
+    if baseline.get("rps") and summary["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput: {baseline['rps']:.1f} → {summary['rps']:.1f} req/s")
+    return regressions
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    # Imported here so the environment set up in main() is in place before the app's modules load
+    import ollamaLLM
+
+    async with ollamaLLM.lifespan(ollamaLLM.app):
+        transport = httpx.ASGITransport(app=ollamaLLM.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+            yield client
+
+
+async def run(args) -> dict:
+    questions = question_corpus(args.corpus, args.synthetic, args.seed)
+    total = args.requests or len(questions)
+
+    if args.url:
+        client_context = httpx.AsyncClient(
+            base_url=args.url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency),
+        )
+    else:
+        client_context = in_process_client(args.timeout)
+
+    async with client_context as client:
+        if args.warmup:
+            await run_load(client, questions, args.warmup, args.concurrency)
+        samples, elapsed = await run_load(client, questions, total, args.concurrency)
+
+    summary = summarize(samples, elapsed)
+    summary["config"] = {
+        "target": args.url or "in-process",
+        "corpus": args.corpus,
+        "questions": len(questions),
+        "concurrency": args.concurrency,
+        "llm_backend": os.getenv("LLM_BACKEND"),
+        "fake_llm_latency_ms": os.getenv("FAKE_LLM_LATENCY_MS"),
+        "answer_cache": args.answer_cache,
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the /ask pipeline and report tail latency.")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process.")
+    parser.add_argument("--corpus", choices=["sample", "specific", "synthetic", "all"], default="all")
+    parser.add_argument("--synthetic", type=int, default=200, help="Size of the synthetic question set.")
+    parser.add_argument("--requests", type=int, default=0, help="Requests to send (default: one pass over the corpus).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="Untimed requests sent first.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-backend", default="fake", help="LLM_BACKEND for the in-process app (default: fake).")
+    parser.add_argument("--fake-latency-ms", type=float, default=300.0, help="Simulated time to first token.")
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the semantic answer cache on.")
+    parser.add_argument("--chroma-path", help="Use an existing Chroma directory instead of a fixture collection.")
+    parser.add_argument("--fixture-size", type=int, default=500, help="Generated documents in the fixture collection.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write this run's summary as a baseline, e.g. benchmarks/baseline.json.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare against a saved baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    parser.add_argument("--compare-backends", action="store_true",
+                        help="Instead of load-testing, compare recall and latency of the Chroma and NumPy vector backends.")
+    args = parser.parse_args(argv)
+    if args.compare_backends and args.url:
+        parser.error("--compare-backends searches a local collection; it can't be combined with --url")
+
+    fixture_dir = None
+    if not args.url:
+        os.environ.setdefault("LLM_BACKEND", args.llm_backend)
+        os.environ.setdefault("FAKE_LLM_LATENCY_MS", str(args.fake_latency_ms))
+        os.environ.setdefault("SESSION_DB", "")
+        # Every in-process request comes from the same client, which the per-client rate limit would throttle
+        os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+        if not args.answer_cache:
+            os.environ["ANSWER_CACHE_MAX_ENTRIES"] = "0"
+        if args.chroma_path:
+            os.environ["CHROMA_PATH"] = args.chroma_path
+        else:
+            fixture_dir = tempfile.TemporaryDirectory(prefix="ask-benchmark-")
+            os.environ["CHROMA_PATH"] = fixture_dir.name
+            # Keep the run's embedding cache with the fixture, so runs don't warm each other up
+            os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(fixture_dir.name, "embedding_cache"))
+            build_fixture_collection(fixture_dir.name, args.fixture_size, args.seed)
+
+    if args.compare_backends:
+        try:
+            report = compare_vector_backends(
+                os.environ["CHROMA_PATH"], question_corpus(args.corpus, args.synthetic, args.seed)
+            )
+        finally:
+            if fixture_dir:
+                fixture_dir.cleanup()
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_backend_report(report)
+        return 0
+
+    try:
+        summary = asyncio.run(run(args))
+    finally:
+        if fixture_dir:
+            fixture_dir.cleanup()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"[✓] Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[✗] {len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"[✓] No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
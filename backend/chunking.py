@@ -0,0 +1,247 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Union
+
+from bs4 import BeautifulSoup
+from bs4.element import Comment
+
+from encoder import MODEL_NAME
+from retrieval import CHROMA_PATH
+
+BOILERPLATE_PATH = os.path.join(CHROMA_PATH, "boilerplate.json")
+
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul",
+}
+INVISIBLE_PARENTS = {"style", "script", "head", "title", "meta", "noscript", "template", "[document]"}
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    url: str
+    index: int
+    tokens: int
+
+    @property
+    def metadata(self) -> dict:
+        return {"source": self.url, "chunk_index": self.index}
+
+
+def tag_visible(element) -> bool:
+    if element.parent.name in INVISIBLE_PARENTS:
+        return False
+    if isinstance(element, Comment):
+        return False
+    return True
+
+
+def _block_ancestor(element):
+    for parent in element.parents:
+        if parent.name in BLOCK_TAGS:
+            return parent
+    return None
+
+
+def extract_blocks(html_content: Union[str, bytes, mmap.mmap], parser: str = "html.parser") -> List[str]:
+    """
+    Splits a page into its visible text blocks, in document order.
+
+    Text nodes that share the same nearest block-level element (p, li, td,
+    h1, div, ...) are joined into one block, so headings, paragraphs and list
+    items stay separate units for boilerplate detection and chunking.
+
+    Args:
+        html_content: The page HTML.
+        parser (str): BeautifulSoup parser backend.
+
+    Returns:
+        List[str]: Whitespace-normalized text blocks.
+    """
+    if isinstance(html_content, mmap.mmap):
+        html_content = html_content[:]
+    soup = BeautifulSoup(html_content, parser)
+
+    blocks = []
+    parts: List[str] = []
+    current = None
+    for text in soup.find_all(string=True):
+        if not tag_visible(text):
+            continue
+        normalized = " ".join(text.split())
+        if not normalized:
+            continue
+        block = _block_ancestor(text)
+        if block is not current and parts:
+            blocks.append(" ".join(parts))
+            parts = []
+        current = block
+        parts.append(normalized)
+    if parts:
+        blocks.append(" ".join(parts))
+    return blocks
+
+
+class BoilerplateFilter:
+    """
+    Learns which text blocks repeat across pages (navigation, header, footer).
+
+    Every observed page contributes one vote per distinct block fingerprint
+    (a hash of the block's case- and whitespace-normalized text). A block is
+    boilerplate once it has been seen on at least `min_pages` pages and on at
+    least `min_ratio` of all pages observed. Counts are persisted so that
+    single-page ingestion and the next run start from what was learned.
+    """
+
+    def __init__(self, path: Optional[str] = BOILERPLATE_PATH, min_pages: int = 3, min_ratio: float = 0.5,
+                 max_pages: int = 10000):
+        self.path = path
+        self.min_pages = min_pages
+        self.min_ratio = min_ratio
+        self.max_pages = max_pages
+        self.page_count = 0
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.page_count = data.get("page_count", 0)
+            self.counts.update(data.get("counts", {}))
+
+    @staticmethod
+    def fingerprint(block: str) -> str:
+        return hashlib.sha1(" ".join(block.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+    def observe(self, blocks: Iterable[str]):
+        """Records one page's blocks."""
+        with self._lock:
+            self.counts.update({self.fingerprint(block) for block in blocks})
+            self.page_count += 1
+            # Halve old votes once in a while so the site's current layout dominates
+            if self.page_count > self.max_pages:
+                self.page_count //= 2
+                self.counts = Counter({fp: n // 2 for fp, n in self.counts.items() if n // 2})
+
+    def is_boilerplate(self, block: str) -> bool:
+        if self.page_count < self.min_pages:
+            return False
+        seen_on = self.counts.get(self.fingerprint(block), 0)
+        return seen_on >= self.min_pages and seen_on >= self.min_ratio * self.page_count
+
+    def filter(self, blocks: Iterable[str]) -> List[str]:
+        return [block for block in blocks if not self.is_boilerplate(block)]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"page_count": self.page_count, "counts": self.counts}, f)
+        os.replace(tmp_path, self.path)
+
+
+_token_counter: Optional[Callable[[str], int]] = None
+
+
+def get_token_counter() -> Callable[[str], int]:
+    """
+    Returns a function that counts embedding-model tokens in a string.
+
+    Uses the embedding model's own tokenizer, so chunk sizes line up with what
+    the model actually sees; falls back to an estimate of 1.3 tokens per word
+    when the tokenizer can't be loaded.
+
+    Returns:
+        Callable[[str], int]: The token counter.
+    """
+    global _token_counter
+    if _token_counter is None:
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            _token_counter = lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception:
+            _token_counter = lambda text: int(len(text.split()) * 1.3) + 1
+    return _token_counter
+
+
+class TokenChunker:
+    """
+    Packs text blocks into chunks sized in embedding-model tokens.
+
+    Whole blocks are packed greedily up to `max_tokens`; a block that is too
+    large on its own is split on sentence boundaries, then on words. Each
+    chunk after the first repeats trailing blocks of the previous one, up to
+    `overlap_tokens`. Chunk order follows the page.
+    """
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 32, min_tokens: int = 16,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.count_tokens = count_tokens or get_token_counter()
+
+    def _split(self, block: str) -> List[str]:
+        if self.count_tokens(block) <= self.max_tokens:
+            return [block]
+        units = []
+        for sentence in SENTENCE_END.split(block):
+            if self.count_tokens(sentence) <= self.max_tokens:
+                units.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, int(len(words) * self.max_tokens / self.count_tokens(sentence)))
+            units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+        return units
+
+    def chunk(self, blocks: Iterable[str], url: str = "") -> List[Chunk]:
+        """
+        Chunks one page.
+
+        Args:
+            blocks (Iterable[str]): The page's text blocks, boilerplate already removed.
+            url (str): Source URL, kept on each chunk.
+
+        Returns:
+            List[Chunk]: Chunks in page order.
+        """
+        units = [(unit, self.count_tokens(unit)) for block in blocks for unit in self._split(block)]
+
+        chunks: List[Chunk] = []
+        current: List[tuple] = []
+        current_tokens = 0
+        fresh = 0
+
+        def emit():
+            if current_tokens >= self.min_tokens:
+                chunks.append(Chunk("\n".join(unit for unit, _ in current), url, len(chunks), current_tokens))
+
+        for unit, tokens in units:
+            if current and current_tokens + tokens > self.max_tokens:
+                emit()
+                # Carry trailing units into the next chunk as overlap
+                overlap, overlap_tokens = [], 0
+                for prev in reversed(current):
+                    if overlap_tokens + prev[1] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_tokens += prev[1]
+                current, current_tokens, fresh = overlap, overlap_tokens, 0
+            current.append((unit, tokens))
+            current_tokens += tokens
+            fresh += 1
+        if current and fresh:
+            emit()
+        return chunks
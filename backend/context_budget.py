@@ -0,0 +1,250 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Set
+
+WORD = re.compile(r"\S+")
+
+_llm_token_counter: Optional[Callable[[str], int]] = None
+
+
+def get_llm_token_counter() -> Callable[[str], int]:
+    """
+    Returns a function that counts chat-model tokens in a string.
+
+    Uses tiktoken's o200k_base encoding (gpt-4o family) when tiktoken is
+    installed, and an estimate of 4 characters per token otherwise.
+
+    Returns:
+        Callable[[str], int]: The token counter.
+    """
+    global _llm_token_counter
+    if _llm_token_counter is None:
+        try:
+            import tiktoken
+
+            encoding = tiktoken.get_encoding("o200k_base")
+            _llm_token_counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception:
+            _llm_token_counter = lambda text: (len(text) + 3) // 4
+    return _llm_token_counter
+
+
+@dataclass
+class ContextPiece:
+    text: str
+    score: float
+    source: Optional[str] = None
+    first_index: Optional[int] = None
+    last_index: Optional[int] = None
+    doc_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    pieces: List[ContextPiece]
+    tokens: int
+    dropped_duplicates: int = 0
+    dropped_over_budget: int = 0
+
+
+def _word_overlap(left: str, right: str) -> int:
+    """Returns how many leading words of `right` repeat the trailing words of `left`."""
+    left_words = WORD.findall(left)
+    right_words = WORD.findall(right)
+    for size in range(min(len(left_words), len(right_words)), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            return size
+    return 0
+
+
+def _skip_words(text: str, count: int) -> str:
+    if count <= 0:
+        return text
+    for number, match in enumerate(WORD.finditer(text), start=1):
+        if number == count:
+            return text[match.end():].lstrip()
+    return ""
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = [word.lower() for word in WORD.findall(text)]
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ContextAssembler:
+    """
+    Turns retrieved chunks and chat history into a prompt that fits a token budget.
+
+    Chunks from the same source page are ordered by `chunk_index`; adjacent
+    chunks are joined and overlapping chunks are spliced so repeated text is
+    sent once. Pieces that are near-duplicates of a better-ranked piece (by
+    word-shingle containment) are dropped. The rest are added best-score
+    first until `max_context_tokens` is reached, and history is kept newest
+    first until `max_history_tokens` is reached.
+    """
+
+    def __init__(
+        self,
+        max_context_tokens: Optional[int] = None,
+        max_history_tokens: Optional[int] = None,
+        duplicate_threshold: float = 0.8,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        if max_context_tokens is None:
+            max_context_tokens = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+        if max_history_tokens is None:
+            max_history_tokens = int(os.getenv("HISTORY_TOKEN_BUDGET", "600"))
+        self.max_context_tokens = max_context_tokens
+        self.max_history_tokens = max_history_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.count_tokens = count_tokens or get_llm_token_counter()
+
+    @staticmethod
+    def _pieces(results: dict) -> List[ContextPiece]:
+        ids = results["ids"][0]
+        documents = results["documents"][0]
+        metadatas = (results.get("metadatas") or [[None] * len(ids)])[0]
+        # Hybrid results carry fused scores; plain vector results are scored by rank
+        scores = (results.get("scores") or [[1.0 / (rank + 1) for rank in range(len(ids))]])[0]
+
+        pieces = []
+        for doc_id, text, metadata, score in zip(ids, documents, metadatas, scores):
+            if not text:
+                continue
+            metadata = metadata or {}
+            index = metadata.get("chunk_index")
+            pieces.append(ContextPiece(text, score, metadata.get("source"), index, index, [doc_id]))
+        return pieces
+
+    @staticmethod
+    def _merge(pieces: List[ContextPiece]) -> List[ContextPiece]:
+        by_source: Dict[str, List[ContextPiece]] = {}
+        merged: List[ContextPiece] = []
+        for piece in pieces:
+            if piece.source is None or piece.first_index is None:
+                merged.append(piece)
+            else:
+                by_source.setdefault(piece.source, []).append(piece)
+
+        for source_pieces in by_source.values():
+            source_pieces.sort(key=lambda piece: piece.first_index)
+            current = source_pieces[0]
+            for piece in source_pieces[1:]:
+                if piece.first_index <= current.last_index + 1:
+                    rest = _skip_words(piece.text, _word_overlap(current.text, piece.text))
+                    current = ContextPiece(
+                        text=current.text + ("\n" + rest if rest else ""),
+                        score=max(current.score, piece.score),
+                        source=current.source,
+                        first_index=current.first_index,
+                        last_index=piece.last_index,
+                        doc_ids=current.doc_ids + piece.doc_ids,
+                    )
+                else:
+                    merged.append(current)
+                    current = piece
+            merged.append(current)
+        return merged
+
+    def assemble_context(self, results: Optional[dict], max_tokens: Optional[int] = None) -> AssembledContext:
+        """
+        Builds the context block from a Chroma-shaped search result.
+
+        Args:
+            results (Optional[dict]): Search result with `ids`, `documents` and, if available,
+                `metadatas` (source, chunk_index) and `scores`.
+            max_tokens (Optional[int]): Budget for this block; defaults to `max_context_tokens`.
+
+        Returns:
+            AssembledContext: The context text, the pieces it was built from and its token count.
+        """
+        if max_tokens is None:
+            max_tokens = self.max_context_tokens
+        if not results or not results.get("ids") or not results["ids"][0]:
+            return AssembledContext("", [], 0)
+
+        pieces = sorted(self._merge(self._pieces(results)), key=lambda piece: piece.score, reverse=True)
+
+        kept: List[ContextPiece] = []
+        kept_shingles: List[Set[tuple]] = []
+        duplicates = over_budget = 0
+        tokens = 0
+        for piece in pieces:
+            shingles = _shingles(piece.text)
+            if any(len(shingles & other) >= self.duplicate_threshold * len(shingles) for other in kept_shingles):
+                duplicates += 1
+                continue
+            piece_tokens = self.count_tokens(piece.text)
+            if tokens + piece_tokens > max_tokens:
+                if kept:
+                    over_budget += 1
+                    continue
+                # Never send an empty context just because the best piece is long: cut it to fit
+                piece.text = self._truncate(piece.text, max_tokens)
+                piece_tokens = self.count_tokens(piece.text)
+            kept.append(piece)
+            kept_shingles.append(shingles)
+            tokens += piece_tokens
+
+        text = "\n\n".join(piece.text for piece in kept)
+        return AssembledContext(text, kept, self.count_tokens(text) if kept else 0, duplicates, over_budget)
+
+    def combine(self, first: AssembledContext, second: AssembledContext) -> AssembledContext:
+        """
+        Puts two assembled blocks into one context, `first` on top.
+
+        Args:
+            first (AssembledContext): E.g. the prayer-times table added to a search.
+            second (AssembledContext): E.g. the search results, assembled within the remaining budget.
+
+        Returns:
+            AssembledContext: Both blocks' pieces and text.
+        """
+        text = "\n\n".join(block.text for block in (first, second) if block.text)
+        return AssembledContext(
+            text,
+            first.pieces + second.pieces,
+            self.count_tokens(text) if text else 0,
+            first.dropped_duplicates + second.dropped_duplicates,
+            first.dropped_over_budget + second.dropped_over_budget,
+        )
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        words = WORD.findall(text)
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
+
+    def trim_history(self, history: Sequence[str]) -> List[str]:
+        """
+        Keeps the most recent history lines that fit in the history budget.
+
+        Args:
+            history (Sequence[str]): "User: ..." / "Bot: ..." lines, oldest first.
+
+        Returns:
+            List[str]: The kept lines, oldest first.
+        """
+        kept: List[str] = []
+        tokens = 0
+        for line in reversed(history):
+            line_tokens = self.count_tokens(line)
+            if tokens + line_tokens > self.max_history_tokens:
+                break
+            kept.append(line)
+            tokens += line_tokens
+        kept.reverse()
+        return kept
+
+    def count_message_tokens(self, messages: List[dict]) -> int:
+        # Chat formats add a few tokens of framing per message
+        return sum(self.count_tokens(message["content"]) + 4 for message in messages)
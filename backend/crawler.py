@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urldefrag, urlencode, urljoin, urlparse, urlunparse
+
+import httpx
+from bs4 import BeautifulSoup
+
+from vector_db_pipline import EXCLUDED_EXTENSIONS, HTML_DIR, SNAPSHOT_INDEX, is_internal, sanitize_filename
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+@dataclass
+class Page:
+    url: str
+    html: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    final_url: Optional[str] = None
+    not_modified: bool = False
+
+
+@dataclass
+class CrawlResult:
+    pages: List[Page]
+    # URL -> error, for pages that timed out or answered with an error status
+    failed: Dict[str, str]
+    # Pages that were linked but never fetched (the crawl stopped early or hit `max_pages`)
+    unreached: Set[str]
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Normalizes a URL so that trivially different spellings dedupe to one entry.
+
+    Lowercases the scheme and host, drops fragments and default ports, removes
+    trailing slashes and sorts query parameters.
+
+    Args:
+        url (str): An absolute URL.
+
+    Returns:
+        Optional[str]: The normalized URL, or None if it isn't http(s).
+    """
+    url, _ = urldefrag(url.strip())
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parsed.hostname:
+        return None
+
+    netloc = parsed.hostname.lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parsed.port}"
+    path = parsed.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """
+    Returns the absolute URLs of every <a href> on a page.
+
+    Args:
+        html (str): The page HTML.
+        base_url (str): URL the page was fetched from, used to resolve relative links.
+
+    Returns:
+        List[str]: Absolute link targets, in document order.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    return [urljoin(base_url, link["href"]) for link in soup.find_all("a", href=True)]
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host to at most `requests_per_second`."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Crawler:
+    """
+    Breadth-first site crawler with a shared frontier and bounded concurrency.
+
+    `max_concurrency` workers pull URLs from one frontier queue and fetch them
+    over a single keep-alive connection pool, with each host limited to
+    `requests_per_second`. Discovered links are normalized, filtered with
+    `is_allowed` and the excluded-extension list, and enqueued only once.
+
+    If `conditional_headers` is given, pages that already have a saved copy in
+    `save_dir` are requested with those headers; on 304 the saved copy is used
+    for link discovery and the page is yielded with `not_modified` set.
+
+    Pages that could not be fetched are recorded in `failed`, and pages that
+    were linked but never fetched in `unreached`, so callers can tell a page
+    that is gone from the site from one the crawl simply didn't get.
+    """
+
+    def __init__(
+        self,
+        start_url: str,
+        max_concurrency: int = 8,
+        requests_per_second: float = 10.0,
+        max_pages: Optional[int] = None,
+        timeout: float = 10.0,
+        is_allowed: Callable[[str], bool] = is_internal,
+        save_dir: Optional[str] = HTML_DIR,
+        conditional_headers: Optional[Callable[[str], Dict[str, str]]] = None,
+    ):
+        self.start_url = start_url
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.is_allowed = is_allowed
+        self.save_dir = save_dir
+        self.conditional_headers = conditional_headers
+        self.saved: Dict[str, str] = {}
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.seen: Set[str] = set()
+        self.fetched: Set[str] = set()
+        self.failed: Dict[str, str] = {}
+        self._skipped: Set[str] = set()
+
+    def _should_visit(self, url: Optional[str]) -> bool:
+        if url is None or url in self.seen:
+            return False
+        if not self.is_allowed(url) or urlparse(url).path.lower().endswith(EXCLUDED_EXTENSIONS):
+            return False
+        if self.max_pages is not None and len(self.seen) >= self.max_pages:
+            self._skipped.add(url)
+            return False
+        return True
+
+    @property
+    def unreached(self) -> Set[str]:
+        """Pages that were linked but not fetched, because the crawl stopped early or hit `max_pages`."""
+        return (self.seen - self.fetched - set(self.failed)) | self._skipped
+
+    def _enqueue(self, frontier: asyncio.Queue, url: str):
+        url = normalize_url(url)
+        if self._should_visit(url):
+            self.seen.add(url)
+            frontier.put_nowait(url)
+
+    def _saved_path(self, url: str) -> str:
+        return os.path.join(self.save_dir, sanitize_filename(url) + ".html")
+
+    def _load(self, url: str) -> str:
+        with open(self._saved_path(url), "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str) -> Optional[Page]:
+        headers = {}
+        if self.conditional_headers and self.save_dir and os.path.exists(self._saved_path(url)):
+            headers = self.conditional_headers(url)
+
+        await self.rate_limiter.wait(urlparse(url).netloc)
+        response = await client.get(url, headers=headers)
+        if response.status_code == 304:
+            return Page(
+                url=url,
+                html=await asyncio.to_thread(self._load, url),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+                final_url=str(response.url),
+                not_modified=True,
+            )
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "text/html"):
+            return None
+        return Page(
+            url=url,
+            html=response.text,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            final_url=str(response.url),
+        )
+
+    def _save(self, page: Page):
+        os.makedirs(self.save_dir, exist_ok=True)
+        with open(self._saved_path(page.url), "w", encoding="utf-8") as f:
+            f.write(page.html)
+
+    def _save_index(self):
+        # Filenames are lossy (sanitize_filename), so keep the URL of each saved page next to it
+        index_path = os.path.join(self.save_dir, SNAPSHOT_INDEX)
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        index.update(self.saved)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+
+    async def _worker(self, client: httpx.AsyncClient, frontier: asyncio.Queue, results: asyncio.Queue):
+        while True:
+            url = await frontier.get()
+            try:
+                page = await self._fetch(client, url)
+                self.fetched.add(url)
+                if page is not None:
+                    if self.save_dir:
+                        if not page.not_modified:
+                            await asyncio.to_thread(self._save, page)
+                        self.saved[sanitize_filename(url) + ".html"] = url
+                    # Enqueue children before task_done() so join() can't finish early.
+                    # Links resolve against the post-redirect URL, which may keep a trailing slash.
+                    for link in await asyncio.to_thread(extract_links, page.html, page.final_url or url):
+                        self._enqueue(frontier, link)
+                    await results.put(page)
+            except Exception as e:
+                self.failed[url] = str(e)
+                print(f"[✗] Failed at {url}: {e}")
+            finally:
+                frontier.task_done()
+
+    async def iter_pages(self) -> AsyncIterator[Page]:
+        """
+        Crawls the site, yielding each HTML page as soon as it is fetched.
+
+        Yields:
+            Page: A fetched page with its caching headers.
+        """
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        done = object()
+        self._enqueue(frontier, self.start_url)
+
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True) as client:
+            workers = [
+                asyncio.create_task(self._worker(client, frontier, results))
+                for _ in range(self.max_concurrency)
+            ]
+
+            async def finish():
+                await frontier.join()
+                await results.put(done)
+
+            finisher = asyncio.create_task(finish())
+            try:
+                while True:
+                    page = await results.get()
+                    if page is done:
+                        break
+                    yield page
+            finally:
+                finisher.cancel()
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(finisher, *workers, return_exceptions=True)
+                if self.save_dir and self.saved:
+                    await asyncio.to_thread(self._save_index)
+
+    async def crawl(self) -> List[Page]:
+        """
+        Crawls the whole site.
+
+        Returns:
+            List[Page]: Every HTML page that was fetched, in completion order.
+        """
+        return [page async for page in self.iter_pages()]
+
+
+def crawl_site(url: str, save_dir: Optional[str] = HTML_DIR, **kwargs) -> CrawlResult:
+    """
+    Synchronous entry point that crawls a whole site.
+
+    Args:
+        url (str): The start URL.
+        save_dir (Optional[str]): Directory to save each page in, or None to skip saving.
+        **kwargs: Passed through to `Crawler`.
+
+    Returns:
+        CrawlResult: Every HTML page that was fetched, and the pages that failed or were never reached.
+    """
+    crawler = Crawler(url, save_dir=save_dir, **kwargs)
+    started = time.perf_counter()
+    pages = asyncio.run(crawler.crawl())
+    print(f"[✓] Crawled {len(pages)} page(s) in {time.perf_counter() - started:.1f}s ({len(crawler.failed)} failed)")
+    return CrawlResult(pages, dict(crawler.failed), crawler.unreached)
+
+
+if __name__ == "__main__":
+    import sys
+
+    crawl_site(sys.argv[1] if len(sys.argv) > 1 else "https://friscomasjid.org")
@@ -0,0 +1,343 @@
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers aren't serialised across processes
+    fcntl = None
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+VECTORS_FILE = "vectors.bin"
+INDEX_FILE = "index.npz"
+LOCK_FILE = "lock"
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+def model_directory(root: str, model_name: str) -> str:
+    # Readable, but unique per model: a new model never sees the old model's vectors
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)[-60:]
+    return os.path.join(root, f"{slug}-{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:8]}")
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of embeddings for one model.
+
+    Vectors live in `vectors.bin`, a memory-mapped file of fixed-size
+    records: the text's 16-byte BLAKE2 digest followed by the float32
+    vector. `index.npz` maps digests to record slots with a last-used time
+    for each. Lookups read straight from the map and check the digest
+    stored in the record, so a slot reused by another process after this
+    one loaded its index is a miss, never a wrong vector.
+
+    New vectors are held in memory and written by `flush()` under an
+    exclusive file lock: the writer re-reads the index, appends or reuses
+    slots, evicts the least recently used entries beyond `max_entries`, and
+    replaces the index atomically. Ingestion and the API can therefore share
+    one cache. Ingestion flushes explicitly and everything flushes at exit;
+    otherwise every `flush_every` new entries start a flush on a background
+    thread, so a query never waits for the write. Lookups keep being served
+    from the old index and the pending vectors while it runs.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        root: str = EMBEDDING_CACHE_DIR,
+        max_entries: Optional[int] = None,
+        flush_every: int = 1024,
+    ):
+        if max_entries is None:
+            max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        self.model_name = model_name
+        self.directory = model_directory(root, model_name)
+        self.max_entries = max_entries
+        self.flush_every = max(1, flush_every)
+        self._lock = threading.RLock()
+        # Serialises flushes within the process; the file lock does it across processes
+        self._flush_lock = threading.Lock()
+        self._flushing = False
+        self._slots: Dict[bytes, int] = {}
+        self._last_used: Dict[bytes, float] = {}
+        self._touched: Dict[bytes, float] = {}
+        self._pending: Dict[bytes, np.ndarray] = {}
+        self._records: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self._index_mtime: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _dtype(self, dim: int) -> np.dtype:
+        # Raw void bytes: an "S" field would drop a digest's trailing zero bytes
+        return np.dtype([("key", f"V{KEY_BYTES}"), ("vector", "<f4", (dim,))])
+
+    def _read_index(self) -> Optional[Tuple[int, int, Dict[bytes, int], Dict[bytes, float]]]:
+        """The index on disk as (mtime, dim, slots, last used), or None if there is none for this model."""
+        try:
+            mtime = os.stat(self._path(INDEX_FILE)).st_mtime_ns
+            with np.load(self._path(INDEX_FILE), allow_pickle=False) as data:
+                if str(data["model"]) != self.model_name:
+                    return None
+                dim = int(data["dim"])
+                keys, slots, last_used = data["keys"], data["slots"], data["last_used"]
+        except FileNotFoundError:
+            return None
+        keys = [key.tobytes() for key in keys]
+        return (mtime, dim, {key: int(slot) for key, slot in zip(keys, slots)},
+                {key: float(used) for key, used in zip(keys, last_used)})
+
+    def _refresh(self):
+        """Reloads the index if another process (or a flush) replaced it."""
+        try:
+            mtime = os.stat(self._path(INDEX_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._index_mtime:
+            return
+        index = self._read_index()
+        if index is None:
+            return
+        self._index_mtime, self._dim, self._slots, self._last_used = index
+        self._open_records()
+
+    def _open_records(self):
+        self._records = None
+        path = self._path(VECTORS_FILE)
+        if self._dim and os.path.exists(path) and os.path.getsize(path) >= self._dtype(self._dim).itemsize:
+            self._records = np.memmap(path, dtype=self._dtype(self._dim), mode="r")
+
+    def get_many(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        Looks up a batch of texts.
+
+        Args:
+            texts (List[str]): Texts to look up.
+
+        Returns:
+            Tuple[List[Optional[np.ndarray]], List[int]]: A vector or None per text, and the
+            positions of the misses.
+        """
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        misses = []
+        now = time.time()
+        with self._lock:
+            self._refresh()
+            for position, text in enumerate(texts):
+                key = text_key(text)
+                vector = self._pending.get(key)
+                if vector is None:
+                    vector = self._read(key)
+                if vector is None:
+                    misses.append(position)
+                else:
+                    found[position] = vector
+                    self._touched[key] = now
+            self.hits += len(texts) - len(misses)
+            self.misses += len(misses)
+        return found, misses
+
+    def _read(self, key: bytes) -> Optional[np.ndarray]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        if self._records is None or slot >= len(self._records):
+            self._open_records()
+            if self._records is None or slot >= len(self._records):
+                return None
+        record = self._records[slot]
+        if record["key"].tobytes() != key:
+            return None
+        return np.array(record["vector"], dtype=np.float32)
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """
+        Adds freshly computed vectors; they are written on the next flush.
+
+        Args:
+            texts (List[str]): The texts that were encoded.
+            vectors (np.ndarray): One float32 row per text.
+        """
+        if not len(texts):
+            return
+        with self._lock:
+            if self._dim is not None and vectors.shape[1] != self._dim:
+                # Same model name, different output size: start over rather than mix shapes
+                self._reset()
+            self._dim = vectors.shape[1]
+            for text, vector in zip(texts, vectors):
+                self._pending[text_key(text)] = np.asarray(vector, dtype=np.float32)
+            if len(self._pending) >= self.flush_every and not self._flushing:
+                self._flushing = True
+                threading.Thread(target=self._background_flush, name="embedding-cache-flush", daemon=True).start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            # The vectors stay pending; the next flush (at the latest, at exit) tries again
+            pass
+        finally:
+            self._flushing = False
+
+    def _reset(self):
+        for name in (INDEX_FILE, VECTORS_FILE):
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+        self._slots, self._last_used, self._touched, self._pending = {}, {}, {}, {}
+        self._records, self._index_mtime = None, None
+
+    def flush(self):
+        """Writes pending vectors and last-used times to disk, evicting the oldest entries if over the limit."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._touched:
+                    return
+                if self._dim is None:
+                    self._touched.clear()
+                    return
+                pending, touched, dim = dict(self._pending), self._touched, self._dim
+                self._touched = {}
+            os.makedirs(self.directory, exist_ok=True)
+            # The disk work runs without self._lock, so lookups carry on meanwhile
+            with open(self._path(LOCK_FILE), "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    index = self._read_index()
+                    if index is not None and index[1] != dim:
+                        # Another process stored vectors of another size under this model name: start over
+                        for name in (INDEX_FILE, VECTORS_FILE):
+                            try:
+                                os.remove(self._path(name))
+                            except FileNotFoundError:
+                                pass
+                        index = None
+                    slots, last_used = (index[2], index[3]) if index else ({}, {})
+                    evicted = self._write(pending, touched, slots, last_used, dim)
+                    mtime = os.stat(self._path(INDEX_FILE)).st_mtime_ns
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            with self._lock:
+                if self._dim != dim:
+                    # put_many() switched dimensions meanwhile and started over
+                    return
+                self._slots, self._last_used, self._index_mtime = slots, last_used, mtime
+                for key, vector in pending.items():
+                    if self._pending.get(key) is vector:
+                        del self._pending[key]
+                self.evictions += evicted
+                self._open_records()
+
+    def _write(self, pending: Dict[bytes, np.ndarray], touched: Dict[bytes, float],
+               slots: Dict[bytes, int], last_used: Dict[bytes, float], dim: int) -> int:
+        """Writes `pending` into the record file and replaces the index, updating `slots` and `last_used` in place."""
+        dtype = self._dtype(dim)
+        for key, used in touched.items():
+            if key in last_used:
+                last_used[key] = max(last_used[key], used)
+        now = time.time()
+        new_keys = [key for key in pending if key not in slots]
+
+        # Evict least recently used entries down to 90% of the limit, so flushes don't evict every time
+        evicted = 0
+        overflow = len(slots) + len(new_keys) - self.max_entries
+        if overflow > 0:
+            target = len(slots) - max(0, int(self.max_entries * 0.9) - len(new_keys))
+            for key in sorted(slots, key=lambda key: last_used.get(key, 0.0))[:target]:
+                del slots[key]
+                last_used.pop(key, None)
+                evicted += 1
+            new_keys = new_keys[:max(0, self.max_entries - len(slots))]
+
+        path = self._path(VECTORS_FILE)
+        capacity = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        used_slots = set(slots.values())
+        free = (slot for slot in range(capacity) if slot not in used_slots)
+        with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+            for key in new_keys:
+                slot = next(free, None)
+                if slot is None:
+                    slot = capacity
+                    capacity += 1
+                record = np.zeros(1, dtype=dtype)
+                record["key"] = np.void(key)
+                record["vector"] = pending[key]
+                f.seek(slot * dtype.itemsize)
+                f.write(record.tobytes())
+                slots[key] = slot
+                last_used[key] = now
+            f.flush()
+            os.fsync(f.fileno())
+
+        keys = list(slots)
+        tmp_path = self._path(INDEX_FILE + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            model=np.array(self.model_name),
+            dim=np.array(dim),
+            keys=np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(-1, KEY_BYTES),
+            slots=np.array([slots[key] for key in keys], dtype=np.int64),
+            last_used=np.array([last_used.get(key, now) for key in keys], dtype=np.float64),
+        )
+        os.replace(tmp_path, self._path(INDEX_FILE))
+        return evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "entries": len(self._slots) + sum(key not in self._slots for key in self._pending),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_caches: Dict[Tuple[str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, root: Optional[str] = None) -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide cache for a model, or None if caching is disabled.
+
+    Set `EMBEDDING_CACHE_MAX_ENTRIES=0` to disable it; `EMBEDDING_CACHE_DIR`
+    moves it. The cache is flushed when the process exits.
+
+    Args:
+        model_name (str): The embedding model's name.
+        root (Optional[str]): Cache directory; defaults to `EMBEDDING_CACHE_DIR`.
+
+    Returns:
+        Optional[EmbeddingCache]: The shared cache.
+    """
+    if int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")) <= 0:
+        return None
+    # Read per call, so a tool can point it elsewhere after this module was imported
+    key = (root or os.getenv("EMBEDDING_CACHE_DIR", EMBEDDING_CACHE_DIR), model_name)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = EmbeddingCache(model_name, key[0])
+            atexit.register(cache.flush)
+    return cache
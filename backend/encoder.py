@@ -0,0 +1,170 @@
+import asyncio
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from embedding_cache import get_embedding_cache
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_models: Dict[str, object] = {}
+_model_lock = threading.Lock()
+
+
+def get_model(model_name: str = MODEL_NAME):
+    """
+    Returns the process-wide SentenceTransformer for a model, loading it on first use.
+
+    Args:
+        model_name (str): The model to load; only the evaluation harness asks for another one.
+
+    Returns:
+        SentenceTransformer: The shared embedding model.
+    """
+    model = _models.get(model_name)
+    if model is None:
+        with _model_lock:
+            model = _models.get(model_name)
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+
+                model = _models[model_name] = SentenceTransformer(model_name)
+    return model
+
+
+def encode_texts(texts: List[str], model_name: str = MODEL_NAME) -> np.ndarray:
+    """
+    Encodes a batch of texts with the shared model.
+
+    Texts already in the persistent embedding cache are read from it; the
+    rest are encoded together in one forward pass and added to the cache.
+
+    Args:
+        texts (List[str]): Texts to embed.
+        model_name (str): The embedding model; defaults to the one the index is built with.
+
+    Returns:
+        np.ndarray: A float32 matrix with one row per text.
+    """
+    cache = get_embedding_cache(model_name)
+    if cache is None or not texts:
+        return _encode(texts, model_name)
+
+    found, misses = cache.get_many(texts)
+    if misses:
+        # Repeats within the batch are encoded once
+        unique = list(dict.fromkeys(texts[position] for position in misses))
+        encoded = _encode(unique, model_name)
+        cache.put_many(unique, encoded)
+        vectors = dict(zip(unique, encoded))
+        for position in misses:
+            found[position] = vectors[texts[position]]
+    return np.vstack(found).astype(np.float32, copy=False)
+
+
+def flush_embedding_cache():
+    """Writes newly computed embeddings to the persistent cache now rather than at exit."""
+    cache = get_embedding_cache(MODEL_NAME)
+    if cache is not None:
+        cache.flush()
+
+
+def _encode(texts: List[str], model_name: str = MODEL_NAME) -> np.ndarray:
+    vectors = get_model(model_name).encode(texts, convert_to_numpy=True)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class BatchedEncoder:
+    """
+    Groups concurrent query embeddings into micro-batches.
+
+    Callers await `encode()` with a single string. A background task collects
+    pending strings until `max_batch_size` is reached or `max_wait_ms` has
+    passed since the first one arrived, encodes them in one forward pass on a
+    worker thread, and hands each caller back only its own vector.
+    """
+
+    def __init__(self, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("ENCODER_MAX_BATCH_SIZE", "32"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("ENCODER_MAX_WAIT_MS", "5"))
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Loads the model off the event loop and starts the batching task."""
+        await asyncio.to_thread(get_model)
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    @property
+    def ready(self) -> bool:
+        """Whether the model is loaded and the batching task is running."""
+        return MODEL_NAME in _models and self._worker is not None and not self._worker.done()
+
+    async def stop(self):
+        """Stops the batching task and fails any request still waiting."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Encoder stopped"))
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Embeds a single query, sharing a forward pass with concurrent callers.
+
+        Args:
+            text (str): The query to embed.
+
+        Returns:
+            np.ndarray: The float32 embedding for `text`.
+        """
+        if self._worker is None:
+            raise RuntimeError("Encoder has not been started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Callers that gave up while waiting don't need a vector
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                vectors = await loop.run_in_executor(None, encode_texts, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
@@ -0,0 +1,475 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from benchmark import FIXTURE_GOLD, PERCENTILES, fixture_documents, percentile
+from encoder import MODEL_NAME
+
+EVALUATION_COLLECTION = "evaluation"
+# A snippet found on more pages than this can't tell the right chunk from the rest; label by source instead
+MAX_SNIPPET_PAGES = 3
+
+
+@dataclass
+class GoldQuery:
+    """
+    A question and what a relevant document looks like.
+
+    A document is relevant if its ID is in `ids`, it comes from one of
+    `sources` (exact URL), or it contains one of the `expect` snippets.
+    """
+
+    question: str
+    expect: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+
+    def is_relevant(self, doc_id: str, document: Optional[str], metadata: Optional[dict]) -> bool:
+        if doc_id in self.ids:
+            return True
+        if metadata and metadata.get("source") in self.sources:
+            return True
+        text = (document or "").lower()
+        return any(expected.lower() in text for expected in self.expect)
+
+
+def fixture_queries() -> List[GoldQuery]:
+    """The gold set of the benchmark fixture, labeled by the ID of the fact that answers each question."""
+    return [GoldQuery(question, ids=[f"fact_{i}" for i in facts]) for question, facts in FIXTURE_GOLD.items()]
+
+
+def load_labels(path: str) -> List[GoldQuery]:
+    """
+    Loads the gold set of the real site.
+
+    Args:
+        path (str): A JSON list of {"question", "expect", "source"} objects. `expect` is text
+            copied from the page that answers the question and `source` that page's URL; each
+            may be a string or a list, and either may be left out.
+
+    Returns:
+        List[GoldQuery]: The queries, in file order; a repeated question replaces the earlier one.
+    """
+    from crawler import normalize_url
+
+    def as_list(value) -> List[str]:
+        return [value] if isinstance(value, str) else list(value or [])
+
+    queries: Dict[str, GoldQuery] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for item in json.load(f):
+            # Snapshot pages are keyed by normalized URL, so labels must be too to match exactly
+            sources = [normalize_url(source) or source for source in as_list(item.get("source"))]
+            queries[item["question"]] = GoldQuery(item["question"], as_list(item.get("expect")), sources)
+    return list(queries.values())
+
+
+def check_labels(queries: List[GoldQuery], pages: List[Tuple[str, List[str]]],
+                 max_snippet_pages: int = MAX_SNIPPET_PAGES) -> List[str]:
+    """
+    Checks labels against the pages being indexed, so a score never rests on a label nothing can match.
+
+    Every source must be a page of the snapshot, and every snippet must occur in the
+    indexed text (boilerplate removed) of at least one page and at most `max_snippet_pages`.
+
+    Returns:
+        List[str]: One message per problem; empty if the labels are usable.
+    """
+    urls = {url for url, _ in pages}
+    texts = [(url, "\n".join(blocks).lower()) for url, blocks in pages]
+    problems = []
+    for query in queries:
+        if not query.expect and not query.sources:
+            problems.append(f"{query.question!r}: no expect or source")
+        for source in query.sources:
+            if source not in urls:
+                problems.append(f"{query.question!r}: source {source} is not in the snapshot")
+        for expected in query.expect:
+            matches = [url for url, text in texts if expected.lower() in text]
+            if not matches:
+                problems.append(f"{query.question!r}: {expected!r} is on no page")
+            elif len(matches) > max_snippet_pages:
+                problems.append(f"{query.question!r}: {expected!r} is on {len(matches)} pages")
+    return problems
+
+
+@dataclass(frozen=True)
+class EvalConfig:
+    k: int = 5
+    ef: int = 10
+    m: int = 16
+    chunk_tokens: int = 200
+    overlap: int = 32
+    model: str = MODEL_NAME
+    hybrid: bool = True
+
+    @property
+    def build_key(self) -> tuple:
+        # Everything that needs its own index; k and hybrid only change how it is searched
+        return self.chunk_tokens, self.overlap, self.model, self.m, self.ef
+
+    def label(self, chunked: bool = True) -> str:
+        chunks = f"{self.chunk_tokens}/{self.overlap}" if chunked else "-"
+        return (f"k={self.k} ef={self.ef} M={self.m} chunks={chunks} "
+                f"{self.model.rsplit('/', 1)[-1]} {'hybrid' if self.hybrid else 'vector'}")
+
+
+@dataclass
+class EvalResult:
+    config: EvalConfig
+    recall_at_k: float
+    mrr: float
+    documents: int
+    index_bytes: int
+    embed_ms: Dict[str, float]
+    search_ms: Dict[str, float]
+    misses: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def config_grid(
+    k: Iterable[int] = (3, 5, 10),
+    ef: Iterable[int] = (10, 50),
+    m: Iterable[int] = (16,),
+    chunk_tokens: Iterable[int] = (200,),
+    overlap: Iterable[int] = (32,),
+    models: Iterable[str] = (MODEL_NAME,),
+    hybrid: Iterable[bool] = (True, False),
+) -> List[EvalConfig]:
+    """Every combination of the given settings, grouped so configurations sharing an index are adjacent."""
+    return [
+        EvalConfig(k_, ef_, m_, tokens, overlap_, model, hybrid_)
+        for tokens, overlap_, model, m_, ef_, hybrid_, k_ in itertools.product(
+            chunk_tokens, overlap, models, m, ef, hybrid, k
+        )
+    ]
+
+
+def snapshot_pages(directory: str, workers: Optional[int] = None) -> List[Tuple[str, List[str]]]:
+    """
+    Extracts the text blocks of every page in a crawl snapshot, with the site's boilerplate removed.
+
+    Extraction runs once per evaluation; each chunking setting re-chunks these blocks.
+
+    Args:
+        directory (str): Directory the crawler saved pages into.
+        workers (Optional[int]): Extraction processes.
+
+    Returns:
+        List[Tuple[str, List[str]]]: (url, blocks) per page.
+    """
+    from chunking import BoilerplateFilter
+    from extraction import parallel_extract
+    from ingest_pipeline import snapshot_documents
+
+    pages = [(key[0], blocks) for key, blocks in parallel_extract(snapshot_documents(directory), workers)]
+    # A filter of its own: what the evaluation learns shouldn't leak into ingestion's saved counts
+    boilerplate = BoilerplateFilter(path=None)
+    for _, blocks in pages:
+        boilerplate.observe(blocks)
+    return [(url, boilerplate.filter(blocks)) for url, blocks in pages]
+
+
+def chunk_pages(pages: List[Tuple[str, List[str]]], chunk_tokens: int, overlap: int) -> List[Tuple[str, str, dict]]:
+    """Chunks extracted pages the way ingestion does, returning (id, text, metadata) triples."""
+    from chunking import TokenChunker
+    from manifest import chunk_id
+
+    chunker = TokenChunker(max_tokens=chunk_tokens, overlap_tokens=overlap)
+    documents: Dict[str, Tuple[str, str, dict]] = {}
+    for url, blocks in pages:
+        for chunk in chunker.chunk(blocks, url):
+            doc_id = chunk_id(url, chunk.text)
+            documents.setdefault(doc_id, (doc_id, chunk.text, chunk.metadata))
+    return list(documents.values())
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Evaluator:
+    """
+    Scores retrieval configurations against a gold question set.
+
+    Each distinct index (chunking, embedding model, HNSW `M` and `ef`) is
+    built once into its own temporary Chroma directory, with the BM25
+    keyword index beside it, and every `k` and hybrid setting is searched
+    against it. Query embeddings are computed once per model, one question
+    at a time and bypassing the embedding cache, so their latency is the
+    model's own.
+
+    A question counts as found at k if any of its top k documents is
+    relevant; recall@k is the share of questions found, and MRR the mean of
+    1 / rank of the first relevant document within the top k (0 if none).
+    """
+
+    def __init__(
+        self,
+        queries: List[GoldQuery],
+        pages: Optional[List[Tuple[str, List[str]]]] = None,
+        documents: Optional[List[Tuple[str, str, dict]]] = None,
+        workdir: Optional[str] = None,
+        construction_ef: int = 100,
+        batch_size: int = 512,
+    ):
+        if (pages is None) == (documents is None):
+            raise ValueError("Pass either pages to chunk or ready-made documents")
+        self.queries = queries
+        self.pages = pages
+        self.documents = documents
+        self.workdir = workdir or tempfile.mkdtemp(prefix="retrieval-eval-")
+        self.construction_ef = construction_ef
+        self.batch_size = max(1, batch_size)
+        self._query_embeddings: Dict[str, Tuple[list, List[float]]] = {}
+
+    @property
+    def chunked(self) -> bool:
+        return self.pages is not None
+
+    def _embed_queries(self, model: str) -> Tuple[list, List[float]]:
+        # Straight to the model: a hit in the persistent embedding cache would time a lookup, not the model
+        from encoder import _encode
+
+        if model not in self._query_embeddings:
+            _encode([self.queries[0].question], model)  # loads the model
+            embeddings, latencies = [], []
+            for query in self.queries:
+                started = time.perf_counter()
+                embeddings.append(_encode([query.question], model)[0].tolist())
+                latencies.append((time.perf_counter() - started) * 1000)
+            self._query_embeddings[model] = (embeddings, latencies)
+        return self._query_embeddings[model]
+
+    def build(self, config: EvalConfig, directory: str):
+        """
+        Builds the index a configuration searches.
+
+        Returns:
+            Tuple[HybridRetriever, int]: A retriever over the new collection and its document count.
+        """
+        import chromadb
+
+        from encoder import encode_texts
+        from hybrid_search import HybridRetriever
+        from keyword_index import BM25Index, keyword_index_path
+        from retrieval import ChromaStore
+
+        documents = (chunk_pages(self.pages, config.chunk_tokens, config.overlap)
+                     if self.chunked else self.documents)
+        client = chromadb.PersistentClient(path=directory)
+        collection = client.get_or_create_collection(
+            name=EVALUATION_COLLECTION,
+            metadata={"hnsw:M": config.m, "hnsw:search_ef": config.ef, "hnsw:construction_ef": self.construction_ef},
+        )
+        keyword_index = BM25Index(keyword_index_path(directory, EVALUATION_COLLECTION))
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            ids = [doc_id for doc_id, _, _ in batch]
+            texts = [text for _, text, _ in batch]
+            collection.upsert(ids=ids, documents=texts, metadatas=[metadata for _, _, metadata in batch],
+                              embeddings=encode_texts(texts, config.model))
+            keyword_index.add(ids, texts)
+        keyword_index.save()
+
+        store = ChromaStore(directory, EVALUATION_COLLECTION)
+        store.mark_ingested()
+        # Always Chroma: the NumPy backend would ignore the HNSW settings being measured
+        return HybridRetriever(store, keyword_index=keyword_index, vectors=store), len(documents)
+
+    def score(self, config: EvalConfig, retriever, documents: int, index_bytes: int) -> EvalResult:
+        embeddings, embed_latencies = self._embed_queries(config.model)
+        found, reciprocal_ranks, latencies, misses = 0, [], [], []
+        for query, embedding in zip(self.queries, embeddings):
+            started = time.perf_counter()
+            if config.hybrid:
+                result = retriever.search(query.question, embedding, n_results=config.k)
+            else:
+                result = retriever.store.query(embedding, n_results=config.k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            metadatas = (result.get("metadatas") or [[None] * len(result["ids"][0])])[0]
+            rank = next((position for position, (doc_id, document, metadata)
+                         in enumerate(zip(result["ids"][0], result["documents"][0], metadatas), start=1)
+                         if query.is_relevant(doc_id, document, metadata)), None)
+            if rank is None:
+                misses.append(query.question)
+                reciprocal_ranks.append(0.0)
+            else:
+                found += 1
+                reciprocal_ranks.append(1.0 / rank)
+        return EvalResult(
+            config=config,
+            recall_at_k=round(found / max(1, len(self.queries)), 4),
+            mrr=round(sum(reciprocal_ranks) / max(1, len(self.queries)), 4),
+            documents=documents,
+            index_bytes=index_bytes,
+            embed_ms={f"p{pct}": round(percentile(embed_latencies, pct), 3) for pct in PERCENTILES},
+            search_ms={f"p{pct}": round(percentile(latencies, pct), 3) for pct in PERCENTILES},
+            misses=misses,
+        )
+
+    def run(self, configs: List[EvalConfig]) -> List[EvalResult]:
+        """
+        Evaluates every configuration.
+
+        Args:
+            configs (List[EvalConfig]): The configurations, e.g. from `config_grid`.
+
+        Returns:
+            List[EvalResult]: One result per configuration, in order.
+        """
+        results = []
+        for number, (_, group) in enumerate(itertools.groupby(configs, key=lambda config: config.build_key)):
+            group = list(group)
+            directory = os.path.join(self.workdir, f"index_{number}")
+            retriever, documents = self.build(group[0], directory)
+            index_bytes = directory_bytes(directory)
+            # Untimed: loads the HNSW segments and the keyword index
+            retriever.search(self.queries[0].question, self._embed_queries(group[0].model)[0][0])
+            for config in group:
+                results.append(self.score(config, retriever, documents, index_bytes))
+        return results
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def cheapest(results: List[EvalResult], target_recall: float) -> Optional[EvalResult]:
+    """
+    Picks the configuration to use: the fastest of those meeting the recall target.
+
+    Speed is p95 embedding plus p95 search latency; ties go to the smaller
+    index, then the smaller k (fewer tokens in the prompt).
+
+    Returns:
+        Optional[EvalResult]: The pick, or None if no configuration meets the target.
+    """
+    passing = [result for result in results if result.recall_at_k >= target_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda result: (
+        round(result.embed_ms["p95"] + result.search_ms["p95"], 1), result.index_bytes, result.config.k
+    ))
+
+
+def print_results(results: List[EvalResult], queries: int, target_recall: float, chunked: bool = True):
+    print(f"[✓] {len(results)} configuration(s) against {queries} gold question(s)")
+    width = max(len(result.config.label(chunked)) for result in results)
+    print(f"  {'configuration':<{width}} {'recall':>7} {'MRR':>6} {'docs':>6} {'embed95':>8} "
+          f"{'p50':>8} {'p95':>8} {'size':>11}  (ms, bytes)")
+    for result in results:
+        print(f"  {result.config.label(chunked):<{width}} {result.recall_at_k:>7.3f} {result.mrr:>6.3f} "
+              f"{result.documents:>6} {result.embed_ms['p95']:>8.2f} {result.search_ms['p50']:>8.3f} "
+              f"{result.search_ms['p95']:>8.3f} {result.index_bytes:>11}")
+    pick = cheapest(results, target_recall)
+    if pick is None:
+        print(f"[✗] No configuration reaches recall@k ≥ {target_recall:.2f}")
+    else:
+        print(f"[✓] Cheapest configuration with recall@k ≥ {target_recall:.2f}: {pick.config.label(chunked)}")
+        for question in pick.misses:
+            print(f"  missed: {question}")
+
+
+def _flag(value: str) -> bool:
+    if value.lower() in ("on", "true", "1", "yes"):
+        return True
+    if value.lower() in ("off", "false", "0", "no"):
+        return False
+    raise argparse.ArgumentTypeError(f"expected on or off, got {value!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from vector_db_pipline import HTML_DIR
+
+    parser = argparse.ArgumentParser(
+        description="Measure recall@k, MRR, latency and index size of retrieval configurations on a gold question set."
+    )
+    parser.add_argument("--snapshot", default=HTML_DIR,
+                        help="Crawl snapshot to chunk and index (default: the ingestion snapshot directory).")
+    parser.add_argument("--fixture", type=int, metavar="N",
+                        help="Index the benchmark fixture with N generated listings instead of a snapshot; "
+                             "chunking settings don't apply.")
+    parser.add_argument("--labels", default=os.getenv("EVALUATION_LABELS"),
+                        help="JSON file of questions labeled against the real site (see load_labels); "
+                             "required for a snapshot, unused with --fixture.")
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 50], help="HNSW search ef.")
+    parser.add_argument("--m", type=int, nargs="+", default=[16], help="HNSW M.")
+    parser.add_argument("--construction-ef", type=int, default=100)
+    parser.add_argument("--chunk-tokens", type=int, nargs="+", default=[200])
+    parser.add_argument("--overlap", type=int, nargs="+", default=[32])
+    parser.add_argument("--model", nargs="+", default=[MODEL_NAME], help="Embedding models.")
+    parser.add_argument("--hybrid", type=_flag, nargs="+", default=[True, False], help="on, off or both.")
+    parser.add_argument("--target-recall", type=float, default=0.9)
+    parser.add_argument("--workers", type=int, help="Extraction processes.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as JSON.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args(argv)
+
+    if args.fixture is not None:
+        queries = fixture_queries()
+    elif not os.path.isdir(args.snapshot):
+        parser.error(f"no crawl snapshot at {args.snapshot}; crawl the site first or use --fixture")
+    elif not args.labels:
+        parser.error("a snapshot needs --labels (or EVALUATION_LABELS): questions labeled against the real site")
+    else:
+        queries = load_labels(args.labels)
+
+    workdir = tempfile.mkdtemp(prefix="retrieval-eval-")
+    # Document embeddings of trial chunkings and models stay out of the shared cache
+    os.environ.setdefault("EMBEDDING_CACHE_DIR", os.path.join(workdir, "embedding_cache"))
+    if args.fixture is not None:
+        evaluator = Evaluator(queries, documents=fixture_documents(args.fixture), workdir=workdir,
+                              construction_ef=args.construction_ef)
+    else:
+        pages = snapshot_pages(args.snapshot, args.workers)
+        problems = check_labels(queries, pages)
+        if problems:
+            shutil.rmtree(workdir, ignore_errors=True)
+            print(f"[✗] {len(problems)} label(s) in {args.labels} don't match the snapshot:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        evaluator = Evaluator(queries, pages=pages, workdir=workdir, construction_ef=args.construction_ef)
+    configs = config_grid(args.k, args.ef, args.m, args.chunk_tokens, args.overlap, args.model, args.hybrid)
+    try:
+        results = evaluator.run(configs)
+    finally:
+        evaluator.cleanup()
+
+    report = {
+        "queries": len(queries),
+        "target_recall": args.target_recall,
+        "corpus": f"fixture:{args.fixture}" if args.fixture is not None else args.snapshot,
+        "results": [result.to_dict() for result in results],
+    }
+    pick = cheapest(results, args.target_recall)
+    report["cheapest"] = pick.to_dict()["config"] if pick else None
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(results, len(queries), args.target_recall, evaluator.chunked)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,514 @@
+import csv
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from context_budget import AssembledContext, ContextPiece
+from log_setup import get_logger
+
+logger = get_logger("events")
+
+EVENTS_CSV = os.getenv("EVENTS_CSV", "ICF-events.csv")
+MINUTES_PER_DAY = 24 * 60
+DATE_FORMATS = (
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%B %d, %Y", "%b %d, %Y", "%A, %B %d, %Y",
+    "%a, %b %d, %Y", "%B %d %Y", "%d %B %Y", "%m-%d-%Y",
+)
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+CLOCK = r"(?:(\d{1,2})(?::(\d{2}))?\s*(a\.?m\.?|p\.?m\.?)|(\d{1,2}):(\d{2})|(noon|midnight))"
+LOOSE_CLOCK = r"(\d{1,2})(?::(\d{2}))?\s*(a\.?m\.?|p\.?m\.?)?"
+EVENT_WORDS = re.compile(
+    r"\b(events?|happening|going on|what'?s on|what is on|scheduled?|programs?|class(?:es)?|halaqa|"
+    r"lectures?|activit(?:y|ies)|workshops?|meetings?|calendar|anything on)\b"
+)
+PARTS_OF_DAY = {
+    "morning": (5 * 60, 12 * 60, "in the morning"),
+    "afternoon": (12 * 60, 17 * 60, "in the afternoon"),
+    "evening": (17 * 60, MINUTES_PER_DAY, "in the evening"),
+    "tonight": (17 * 60, MINUTES_PER_DAY, "in the evening"),
+    "night": (17 * 60, MINUTES_PER_DAY, "in the evening"),
+}
+
+
+def parse_date(value: str) -> Optional[date]:
+    """
+    Parses a date as written in the events sheet.
+
+    Args:
+        value (str): E.g. "2025-06-13", "6/13/2025" or "Friday, June 13th, 2025".
+
+    Returns:
+        Optional[date]: The date, or None if no known format matches.
+    """
+    value = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", (value or "").strip())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _clock_minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> Optional[int]:
+    hours, minutes = int(hour), int(minute or 0)
+    if meridiem:
+        if not 1 <= hours <= 12:
+            return None
+        hours = hours % 12 + (12 if meridiem.startswith("p") else 0)
+    if hours > 24 or minutes > 59:
+        return None
+    return min(hours * 60 + minutes, MINUTES_PER_DAY)
+
+
+def _match_minutes(match: re.Match, offset: int = 0) -> Optional[int]:
+    hour, minute, meridiem, hour24, minute24, word = match.groups()[offset:offset + 6]
+    if word:
+        return 12 * 60 if word == "noon" else 0
+    if hour24:
+        return _clock_minutes(hour24, minute24, None)
+    return _clock_minutes(hour, minute, meridiem.replace(".", ""))
+
+
+def parse_time_range(value: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Parses an event's time cell into minutes after midnight.
+
+    "7:00 PM - 9:00 PM", "7-9pm", "19:00" and "10 AM to 1 PM" are understood;
+    a missing meridiem on the start is taken from the end, unless that would
+    start the event after it ends ("11-1pm" is 11 AM to 1 PM). Cells like
+    "All day" or "After Isha" give (None, None) and are shown as written.
+
+    Args:
+        value (str): The time cell.
+
+    Returns:
+        Tuple[Optional[int], Optional[int]]: Start and end minutes; the end is None if not given.
+    """
+    parts = re.split(r"\s*(?:-|–|—|\bto\b)\s*", (value or "").strip().lower(), maxsplit=1)
+    clocks = []
+    for part in parts:
+        match = re.fullmatch(LOOSE_CLOCK, part.strip())
+        clocks.append(match.groups() if match else None)
+    if clocks[0] is None:
+        return None, None
+
+    end_meridiem = (clocks[1][2] or "").replace(".", "") if len(clocks) > 1 and clocks[1] else ""
+    start_hour, start_minute, start_meridiem = clocks[0]
+    start = _clock_minutes(start_hour, start_minute, (start_meridiem or end_meridiem).replace(".", "") or None)
+    end = None
+    if len(clocks) > 1 and clocks[1]:
+        hour, minute, meridiem = clocks[1]
+        end = _clock_minutes(hour, minute, (meridiem or "").replace(".", "") or None)
+    if not start_meridiem and end_meridiem and start is not None and end is not None and start > end:
+        # The range crosses noon: "11-1pm", "10-12pm"
+        opposite = _clock_minutes(start_hour, start_minute, "am" if end_meridiem.startswith("p") else "pm")
+        if opposite is not None and opposite <= end:
+            start = opposite
+    return start, end
+
+
+def local_today(timezone: str) -> date:
+    """Today's date in `timezone` (e.g. "America/Chicago"), or the server's date if the zone is unknown."""
+    try:
+        from zoneinfo import ZoneInfo
+
+        return datetime.now(ZoneInfo(timezone)).date()
+    except Exception:
+        return date.today()
+
+
+def format_minutes(minutes: int) -> str:
+    hours, minutes = divmod(minutes % MINUTES_PER_DAY, 60)
+    return f"{(hours % 12) or 12}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+@dataclass
+class Event:
+    row: int
+    title: str
+    room: str
+    date: Optional[date]
+    start: Optional[int]
+    end: Optional[int]
+    time_text: str = ""
+
+    def describe(self) -> str:
+        when = f"{self.date:%A, %B} {self.date.day}, {self.date.year}" if self.date else "date to be announced"
+        if self.start is not None:
+            times = format_minutes(self.start) + (f" – {format_minutes(self.end)}" if self.end is not None else "")
+        else:
+            times = self.time_text or "all day"
+        return f"{self.title} — {when}, {times}" + (f" — {self.room}" if self.room else "")
+
+
+class EventIndex:
+    """
+    A typed, columnar view of the events sheet with interval and room indexes.
+
+    Every dated event becomes an interval of absolute minutes (day ordinal
+    times 1440 plus the time of day). Events without a parseable time span
+    their whole day, and events without an end last `default_duration`
+    minutes. Intervals are kept sorted by start, next to a running maximum
+    of their ends, so the events overlapping any window are found with two
+    binary searches and a vectorised filter of the rows in between. Rows are
+    also grouped per room in start order.
+    """
+
+    def __init__(self, events: List[Event], default_duration: int = 60):
+        self.events = events
+        dated = [event for event in events if event.date is not None]
+        starts = np.empty(len(dated), dtype=np.int64)
+        ends = np.empty(len(dated), dtype=np.int64)
+        rows = np.empty(len(dated), dtype=np.int64)
+        for i, event in enumerate(dated):
+            day = event.date.toordinal() * MINUTES_PER_DAY
+            if event.start is None:
+                starts[i], ends[i] = day, day + MINUTES_PER_DAY
+            else:
+                end = event.end if event.end is not None and event.end > event.start else event.start + default_duration
+                starts[i], ends[i] = day + event.start, day + end
+            rows[i] = event.row
+
+        order = np.argsort(starts, kind="stable")
+        self._rows = rows[order]
+        self._starts = starts[order]
+        self._ends = ends[order]
+        self._max_ends = np.maximum.accumulate(self._ends) if len(self._ends) else self._ends
+
+        by_room: Dict[str, List[int]] = {}
+        self.room_names: Dict[str, str] = {}
+        for row in self._rows:
+            room = events[row].room
+            if room:
+                key = room.lower()
+                self.room_names.setdefault(key, room)
+                by_room.setdefault(key, []).append(int(row))
+        self._by_room = {key: np.array(room_rows, dtype=np.int64) for key, room_rows in by_room.items()}
+
+    @classmethod
+    def from_csv(cls, path: str = EVENTS_CSV) -> "EventIndex":
+        """
+        Loads the events sheet (Title, Room, Date, Time columns).
+
+        Args:
+            path (str): Path of the CSV export.
+
+        Returns:
+            EventIndex: The index over every row; rows with unreadable dates are kept but not indexed by time.
+        """
+        events = []
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row, record in enumerate(csv.DictReader(f)):
+                start, end = parse_time_range(record.get("Time", ""))
+                events.append(Event(
+                    row=row,
+                    title=(record.get("Title") or "").strip(),
+                    room=(record.get("Room") or "").strip(),
+                    date=parse_date(record.get("Date", "")),
+                    start=start,
+                    end=end,
+                    time_text=(record.get("Time") or "").strip(),
+                ))
+        index = cls(events)
+        undated = sum(event.date is None for event in events)
+        if undated:
+            logger.warning("%d of %d event(s) in %s have no readable date", undated, len(events), path)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def overlapping(self, start: int, end: int) -> np.ndarray:
+        """
+        Returns the rows of events overlapping [start, end), in start order.
+
+        Args:
+            start (int): Window start in absolute minutes.
+            end (int): Window end in absolute minutes.
+
+        Returns:
+            np.ndarray: Row numbers into `events`.
+        """
+        # Everything from `high` on starts too late; everything before `low` ended too early
+        high = int(np.searchsorted(self._starts, end, side="left"))
+        low = int(np.searchsorted(self._max_ends, start, side="right"))
+        if low >= high:
+            return self._rows[:0]
+        return self._rows[low:high][self._ends[low:high] > start]
+
+    def lookup(self, windows: Iterable[Tuple[int, int]], room: Optional[str] = None) -> List[Event]:
+        """
+        Lists the events overlapping any of the windows, optionally in one room.
+
+        Args:
+            windows (Iterable[Tuple[int, int]]): [start, end) windows in absolute minutes, in order.
+            room (Optional[str]): Room name as returned by `find_room`.
+
+        Returns:
+            List[Event]: Matching events in chronological order, each once.
+        """
+        seen = set()
+        found = []
+        room_rows = self._by_room.get(room.lower()) if room else None
+        for start, end in windows:
+            rows = self.overlapping(start, end)
+            if room_rows is not None:
+                rows = rows[np.isin(rows, room_rows)]
+            for row in rows.tolist():
+                if row not in seen:
+                    seen.add(row)
+                    found.append(self.events[row])
+        return found
+
+    def find_room(self, text: str) -> Optional[str]:
+        """Returns the longest room name mentioned in `text`, if any."""
+        text = text.lower()
+        for key in sorted(self.room_names, key=len, reverse=True):
+            if re.search(rf"\b{re.escape(key)}\b", text):
+                return self.room_names[key]
+        return None
+
+
+@dataclass
+class EventQuery:
+    windows: List[Tuple[int, int]]
+    description: str
+    room: Optional[str] = None
+
+
+def _month_day(month: int, day: int, year: Optional[int], today: date) -> Optional[date]:
+    try:
+        found = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    # "June 3" asked in December means next June
+    if year is None and found < today - timedelta(days=60):
+        found = found.replace(year=found.year + 1)
+    return found
+
+
+def parse_days(text: str, today: date) -> List[date]:
+    """
+    Finds the days a question asks about.
+
+    Args:
+        text (str): The lower-cased question.
+        today (date): The local date, for relative phrases.
+
+    Returns:
+        List[date]: The days mentioned, in order; empty if none.
+    """
+    days: List[date] = []
+
+    for match in re.finditer(r"\b(\d{4})-(\d{2})-(\d{2})\b", text):
+        found = parse_date(match.group(0))
+        if found:
+            days.append(found)
+    for match in re.finditer(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b", text):
+        year = match.group(3)
+        year = int(year) + (2000 if year and len(year) == 2 else 0) if year else None
+        found = _month_day(int(match.group(1)), int(match.group(2)), year, today)
+        if found:
+            days.append(found)
+    month_names = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+    for match in re.finditer(rf"\b{month_names}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s*(\d{{4}}))?", text):
+        year = int(match.group(3)) if match.group(3) else None
+        found = _month_day(MONTHS[match.group(1)], int(match.group(2)), year, today)
+        if found:
+            days.append(found)
+    for match in re.finditer(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{month_names}", text):
+        found = _month_day(MONTHS[match.group(2)], int(match.group(1)), None, today)
+        if found:
+            days.append(found)
+
+    if re.search(r"\b(today|tonight|this evening)\b", text):
+        days.append(today)
+    if re.search(r"\btomorrow\b", text):
+        days.append(today + timedelta(days=1))
+    weekend = re.search(r"\b(this|next)?\s*weekend\b", text)
+    if weekend:
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:
+            saturday = today - timedelta(days=1)
+        if weekend.group(1) == "next":
+            saturday += timedelta(days=7)
+        days.extend([d for d in (saturday, saturday + timedelta(days=1)) if d >= today])
+    week = re.search(r"\b(this|next)\s+week\b", text)
+    monday = today - timedelta(days=today.weekday()) + timedelta(days=7 if week and week.group(1) == "next" else 0)
+    weekdays = re.findall(r"\b(next\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)s?\b", text)
+    for is_next, name in weekdays:
+        if week:
+            # "Friday next week" is that week's Friday
+            days.append(monday + timedelta(days=WEEKDAYS.index(name)))
+            continue
+        # "Friday" asked on a Friday is today; "next Friday" is the one after
+        ahead = (WEEKDAYS.index(name) - today.weekday()) % 7
+        days.append(today + timedelta(days=(ahead or 7) if is_next else ahead))
+    if week and not weekdays:
+        days.extend(d for d in (monday + timedelta(days=i) for i in range(7)) if d >= today)
+
+    return sorted(set(days))
+
+
+def parse_time_of_day(text: str) -> Optional[Tuple[int, int, str]]:
+    """
+    Finds the time window a question asks about ("after 6pm", "this evening", ...).
+
+    Args:
+        text (str): The lower-cased question.
+
+    Returns:
+        Optional[Tuple[int, int, str]]: Start and end minutes after midnight and the phrase, or None.
+    """
+    match = re.search(rf"\b(?:between|from)\s+{LOOSE_CLOCK}\s+(?:and|to|-)\s+{LOOSE_CLOCK}", text)
+    if match:
+        hour, minute, meridiem, end_hour, end_minute, end_meridiem = match.groups()
+        end_meridiem = (end_meridiem or "").replace(".", "") or None
+        start = _clock_minutes(hour, minute, (meridiem or "").replace(".", "") or end_meridiem)
+        end = _clock_minutes(end_hour, end_minute, end_meridiem)
+        if start is not None and end is not None and start < end:
+            return start, end, match.group(0)
+    match = re.search(rf"\b(after|before|at|around)\s+{CLOCK}", text)
+    if match:
+        minutes = _match_minutes(match, offset=1)
+        if minutes is not None:
+            if match.group(1) == "after":
+                return minutes, MINUTES_PER_DAY, match.group(0)
+            if match.group(1) == "before":
+                return 0, minutes, match.group(0)
+            return minutes, minutes + 60, match.group(0)
+    for word, (start, end, phrase) in PARTS_OF_DAY.items():
+        if re.search(rf"\b{word}\b", text):
+            return start, end, phrase
+    return None
+
+
+def describe_days(days: List[date]) -> str:
+    names = [f"{day:%A, %B} {day.day}" for day in days]
+    if len(days) > 2 and (days[-1] - days[0]).days == len(days) - 1:
+        return f"from {names[0]} to {names[-1]}"
+    return "on " + " and ".join(names)
+
+
+class EventRouter:
+    """
+    Answers date, time and room questions about events from the event index.
+
+    `route()` recognises questions like "what's happening this Friday
+    evening?" or "any classes in the Library next week?" and turns them into
+    time windows; the matching rows are then handed to the LLM as context,
+    so these questions skip embedding and vector search altogether. Other
+    questions return None and go through normal retrieval.
+    """
+
+    def __init__(self, index: EventIndex, timezone: Optional[str] = None, upcoming_days: Optional[int] = None):
+        if timezone is None:
+            timezone = os.getenv("EVENTS_TIMEZONE", "America/Chicago")
+        if upcoming_days is None:
+            upcoming_days = int(os.getenv("EVENTS_UPCOMING_DAYS", "30"))
+        self.index = index
+        self.timezone = timezone
+        self.upcoming_days = upcoming_days
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> Optional["EventRouter"]:
+        """
+        Builds the router from the events CSV (`EVENTS_CSV`).
+
+        Returns:
+            Optional[EventRouter]: The router, or None if the CSV doesn't exist.
+        """
+        path = path or EVENTS_CSV
+        if not os.path.exists(path):
+            logger.warning("Events sheet %s not found; event questions will use search", path)
+            return None
+        index = EventIndex.from_csv(path)
+        logger.info("Indexed %d event(s) from %s", len(index), path)
+        return cls(index)
+
+    def today(self) -> date:
+        return local_today(self.timezone)
+
+    def route(self, question: str, today: Optional[date] = None) -> Optional[EventQuery]:
+        """
+        Turns an event question into an index query.
+
+        Args:
+            question (str): The user's question.
+            today (Optional[date]): Overrides the local date.
+
+        Returns:
+            Optional[EventQuery]: The windows to look up, or None if this isn't a date, time or room question about events.
+        """
+        text = question.lower().replace("’", "'")
+        if not EVENT_WORDS.search(text):
+            return None
+        today = today or self.today()
+        days = parse_days(text, today)
+        time_of_day = parse_time_of_day(text)
+        room = self.index.find_room(text)
+        if days:
+            description = describe_days(days)
+        elif room is not None or time_of_day is not None:
+            days = [today + timedelta(days=i) for i in range(self.upcoming_days)]
+            description = f"in the next {self.upcoming_days} days"
+        else:
+            return None
+
+        windows: List[Tuple[int, int]] = []
+        for day in days:
+            base = day.toordinal() * MINUTES_PER_DAY
+            start, end = (time_of_day[0], time_of_day[1]) if time_of_day else (0, MINUTES_PER_DAY)
+            if windows and windows[-1][1] == base + start:
+                windows[-1] = (windows[-1][0], base + end)
+            else:
+                windows.append((base + start, base + end))
+
+        if time_of_day:
+            description += f" {time_of_day[2]}"
+        if room:
+            description += f" in {room}"
+        return EventQuery(windows, description, room)
+
+    def assemble_context(self, query: EventQuery, count_tokens: Callable[[str], int], max_tokens: int) -> AssembledContext:
+        """
+        Lists the matching events as context, in date order, within a token budget.
+
+        Args:
+            query (EventQuery): What `route()` returned.
+            count_tokens (Callable[[str], int]): The LLM token counter.
+            max_tokens (int): The context budget.
+
+        Returns:
+            AssembledContext: One piece per event that fit; doc IDs are "event:<row>".
+        """
+        events = self.index.lookup(query.windows, query.room)
+        header = f"Events {query.description}, from the ICF events calendar:"
+        if not events:
+            text = f"{header}\nNo events are scheduled {query.description}."
+            return AssembledContext(text, [], count_tokens(text))
+
+        lines = [header]
+        pieces = []
+        tokens = count_tokens(header)
+        for event in events:
+            line = f"- {event.describe()}"
+            line_tokens = count_tokens(line)
+            if tokens + line_tokens > max_tokens:
+                break
+            lines.append(line)
+            tokens += line_tokens
+            pieces.append(ContextPiece(line, 1.0, "events", event.row, event.row, [f"event:{event.row}"]))
+        dropped = len(events) - len(pieces)
+        if dropped:
+            lines.append(f"(and {dropped} more)")
+        return AssembledContext("\n".join(lines), pieces, tokens, dropped_over_budget=dropped)
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from chunking import extract_blocks
+
+
+def select_parser(name: Optional[str] = None) -> str:
+    """
+    Picks the BeautifulSoup parser backend.
+
+    Args:
+        name (Optional[str]): "lxml", "html.parser", "html5lib" or "auto". Defaults to
+            the HTML_PARSER environment variable, then "auto".
+
+    Returns:
+        str: The parser name; "auto" resolves to lxml when it is installed.
+    """
+    name = name or os.getenv("HTML_PARSER", "auto")
+    if name != "auto":
+        return name
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+    return "lxml"
+
+
+def parallel_extract(
+    documents: Iterable[Tuple[Hashable, object]],
+    workers: Optional[int] = None,
+    parser: Optional[str] = None,
+) -> Iterator[Tuple[Hashable, List[str]]]:
+    """
+    Runs visible-text block extraction for many pages in a process pool.
+
+    Documents are submitted lazily with at most two per worker in flight, and
+    results are yielded in input order as soon as each one is ready, so the
+    caller can embed page N while later pages are still being parsed.
+
+    Only parsing runs in the pool. Token chunking stays with the caller
+    because it comes after boilerplate filtering, which needs counts from
+    across the whole site. Workers are spawned, not forked, because the
+    caller is usually a pipeline thread running next to one that is loading
+    torch and the tokenizer, and forking a process with other threads
+    running can deadlock the child.
+
+    Args:
+        documents (Iterable[Tuple[Hashable, object]]): (key, html) pairs, where html is
+            a str, bytes or mmap (maps are copied to bytes before crossing processes).
+        workers (Optional[int]): Worker processes; defaults to the CPU count.
+        parser (Optional[str]): BeautifulSoup parser; see `select_parser`.
+
+    Yields:
+        Tuple[Hashable, List[str]]: Each key with its text blocks, ready for
+        boilerplate filtering and chunking.
+    """
+    workers = workers or os.cpu_count() or 1
+    parser = select_parser(parser)
+
+    if workers == 1:
+        for key, html in documents:
+            yield key, extract_blocks(html, parser)
+        return
+
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for key, html in documents:
+            if not isinstance(html, (str, bytes)):
+                html = html[:]
+            in_flight.append((key, pool.submit(extract_blocks, html, parser)))
+            if len(in_flight) >= workers * 2:
+                done_key, future = in_flight.popleft()
+                yield done_key, future.result()
+        while in_flight:
+            done_key, future = in_flight.popleft()
+            yield done_key, future.result()
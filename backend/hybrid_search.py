@@ -0,0 +1,230 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from keyword_index import BM25Index, get_keyword_index
+from log_setup import get_logger
+from retrieval import ChromaStore, get_store
+from vector_index import NumpyVectorIndex, get_vector_backend
+
+logger = get_logger("hybrid_search")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merges several rankings of document IDs into one.
+
+    Each document scores 1 / (k + rank) in every ranking it appears in, so
+    documents that rank well in both the keyword and the vector search rise
+    to the top without having to calibrate BM25 scores against distances.
+
+    Args:
+        rankings (Sequence[Sequence[str]]): Document IDs, best first, one sequence per retriever.
+        k (int): Damping constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        List[Tuple[str, float]]: (document ID, fused score) pairs, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class CrossEncoderReranker:
+    """
+    Re-scores (question, chunk) pairs with a local cross-encoder, within a time budget.
+
+    Candidates are scored in small batches in fused order. Once `budget_ms`
+    is spent (or the measured cost per pair says the next batch won't fit),
+    the remaining candidates keep their fused order behind the scored ones,
+    so a slow CPU degrades to plain hybrid retrieval instead of slow answers.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, budget_ms: Optional[float] = None, batch_size: int = 8):
+        if model_name is None:
+            model_name = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        if budget_ms is None:
+            budget_ms = float(os.getenv("RERANK_BUDGET_MS", "150"))
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._lock = threading.Lock()
+        self._seconds_per_pair: Optional[float] = None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def rerank(self, query: str, candidates: List[Tuple[str, str]]) -> List[str]:
+        """
+        Orders candidates by cross-encoder relevance.
+
+        Args:
+            query (str): The user's question.
+            candidates (List[Tuple[str, str]]): (document ID, text) pairs in fused order.
+
+        Returns:
+            List[str]: Document IDs, best first.
+        """
+        model = self.load()
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        scored: List[Tuple[str, float]] = []
+        position = 0
+        while position < len(candidates):
+            remaining = deadline - time.perf_counter()
+            batch = candidates[position:position + self.batch_size]
+            if remaining <= 0 or (self._seconds_per_pair and self._seconds_per_pair * len(batch) > remaining):
+                break
+            started = time.perf_counter()
+            scores = model.predict([(query, text) for _, text in batch])
+            cost = (time.perf_counter() - started) / len(batch)
+            # Exponential moving average, so one slow batch doesn't disable reranking for good
+            self._seconds_per_pair = cost if self._seconds_per_pair is None else 0.8 * self._seconds_per_pair + 0.2 * cost
+            scored.extend((doc_id, float(score)) for (doc_id, _), score in zip(batch, scores))
+            position += len(batch)
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return [doc_id for doc_id, _ in scored] + [doc_id for doc_id, _ in candidates[position:]]
+
+
+class HybridRetriever:
+    """
+    Combines BM25 keyword search and vector search with reciprocal-rank fusion.
+
+    Both retrievers return `candidates` documents; the fused list is
+    optionally reranked and cut to `n_results`. Vector search goes to the
+    backend chosen by `VECTOR_BACKEND` (Chroma, or the NumPy index exported
+    from it). The keyword index is reloaded from disk whenever the store's
+    ingestion marker changes (switching to the new version's index after a
+    swap), and is rebuilt from the collection if it was never saved.
+    """
+
+    def __init__(
+        self,
+        store: ChromaStore,
+        keyword_index: Optional[BM25Index] = None,
+        candidates: Optional[int] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rrf_k: int = 60,
+        vectors: Optional[Union[ChromaStore, NumpyVectorIndex]] = None,
+    ):
+        if candidates is None:
+            candidates = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+        self.store = store
+        # Not `or`: an empty index is falsy, and would be swapped for the shared one
+        self.vectors = vectors if vectors is not None else get_vector_backend(store)
+        self.keyword_index = keyword_index if keyword_index is not None else get_keyword_index(
+            store.path, store.collection_name
+        )
+        # An index passed in stays put; the default one follows the store to whichever version is active
+        self._follow_store = keyword_index is None
+        self.candidates = candidates
+        self.reranker = reranker
+        self.rrf_k = rrf_k
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+
+    def refresh(self):
+        """Reloads the keyword index if the collection was re-ingested since it was last loaded."""
+        generation = self.store.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            if self._follow_store:
+                self.keyword_index = get_keyword_index(self.store.path, self.store.collection_name)
+            if not self.keyword_index.load() and self.store.collection.count():
+                logger.warning("Keyword index not found; rebuilding it from the collection")
+                self.keyword_index.rebuild(self.store.collection)
+                self.keyword_index.save()
+            self._generation = generation
+
+    def warm_up(self):
+        self.refresh()
+        if self.vectors is not self.store:
+            self.vectors.refresh()
+        if self.reranker:
+            self.reranker.load()
+
+    def search(self, query: str, query_embedding: List[float], n_results: int = 5) -> dict:
+        """
+        Runs the keyword and vector searches and fuses their rankings.
+
+        Args:
+            query (str): The user's question.
+            query_embedding (List[float]): The embedded question.
+            n_results (int): How many documents to return.
+
+        Returns:
+            dict: A Chroma-shaped result with `ids`, `documents`, `metadatas` and `scores`: the
+            fused scores, or with a reranker 1 / (rank + 1) in its order.
+        """
+        self.refresh()
+        candidates = max(n_results, self.candidates)
+        vector = self.vectors.query(query_embedding, n_results=candidates)
+        keyword = self.keyword_index.search(query, n_results=candidates)
+
+        documents: Dict[str, Tuple[str, Optional[dict]]] = {}
+        vector_ids = vector["ids"][0]
+        metadatas = (vector.get("metadatas") or [[None] * len(vector_ids)])[0]
+        for doc_id, text, metadata in zip(vector_ids, vector["documents"][0], metadatas):
+            documents[doc_id] = (text, metadata)
+
+        fused = reciprocal_rank_fusion([vector_ids, [doc_id for doc_id, _ in keyword]], k=self.rrf_k)
+        missing = [doc_id for doc_id, _ in fused if doc_id not in documents]
+        if missing:
+            found = self.vectors.get(missing)
+            for doc_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                documents[doc_id] = (text, metadata)
+        # Keyword hits deleted from the collection since the index was saved are dropped here
+        fused = [(doc_id, score) for doc_id, score in fused if doc_id in documents]
+
+        ranked = [doc_id for doc_id, _ in fused]
+        scores = dict(fused)
+        if self.reranker and len(ranked) > 1:
+            ranked = self.reranker.rerank(query, [(doc_id, documents[doc_id][0]) for doc_id in ranked])
+            # Consumers re-sort by score (the context assembler does), so the scores must follow the reranked order
+            scores = {doc_id: 1.0 / (rank + 1) for rank, doc_id in enumerate(ranked)}
+        top = ranked[:n_results]
+        return {
+            "ids": [top],
+            "documents": [[documents[doc_id][0] for doc_id in top]],
+            "metadatas": [[documents[doc_id][1] for doc_id in top]],
+            "scores": [[scores[doc_id] for doc_id in top]],
+        }
+
+
+_retrievers: Dict[int, HybridRetriever] = {}
+_retrievers_lock = threading.Lock()
+
+
+def get_retriever(store: Optional[ChromaStore] = None) -> HybridRetriever:
+    """
+    Returns the process-wide hybrid retriever for a store.
+
+    The cross-encoder stage is enabled by setting `RERANK=1`; its model and
+    latency budget come from `RERANKER_MODEL` and `RERANK_BUDGET_MS`.
+
+    Args:
+        store (Optional[ChromaStore]): The store to search; defaults to the process-wide one.
+
+    Returns:
+        HybridRetriever: The shared retriever.
+    """
+    store = store or get_store()
+    with _retrievers_lock:
+        retriever = _retrievers.get(id(store))
+        if retriever is None:
+            reranker = CrossEncoderReranker() if os.getenv("RERANK", "0") == "1" else None
+            retriever = _retrievers[id(store)] = HybridRetriever(store, reranker=reranker)
+    return retriever
@@ -0,0 +1,333 @@
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from keyword_index import keyword_index_path
+from log_setup import get_logger
+from manifest import manifest_path
+from retrieval import GENERATION_FILE, ChromaStore, get_store, read_pointer, write_pointer
+
+logger = get_logger("index_versions")
+
+VERSION_PATTERN = "{collection}_v{number:04d}"
+# Facts every good build answers; a build that can't find them is not activated
+DEFAULT_VALIDATION_QUERIES = [
+    {"question": "When was the Islamic Center of Frisco established?", "expect": "2007"},
+    {"question": "What is the address of the Islamic Center of Frisco?", "expect": "11137 Frisco St"},
+    {"question": "What is the main phone number?", "expect": "252-4532"},
+    {"question": "What education programs does ICF offer?", "expect": "Quran Academy"},
+]
+
+
+class VersionError(Exception):
+    pass
+
+
+@dataclass
+class ValidationReport:
+    collection: str
+    documents: int
+    ok: bool = True
+    failures: List[str] = field(default_factory=list)
+    latency_ms: Dict[str, float] = field(default_factory=dict)
+
+    def fail(self, reason: str):
+        self.ok = False
+        self.failures.append(reason)
+
+
+def load_validation_queries(path: Optional[str] = None) -> List[dict]:
+    """
+    Loads the validation query set.
+
+    Args:
+        path (Optional[str]): A JSON list of {"question", "expect"} objects; defaults to
+            `VALIDATION_QUERIES`, or the built-in set if that isn't set either.
+
+    Returns:
+        List[dict]: The queries.
+    """
+    path = path or os.getenv("VALIDATION_QUERIES")
+    if not path:
+        return list(DEFAULT_VALIDATION_QUERIES)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class CollectionVersions:
+    """
+    Builds, validates, swaps, rolls back and garbage-collects versions of a collection.
+
+    A versioned build never writes into the collection being served.
+    `create()` makes a new `<name>_vNNNN` collection, either empty for a
+    full rebuild or as a clone of the active version (documents,
+    embeddings, keyword index and ingestion manifest) that ingestion then
+    applies the site's changes to. The clone re-inserts every embedding
+    into a new HNSW index, so it costs the size of the collection, not of
+    the diff; nightly incremental runs therefore write in place, and
+    versions are for changes worth validating first. `validate()` runs the
+    validation query set against it, and `activate()` switches the pointer
+    file that every `ChromaStore` for `<name>` follows, in one atomic
+    rename. Serving processes keep answering from the old version until
+    then, so latency doesn't move during a rebuild. The previously active
+    versions are kept (`COLLECTION_VERSIONS_KEEP` in total) for `rollback()`;
+    `gc()` drops the rest along with their side files.
+    """
+
+    def __init__(self, store: Optional[ChromaStore] = None, keep: Optional[int] = None):
+        if keep is None:
+            keep = int(os.getenv("COLLECTION_VERSIONS_KEEP", "3"))
+        self.store = store or get_store()
+        self.keep = max(2, keep)
+
+    @property
+    def base_name(self) -> str:
+        return self.store.name
+
+    def pointer(self) -> dict:
+        return read_pointer(self.store.path, self.base_name) or {"collection": self.base_name, "history": []}
+
+    def active(self) -> str:
+        return self.pointer()["collection"]
+
+    def versions(self) -> List[str]:
+        """The versioned collections that exist, oldest first."""
+        pattern = re.compile(re.escape(self.base_name) + r"_v(\d+)$")
+        names = [getattr(collection, "name", collection) for collection in self.store.client.list_collections()]
+        return sorted((name for name in names if pattern.match(name)), key=lambda name: int(pattern.match(name).group(1)))
+
+    def _next_name(self) -> str:
+        versions = self.versions()
+        number = int(versions[-1].rsplit("_v", 1)[1]) + 1 if versions else 1
+        return VERSION_PATTERN.format(collection=self.base_name, number=number)
+
+    def create(self, clone: bool = True, page_size: int = 1000) -> ChromaStore:
+        """
+        Creates the next version, optionally as a copy of the active one.
+
+        Chroma keeps every collection in one SQLite file, so there is no
+        segment directory to copy: cloning reads and re-inserts every
+        document and embedding.
+
+        Args:
+            clone (bool): Copy the active version's documents, embeddings, keyword index and manifest.
+            page_size (int): Documents copied per request.
+
+        Returns:
+            ChromaStore: A store pinned to the new version, to ingest into.
+        """
+        name = self._next_name()
+        staging = get_store(self.store.path, name)
+        target = staging.collection
+        if clone:
+            source_name = self.active()
+            source = self.store.client.get_or_create_collection(name=source_name)
+            offset = 0
+            while True:
+                page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+                if not len(page["ids"]):
+                    break
+                target.upsert(ids=page["ids"], documents=page["documents"], embeddings=page["embeddings"],
+                              metadatas=page["metadatas"])
+                offset += len(page["ids"])
+            for path_fn in (keyword_index_path, manifest_path):
+                if os.path.exists(path_fn(self.store.path, source_name)):
+                    shutil.copyfile(path_fn(self.store.path, source_name), path_fn(self.store.path, name))
+            logger.info("Created %s as a copy of %s (%d documents)", name, source_name, offset)
+        else:
+            logger.info("Created empty %s", name)
+        return staging
+
+    def _check_exists(self, name: str):
+        if name != self.base_name and name not in self.versions():
+            raise VersionError(f"{name} does not exist")
+
+    def validate(self, name: str, queries: Optional[List[dict]] = None, n_results: int = 5,
+                 min_ratio: Optional[float] = None) -> ValidationReport:
+        """
+        Checks a version before it is served.
+
+        The version must not be empty, must hold at least `min_ratio` of the
+        active version's documents (a crawl that failed halfway shouldn't
+        replace a good index), and every validation question must find its
+        expected text in the top `n_results` documents.
+
+        Args:
+            name (str): The version to check.
+            queries (Optional[List[dict]]): {"question", "expect"} pairs; defaults to `load_validation_queries()`.
+            n_results (int): How many documents each question may look at.
+            min_ratio (Optional[float]): Defaults to `VALIDATION_MIN_RATIO` (0.8).
+
+        Returns:
+            ValidationReport: Whether the version passed, and why not.
+
+        Raises:
+            VersionError: If the version doesn't exist.
+        """
+        from encoder import encode_texts
+
+        self._check_exists(name)
+        if min_ratio is None:
+            min_ratio = float(os.getenv("VALIDATION_MIN_RATIO", "0.8"))
+        queries = load_validation_queries() if queries is None else queries
+        collection = self.store.client.get_or_create_collection(name=name)
+        report = ValidationReport(name, collection.count())
+        if not report.documents:
+            report.fail("collection is empty")
+            return report
+
+        active = self.active()
+        if active != name:
+            active_count = self.store.client.get_or_create_collection(name=active).count()
+            if report.documents < active_count * min_ratio:
+                report.fail(f"{report.documents} documents, fewer than {min_ratio:.0%} of the {active_count} in {active}")
+
+        if queries:
+            embeddings = encode_texts([query["question"] for query in queries])
+            for query, embedding in zip(queries, embeddings):
+                started = time.perf_counter()
+                result = collection.query(query_embeddings=[embedding.tolist()], n_results=n_results)
+                report.latency_ms[query["question"]] = round((time.perf_counter() - started) * 1000, 3)
+                expect = query["expect"].lower()
+                if not any(expect in (document or "").lower() for document in result["documents"][0]):
+                    report.fail(f"{query['question']!r} did not find {query['expect']!r}")
+        return report
+
+    def activate(self, name: str, validate: bool = True) -> Optional[ValidationReport]:
+        """
+        Makes `name` the version that is served.
+
+        Args:
+            name (str): The version to serve.
+            validate (bool): Refuse to switch if the version fails validation.
+
+        Returns:
+            Optional[ValidationReport]: The validation result, if it ran.
+
+        Raises:
+            VersionError: If the version doesn't exist or fails validation.
+        """
+        report = self.validate(name) if validate else self._check_exists(name)
+        if report is not None and not report.ok:
+            raise VersionError(f"{name} failed validation: {'; '.join(report.failures)}")
+        pointer = self.pointer()
+        if pointer["collection"] != name:
+            history = [old for old in [pointer["collection"]] + pointer["history"] if old != name]
+            write_pointer(self.store.path, self.base_name, name, history)
+        logger.info("Now serving %s (was %s)", name, pointer["collection"])
+        self._prepare_vector_index()
+        return report
+
+    def rollback(self) -> str:
+        """
+        Switches back to the previously active version, without validating it again.
+
+        Returns:
+            str: The version now served.
+
+        Raises:
+            VersionError: If there is no earlier version left to go back to.
+        """
+        pointer = self.pointer()
+        existing = set(self.versions()) | {self.base_name}
+        previous = next((name for name in pointer["history"] if name in existing), None)
+        if previous is None:
+            raise VersionError("no previous version to roll back to")
+        history = [old for old in pointer["history"] if old != previous]
+        write_pointer(self.store.path, self.base_name, previous, [pointer["collection"]] + history)
+        logger.warning("Rolled back from %s to %s", pointer["collection"], previous)
+        self._prepare_vector_index()
+        return previous
+
+    def _prepare_vector_index(self):
+        # Export the NumPy index for the new generation here, not on a serving request
+        from vector_index import get_vector_index, vector_backend_name
+
+        if vector_backend_name() == "numpy":
+            get_vector_index(self.store).refresh()
+
+    def gc(self) -> List[str]:
+        """
+        Deletes versions that are neither active nor among the most recent previous ones.
+
+        Versions newer than the active one (built but not yet activated) are kept too.
+
+        Returns:
+            List[str]: The deleted versions.
+        """
+        pointer = self.pointer()
+        versions = self.versions()
+        keep = {pointer["collection"]} | set(pointer["history"][:self.keep - 1])
+        if pointer["collection"] in versions:
+            keep.update(versions[versions.index(pointer["collection"]) + 1:])
+        deleted = []
+        for name in versions:
+            if name in keep:
+                continue
+            self.store.client.delete_collection(name)
+            self._remove_side_files(name)
+            deleted.append(name)
+        if deleted:
+            logger.info("Deleted old version(s): %s", ", ".join(deleted))
+        return deleted
+
+    def _remove_side_files(self, name: str):
+        from vector_index import index_directory
+
+        for path in (keyword_index_path(self.store.path, name), manifest_path(self.store.path, name),
+                     os.path.join(self.store.path, GENERATION_FILE.format(collection=name))):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(index_directory(self.store.path, name), ignore_errors=True)
+
+    def status(self) -> dict:
+        pointer = self.pointer()
+        return {
+            "name": self.base_name,
+            "active": pointer["collection"],
+            "history": pointer["history"],
+            "activated_at": pointer.get("activated_at"),
+            "versions": self.versions(),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and switch versions of the Chroma collection.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Show the active version, its history and all versions.")
+    validate = commands.add_parser("validate", help="Run the validation query set against a version.")
+    validate.add_argument("name")
+    activate = commands.add_parser("activate", help="Validate a version and serve it.")
+    activate.add_argument("name")
+    activate.add_argument("--force", action="store_true", help="Skip validation.")
+    commands.add_parser("rollback", help="Serve the previously active version again.")
+    commands.add_parser("gc", help="Delete old versions.")
+    args = parser.parse_args()
+
+    versions = CollectionVersions()
+    try:
+        if args.command == "status":
+            print(json.dumps(versions.status(), indent=2))
+        elif args.command == "validate":
+            report = versions.validate(args.name)
+            print(f"[{'✓' if report.ok else '✗'}] {report.collection}: {report.documents} documents")
+            for failure in report.failures:
+                print(f"  {failure}")
+        elif args.command == "activate":
+            versions.activate(args.name, validate=not args.force)
+            print(f"[✓] Now serving {args.name}")
+        elif args.command == "rollback":
+            print(f"[✓] Rolled back to {versions.rollback()}")
+        elif args.command == "gc":
+            print(f"[✓] Deleted {len(versions.gc())} old version(s)")
+    except VersionError as e:
+        print(f"[✗] {e}")
+        raise SystemExit(1)
@@ -0,0 +1,448 @@
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_cache import get_embedding_cache
+from encoder import MODEL_NAME, encode_texts, flush_embedding_cache
+from keyword_index import BM25Index, get_keyword_index
+from chunking import BoilerplateFilter, Chunk, TokenChunker
+from extraction import parallel_extract
+from manifest import IngestManifest, chunk_id
+from retrieval import ChromaStore, get_store
+from vector_db_pipline import ABOUT_US_TEXT, HTML_DIR, iter_html_snapshot
+from vector_index import get_vector_index, vector_backend_name
+
+# (url, etag, last_modified) travels with each page so the manifest can be updated after upload
+PageKey = Tuple[str, Optional[str], Optional[str]]
+
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    pass
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+    def report(self, unit: str) -> str:
+        rate = self.items / self.busy_seconds if self.busy_seconds else 0.0
+        return f"  └ {self.name:<8} {self.items:>7} {unit:<7} busy {self.busy_seconds:7.2f}s  {rate:9.1f} {unit}/s"
+
+
+@dataclass
+class _Chunk:
+    id: str
+    text: str
+    metadata: dict
+
+
+@dataclass
+class _PageDone:
+    url: str
+    chunk_ids: List[str]
+    stale_ids: List[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+@dataclass
+class _Batch:
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]
+    embeddings: np.ndarray
+
+
+@dataclass
+class IngestionResult:
+    pages: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    seen_urls: set = field(default_factory=set)
+    bad_urls: List[str] = field(default_factory=list)
+
+
+class IngestionPipeline:
+    """
+    Streams pages through extract → chunk → embed → upsert with bounded memory.
+
+    Each stage runs on its own thread and hands work to the next through a
+    queue of at most `queue_size` items, so a fast producer blocks instead of
+    buffering the whole site. Block extraction runs in the process pool from
+    `extraction.parallel_extract`; the chunk stage drops learned boilerplate
+    and packs blocks into token-sized chunks (holding back only the first
+    `boilerplate_sample` pages while the filter warms up). Only chunks whose
+    content-derived ID is new are embedded, in fixed-size float32 batches,
+    and upserted to Chroma and the BM25 keyword index in batches. A page's
+    manifest entry is written only after all of its chunks have been upserted.
+    """
+
+    def __init__(
+        self,
+        manifest: Optional[IngestManifest] = None,
+        store: Optional[ChromaStore] = None,
+        batch_size: int = 64,
+        queue_size: int = 8,
+        workers: Optional[int] = None,
+        parser: Optional[str] = None,
+        boilerplate: Optional[BoilerplateFilter] = None,
+        chunker: Optional[TokenChunker] = None,
+        boilerplate_sample: int = 25,
+        keyword_index: Optional[BM25Index] = None,
+    ):
+        self.manifest = manifest if manifest is not None else IngestManifest()
+        self.store = store or get_store()
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.workers = workers
+        self.parser = parser
+        self.boilerplate = boilerplate or BoilerplateFilter()
+        self.chunker = chunker or TokenChunker()
+        self.boilerplate_sample = max(1, boilerplate_sample)
+        if keyword_index is None:
+            keyword_index = get_keyword_index(self.store.path, self.store.collection_name)
+        self.keyword_index = keyword_index
+
+        self.stats = {name: StageStats(name) for name in ("fetch", "extract", "chunk", "embed", "upsert")}
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def _put(self, q: queue.Queue, item):
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise _Cancelled()
+
+    def _stage(self, target: Callable, *args) -> threading.Thread:
+        def run():
+            try:
+                target(*args)
+            except _Cancelled:
+                pass
+            except BaseException as e:
+                self._errors.append(e)
+                self._stop.set()
+
+        thread = threading.Thread(target=run, name=f"ingest-{target.__name__}", daemon=True)
+        thread.start()
+        return thread
+
+    def _timed(self, documents: Iterable[Tuple[PageKey, object]]) -> Iterator[Tuple[PageKey, object]]:
+        stats = self.stats["fetch"]
+        iterator = iter(documents)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            stats.busy_seconds += time.perf_counter() - started
+            stats.items += 1
+            yield item
+
+    def _extract(self, documents: Iterable[Tuple[PageKey, object]], out: queue.Queue):
+        stats = self.stats["extract"]
+        started = time.perf_counter()
+        for key, segments in parallel_extract(self._timed(documents), self.workers, self.parser):
+            stats.items += 1
+            stats.busy_seconds += time.perf_counter() - started
+            self._put(out, (key, segments))
+            started = time.perf_counter()
+        self._put(out, _DONE)
+
+    def _chunk_page(self, key: PageKey, blocks: List[str], out: queue.Queue, result: IngestionResult):
+        stats = self.stats["chunk"]
+        started = time.perf_counter()
+        url, etag, last_modified = key
+        chunks = self.chunker.chunk(self.boilerplate.filter(blocks), url)
+        result.pages += 1
+        result.seen_urls.add(url)
+        if any(ABOUT_US_TEXT in chunk.text for chunk in chunks):
+            result.bad_urls.append(url)
+
+        # Stable, content-derived IDs; a chunk repeated on the page is stored once
+        chunks_by_id: Dict[str, Chunk] = {}
+        for chunk in chunks:
+            chunks_by_id.setdefault(chunk_id(url, chunk.text), chunk)
+        old_ids = set(self.manifest.chunk_ids(url))
+        new_chunks = [_Chunk(doc_id, chunk.text, chunk.metadata) for doc_id, chunk in chunks_by_id.items()
+                      if doc_id not in old_ids]
+        stale_ids = [doc_id for doc_id in old_ids if doc_id not in chunks_by_id]
+        stats.items += 1
+        stats.busy_seconds += time.perf_counter() - started
+
+        for chunk in new_chunks:
+            self._put(out, chunk)
+        self._put(out, _PageDone(url, list(chunks_by_id), stale_ids, etag, last_modified))
+
+    def _chunk(self, pages: queue.Queue, out: queue.Queue, result: IngestionResult):
+        # Hold back the first few pages until the boilerplate filter has seen enough of the site
+        warmup: List[Tuple[PageKey, List[str]]] = []
+        while True:
+            item = self._get(pages)
+            if item is _DONE:
+                break
+            key, blocks = item
+            self.boilerplate.observe(blocks)
+            if warmup is not None:
+                warmup.append(item)
+                if len(warmup) < self.boilerplate_sample:
+                    continue
+                for held_key, held_blocks in warmup:
+                    self._chunk_page(held_key, held_blocks, out, result)
+                warmup = None
+                continue
+            self._chunk_page(key, blocks, out, result)
+        for held_key, held_blocks in warmup or []:
+            self._chunk_page(held_key, held_blocks, out, result)
+        self._put(out, _DONE)
+
+    def _embed(self, chunks: queue.Queue, out: queue.Queue):
+        stats = self.stats["embed"]
+        pending_chunks: List[_Chunk] = []
+        pending_pages: List[_PageDone] = []
+
+        def flush():
+            if pending_chunks:
+                started = time.perf_counter()
+                embeddings = encode_texts([chunk.text for chunk in pending_chunks])
+                stats.items += len(pending_chunks)
+                stats.busy_seconds += time.perf_counter() - started
+                self._put(out, _Batch(
+                    [c.id for c in pending_chunks],
+                    [c.text for c in pending_chunks],
+                    [c.metadata for c in pending_chunks],
+                    embeddings,
+                ))
+            # Page markers go out after the batch holding their last chunk
+            for page in pending_pages:
+                self._put(out, page)
+            pending_chunks.clear()
+            pending_pages.clear()
+
+        while True:
+            item = self._get(chunks)
+            if item is _DONE:
+                break
+            if isinstance(item, _PageDone):
+                pending_pages.append(item)
+                if not pending_chunks:
+                    flush()
+                continue
+            pending_chunks.append(item)
+            if len(pending_chunks) >= self.batch_size:
+                flush()
+        flush()
+        self._put(out, _DONE)
+
+    def _upsert(self, batches: queue.Queue, result: IngestionResult):
+        stats = self.stats["upsert"]
+        collection = self.store.collection
+        while True:
+            item = self._get(batches)
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            if isinstance(item, _Batch):
+                collection.upsert(ids=item.ids, documents=item.texts, metadatas=item.metadatas, embeddings=item.embeddings)
+                self.keyword_index.add(item.ids, item.texts)
+                stats.items += len(item.ids)
+                result.chunks_embedded += len(item.ids)
+            else:
+                if item.stale_ids:
+                    collection.delete(ids=item.stale_ids)
+                    self.keyword_index.remove(item.stale_ids)
+                    result.chunks_deleted += len(item.stale_ids)
+                self.manifest.update(item.url, item.chunk_ids, etag=item.etag, last_modified=item.last_modified)
+            stats.busy_seconds += time.perf_counter() - started
+
+    def run(self, documents: Iterable[Tuple[PageKey, object]]) -> IngestionResult:
+        """
+        Ingests a stream of pages.
+
+        Args:
+            documents (Iterable[Tuple[PageKey, object]]): ((url, etag, last_modified), html)
+                pairs, consumed lazily.
+
+        Returns:
+            IngestionResult: Counts, the URLs that were seen and those that failed validation.
+        """
+        result = IngestionResult()
+        pages: queue.Queue = queue.Queue(self.queue_size)
+        chunks: queue.Queue = queue.Queue(self.queue_size * self.batch_size)
+        batches: queue.Queue = queue.Queue(self.queue_size)
+
+        started = time.perf_counter()
+        threads = [
+            self._stage(self._extract, documents, pages),
+            self._stage(self._chunk, pages, chunks, result),
+            self._stage(self._embed, chunks, batches),
+        ]
+        try:
+            self._upsert(batches, result)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.manifest.save()
+            self.boilerplate.save()
+            self.keyword_index.save()
+            flush_embedding_cache()
+            if result.chunks_embedded or result.chunks_deleted:
+                self.store.mark_ingested()
+
+        if self._errors:
+            raise self._errors[0]
+        if vector_backend_name() == "numpy":
+            # Export the new vectors now, so the API loads them instead of building them on a request
+            get_vector_index(self.store).refresh()
+
+        elapsed = time.perf_counter() - started
+        print(f"[✓] Ingested {result.pages} page(s) in {elapsed:.1f}s: "
+              f"{result.chunks_embedded} chunk(s) embedded, {result.chunks_deleted} deleted")
+        print(self.stats["fetch"].report("pages"))
+        print(self.stats["extract"].report("pages"))
+        print(self.stats["chunk"].report("pages"))
+        print(self.stats["embed"].report("chunks"))
+        print(self.stats["upsert"].report("chunks"))
+        cache = get_embedding_cache(MODEL_NAME)
+        if cache is not None:
+            cache_stats = cache.stats()
+            print(f"[✓] Embedding cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es), "
+                  f"{cache_stats['entries']} entries")
+        return result
+
+
+def crawl_documents(
+    start_url: str,
+    manifest: Optional[IngestManifest] = None,
+    on_unchanged: Optional[Callable[[str], None]] = None,
+    on_failed: Optional[Callable[[str, str], None]] = None,
+    on_unreached: Optional[Callable[[str], None]] = None,
+    queue_size: int = 8,
+    **crawler_kwargs,
+) -> Iterator[Tuple[PageKey, str]]:
+    """
+    Runs the async crawler on a background thread and yields pages as they arrive.
+
+    The hand-off queue is bounded, so the crawler pauses when ingestion falls
+    behind instead of holding the whole site in memory.
+
+    Args:
+        start_url (str): Where to start crawling.
+        manifest (Optional[IngestManifest]): Supplies conditional-request headers.
+        on_unchanged (Optional[Callable[[str], None]]): Called with the URL of each 304 page.
+        on_failed (Optional[Callable[[str, str], None]]): Called once the crawl ends with the URL and
+            error of each page that could not be fetched.
+        on_unreached (Optional[Callable[[str], None]]): Called once the crawl ends with the URL of
+            each page that was linked but never fetched.
+        queue_size (int): Pages buffered between the crawler and ingestion.
+        **crawler_kwargs: Passed through to `crawler.Crawler`.
+
+    Yields:
+        Tuple[PageKey, str]: ((url, etag, last_modified), html) for each changed page.
+    """
+    from crawler import Crawler
+
+    crawler = Crawler(
+        start_url,
+        conditional_headers=manifest.conditional_headers if manifest else None,
+        **crawler_kwargs,
+    )
+    pages: queue.Queue = queue.Queue(queue_size)
+    stop = threading.Event()
+    finished = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(item) -> bool:
+        # Waits for room, but gives up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def produce():
+        try:
+            async for page in crawler.iter_pages():
+                # Waiting for room is the backpressure: the crawler's own bounded queues fill up and its
+                # workers wait. It happens off the event loop, so fetches already in flight keep going.
+                if not await asyncio.to_thread(put, page):
+                    break
+        finally:
+            await asyncio.to_thread(put, _DONE)
+            finished.set()
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if not finished.is_set():
+                # The loop died before produce() could say so
+                put(_DONE)
+
+    thread = threading.Thread(target=run, name="ingest-crawl", daemon=True)
+    thread.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                break
+            if page.not_modified:
+                if on_unchanged:
+                    on_unchanged(page.url)
+                continue
+            yield (page.url, page.etag, page.last_modified), page.html
+    finally:
+        stop.set()
+        thread.join()
+    if on_failed:
+        for url, error in crawler.failed.items():
+            on_failed(url, error)
+    if on_unreached:
+        for url in crawler.unreached:
+            on_unreached(url)
+    if errors:
+        raise errors[0]
+
+
+def snapshot_documents(directory: str = HTML_DIR) -> Iterator[Tuple[PageKey, bytes]]:
+    """
+    Yields the pages of an on-disk crawl snapshot for offline ingestion.
+
+    Args:
+        directory (str): Directory the crawler saved pages into.
+
+    Yields:
+        Tuple[PageKey, bytes]: ((url, None, None), html) for each saved page.
+    """
+    for url, html in iter_html_snapshot(directory):
+        yield (url, None, None), html[:]
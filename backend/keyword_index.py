@@ -0,0 +1,208 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from retrieval import CHROMA_PATH, COLLECTION_NAME
+
+KEYWORD_INDEX_FILE = "bm25_{collection}.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or "
+    "our the their there this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases text and splits it into index terms, dropping common stopwords.
+
+    Args:
+        text (str): A document or query.
+
+    Returns:
+        List[str]: The terms, in order.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index that scores documents with Okapi BM25.
+
+    The index mirrors the Chroma collection by document ID: ingestion calls
+    `add` for every upserted chunk and `remove` for every deleted one, then
+    `save` to persist it next to the Chroma files. Only term frequencies and
+    document lengths are kept; document texts stay in Chroma.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def _remove(self, doc_id: str):
+        terms = self._docs.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self._postings[term]
+
+    def _add(self, doc_id: str, terms: Dict[str, int]):
+        self._remove(doc_id)
+        self._docs[doc_id] = terms
+        length = sum(terms.values())
+        self._lengths[doc_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def add(self, ids: Iterable[str], documents: Iterable[str]):
+        """
+        Indexes documents, replacing any that are already indexed under the same ID.
+
+        Args:
+            ids (Iterable[str]): Document IDs, as stored in Chroma.
+            documents (Iterable[str]): The document texts.
+        """
+        with self._lock:
+            for doc_id, text in zip(ids, documents):
+                self._add(doc_id, dict(Counter(tokenize(text))))
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._lengths.clear()
+            self._postings.clear()
+            self._total_length = 0
+
+    def search(self, query: str, n_results: int = 20) -> List[Tuple[str, float]]:
+        """
+        Ranks documents against a query.
+
+        Args:
+            query (str): The user's question.
+            n_results (int): How many documents to return.
+
+        Returns:
+            List[Tuple[str, float]]: (document ID, BM25 score) pairs, best first.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._docs)
+            if not count or not terms:
+                return []
+            avg_length = self._total_length / count
+            scores: Counter = Counter()
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(n_results)
+
+    def load(self) -> bool:
+        """
+        Replaces the in-memory index with the one saved at `path`.
+
+        Returns:
+            bool: Whether a saved index was found.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            docs = json.load(f).get("docs", {})
+        with self._lock:
+            self.clear()
+            for doc_id, terms in docs.items():
+                self._add(doc_id, terms)
+        return True
+
+    def save(self):
+        """Writes the index atomically, so a crash never leaves it half-written."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"docs": self._docs}, f)
+        os.replace(tmp_path, self.path)
+
+    def rebuild(self, collection, page_size: int = 1000):
+        """
+        Re-indexes every document in a Chroma collection.
+
+        Used when the saved index is missing, e.g. for a collection that was
+        ingested before the keyword index existed.
+
+        Args:
+            collection (chromadb.Collection): The collection to mirror.
+            page_size (int): Documents fetched from Chroma per request.
+        """
+        with self._lock:
+            self.clear()
+            offset = 0
+            while True:
+                page = collection.get(include=["documents"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                self.add(page["ids"], page["documents"])
+                offset += len(page["ids"])
+
+
+_indexes: Dict[Tuple[str, str], BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def keyword_index_path(path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> str:
+    return os.path.join(path, KEYWORD_INDEX_FILE.format(collection=collection_name))
+
+
+def get_keyword_index(path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> BM25Index:
+    """
+    Returns the process-wide keyword index for a Chroma path and collection name.
+
+    The saved index is loaded the first time it is requested.
+
+    Args:
+        path (str): Directory of the persistent Chroma database.
+        collection_name (str): Name of the collection the index mirrors.
+
+    Returns:
+        BM25Index: The shared index.
+    """
+    key = (path, collection_name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = BM25Index(keyword_index_path(path, collection_name))
+            index.load()
+    return index
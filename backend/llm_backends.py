@@ -0,0 +1,350 @@
+import asyncio
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+DEFAULT_MODELS = {
+    "openai": "openai/gpt-4o-mini",
+    "ollama": "gemma3",
+    "fake": "fake-llm",
+}
+GITHUB_MODELS_ENDPOINT = "https://models.github.ai/inference"
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+def prompt_key(model: str, messages: List[dict]) -> str:
+    return hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _SharedStream:
+    """Fans one upstream completion out to every caller that asked for the same prompt."""
+
+    def __init__(self):
+        self.pieces: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def publish(self, piece: Optional[str] = None, error: Optional[BaseException] = None, done: bool = False):
+        async with self.changed:
+            if piece:
+                self.pieces.append(piece)
+            if error is not None:
+                self.error = error
+            self.done = self.done or done
+            self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.pieces) > position or self.done)
+                pieces = self.pieces[position:]
+                done, error = self.done, self.error
+            for piece in pieces:
+                yield piece
+            position += len(pieces)
+            if done and position == len(self.pieces):
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMBackend(ABC):
+    """
+    Base class for chat-completion backends.
+
+    Subclasses implement `_stream`. This class adds what every backend needs
+    on the serving path:
+
+    - Coalescing: concurrent requests with the same model and messages share
+      one upstream generation; late joiners replay what was already produced.
+    - A concurrency limit of `max_concurrency` upstream generations.
+    - A `timeout` on each generation, raised as `LLMTimeoutError`.
+    """
+
+    name = "base"
+
+    def __init__(self, model: str, max_concurrency: int = 8, timeout: float = 60.0):
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, _SharedStream] = {}
+
+        self.requests = 0
+        self.coalesced = 0
+        self.generations = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    @abstractmethod
+    def _stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        """Streams one upstream generation; implemented as an async generator by each backend."""
+
+    async def _generate(self, key: str, shared: _SharedStream, messages: List[dict]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            async with self._semaphore:
+                self.generations += 1
+
+                async def produce():
+                    async for piece in self._stream(messages):
+                        await shared.publish(piece)
+
+                await asyncio.wait_for(produce(), self.timeout)
+            await shared.publish(done=True)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            await shared.publish(error=LLMTimeoutError(f"{self.name} did not finish within {self.timeout:g}s"), done=True)
+        except asyncio.CancelledError:
+            await shared.publish(error=LLMError("generation cancelled"), done=True)
+            raise
+        except Exception as e:
+            self.errors += 1
+            await shared.publish(error=e, done=True)
+        finally:
+            if self._in_flight.get(key) is shared:
+                del self._in_flight[key]
+
+    async def stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        """
+        Streams the completion for a conversation, piece by piece.
+
+        Args:
+            messages (List[dict]): OpenAI-style chat messages.
+
+        Yields:
+            str: Text fragments as they are generated.
+        """
+        self.requests += 1
+        key = prompt_key(self.model, messages)
+        shared = self._in_flight.get(key)
+        if shared is None:
+            shared = self._in_flight[key] = _SharedStream()
+            shared.task = asyncio.create_task(self._generate(key, shared, messages))
+        else:
+            self.coalesced += 1
+
+        shared.subscribers += 1
+        try:
+            async for piece in shared.subscribe():
+                yield piece
+        finally:
+            shared.subscribers -= 1
+            # Nobody is listening any more (e.g. every client disconnected): stop paying for tokens
+            if not shared.subscribers and not shared.done and shared.task:
+                shared.task.cancel()
+
+    async def complete(self, messages: List[dict]) -> str:
+        """
+        Returns the whole completion for a conversation.
+
+        Args:
+            messages (List[dict]): OpenAI-style chat messages.
+
+        Returns:
+            str: The generated answer.
+        """
+        return "".join([piece async for piece in self.stream(messages)])
+
+    async def ping(self):
+        """Raises if the upstream can't serve requests; backends without an upstream always pass."""
+
+    async def aclose(self):
+        for shared in list(self._in_flight.values()):
+            if shared.task:
+                shared.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "model": self.model,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "generations": self.generations,
+            "in_flight": len(self._in_flight),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any OpenAI-compatible chat-completions endpoint (GitHub Models, OpenAI, vLLM, ...)."""
+
+    name = "openai"
+
+    def __init__(self, model: str, base_url: str, api_key: str, max_concurrency: int = 20, timeout: float = 60.0):
+        super().__init__(model, max_concurrency, timeout)
+        from openai import AsyncOpenAI
+
+        # One pooled keep-alive HTTP client per backend
+        self.client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                timeout=httpx.Timeout(timeout, connect=5.0),
+            ),
+        )
+
+    async def _stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(messages=messages, model=self.model, stream=True)
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content
+            if piece:
+                yield piece
+
+    async def ping(self):
+        from openai import APIStatusError
+
+        try:
+            await self.client.models.list()
+        except APIStatusError as e:
+            # The server answered; not every compatible endpoint lists models, but a rejected key is fatal
+            if e.status_code in (401, 403):
+                raise
+
+    async def aclose(self):
+        await super().aclose()
+        await self.client.close()
+
+
+class OllamaBackend(LLMBackend):
+    """A local Ollama server, through its /api/chat endpoint."""
+
+    name = "ollama"
+
+    def __init__(self, model: str, host: str = "http://127.0.0.1:11434", max_concurrency: int = 2,
+                 timeout: float = 120.0):
+        super().__init__(model, max_concurrency, timeout)
+        self.client = httpx.AsyncClient(
+            base_url=host,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+
+    async def _stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "stream": True}
+        async with self.client.stream("POST", "/api/chat", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise LLMError(data["error"])
+                piece = data.get("message", {}).get("content")
+                if piece:
+                    yield piece
+                if data.get("done"):
+                    break
+
+    async def ping(self):
+        response = await self.client.get("/api/tags")
+        response.raise_for_status()
+        models = {entry.get("name", "") for entry in response.json().get("models", [])}
+        if self.model not in models and f"{self.model}:latest" not in models:
+            raise LLMError(f"model {self.model!r} has not been pulled")
+
+    async def aclose(self):
+        await super().aclose()
+        await self.client.aclose()
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic offline backend for local runs, benchmarks and soak tests.
+
+    The answer depends only on the messages, and is streamed one word at a
+    time after `latency_ms` of simulated time-to-first-token, with
+    `token_latency_ms` between words.
+    """
+
+    name = "fake"
+
+    def __init__(self, model: str = DEFAULT_MODELS["fake"], latency_ms: float = 0.0, token_latency_ms: float = 0.0,
+                 max_concurrency: int = 64, timeout: float = 60.0):
+        super().__init__(model, max_concurrency, timeout)
+        self.latency_ms = latency_ms
+        self.token_latency_ms = token_latency_ms
+
+    @staticmethod
+    def answer_for(messages: List[dict]) -> str:
+        question = messages[-1]["content"] if messages else ""
+        digest = prompt_key("fake", messages)[:8]
+        return f"This is a placeholder answer ({digest}) to: {question}"
+
+    async def _stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        words = self.answer_for(messages).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_latency_ms:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            yield word if i == 0 else " " + word
+
+
+def create_backend(kind: Optional[str] = None, model: Optional[str] = None) -> LLMBackend:
+    """
+    Builds the LLM backend selected by the environment.
+
+    `LLM_BACKEND` picks the implementation (`openai`, `ollama` or `fake`) and
+    `LLM_MODEL` the model. The OpenAI-compatible backend reads `LLM_BASE_URL`
+    (GitHub Models by default) and `LLM_API_KEY` or `GITHUB_TOKEN`; Ollama
+    reads `OLLAMA_HOST`. `LLM_MAX_CONCURRENCY` and `LLM_TIMEOUT_SECONDS`
+    apply to every backend, and `FAKE_LLM_LATENCY_MS` /
+    `FAKE_LLM_TOKEN_LATENCY_MS` shape the fake one.
+
+    Args:
+        kind (Optional[str]): Overrides `LLM_BACKEND`.
+        model (Optional[str]): Overrides `LLM_MODEL`.
+
+    Returns:
+        LLMBackend: The backend.
+    """
+    kind = (kind or os.getenv("LLM_BACKEND", "openai")).lower()
+    if kind not in DEFAULT_MODELS:
+        raise ValueError(f"Unknown LLM_BACKEND {kind!r}; expected one of {', '.join(DEFAULT_MODELS)}")
+    model = model or os.getenv("LLM_MODEL") or DEFAULT_MODELS[kind]
+    limits = {}
+    max_concurrency = os.getenv("LLM_MAX_CONCURRENCY") or os.getenv("LLM_MAX_CONNECTIONS")
+    if max_concurrency:
+        limits["max_concurrency"] = int(max_concurrency)
+    if os.getenv("LLM_TIMEOUT_SECONDS"):
+        limits["timeout"] = float(os.environ["LLM_TIMEOUT_SECONDS"])
+
+    if kind == "openai":
+        api_key = os.getenv("LLM_API_KEY") or os.getenv("GITHUB_TOKEN")
+        if not api_key:
+            raise LLMError("LLM_BACKEND=openai needs LLM_API_KEY or GITHUB_TOKEN; use LLM_BACKEND=fake to run offline")
+        return OpenAICompatibleBackend(
+            model, base_url=os.getenv("LLM_BASE_URL", GITHUB_MODELS_ENDPOINT), api_key=api_key, **limits
+        )
+    if kind == "ollama":
+        host = os.getenv("OLLAMA_HOST", "127.0.0.1:11434")
+        if "://" not in host:
+            host = "http://" + host
+        return OllamaBackend(model, host=host, **limits)
+    return FakeBackend(
+        model,
+        latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "0")),
+        token_latency_ms=float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "0")),
+        **limits,
+    )
@@ -0,0 +1,58 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def start_logging(level: Optional[str] = None) -> logging.handlers.QueueListener:
+    """
+    Routes the service's log records through a queue to a background writer thread.
+
+    Request handlers only enqueue records, so a slow terminal or log pipe
+    never blocks the event loop. The level comes from `LOG_LEVEL` (INFO by
+    default); debug breadcrumbs on the request path are dropped before they
+    are formatted unless it is set to DEBUG.
+
+    Args:
+        level (Optional[str]): Overrides `LOG_LEVEL`.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    records: queue.Queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logger = logging.getLogger("rag")
+    logger.setLevel(level)
+    logger.handlers[:] = [logging.handlers.QueueHandler(records)]
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"rag.{name}")
@@ -1,26 +1,49 @@
-from langchain_ollama.llms import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
-from vector import retriever
-
-model = OllamaLLM(model="gemma3")
-
-template = """
-You are an exeprt in answering question about events
-
-Here is the event info: {reviews}
-
-Here is the question to answer: {question}
-"""
-prompt = ChatPromptTemplate.from_template(template)
-chain = prompt | model
-
-while True:
-    print("\n\n-------------------------------")
-    question = input("Ask your question (q to quit): ")
-    print("\n\n")
-    if question == "q":
-        break
-    
-    reviews = retriever.invoke(question)
-    result = chain.invoke({"reviews": reviews, "question": question})
-    print(result)
\ No newline at end of file
+import asyncio
+import os
+
+from context_budget import get_llm_token_counter
+from event_index import EventRouter
+from llm_backends import create_backend
+from vector import get_retriever
+
+template = """
+You are an exeprt in answering question about events
+
+Here is the event info: {reviews}
+
+Here is the question to answer: {question}
+"""
+
+
+async def main():
+    # Local Ollama by default; LLM_BACKEND / LLM_MODEL switch it (e.g. LLM_BACKEND=fake to run offline)
+    model = create_backend(kind=os.getenv("LLM_BACKEND", "ollama"))
+    try:
+        # Open the event store and run a probe query before the first prompt, not during the first answer
+        print("Loading the event index...")
+        events = await asyncio.to_thread(EventRouter.load)
+        retriever = await asyncio.to_thread(get_retriever)
+        await asyncio.to_thread(retriever.invoke, "events")
+        while True:
+            print("\n\n-------------------------------")
+            question = await asyncio.to_thread(input, "Ask your question (q to quit): ")
+            print("\n\n")
+            if question == "q":
+                break
+
+            # "What's on Friday evening?" is a lookup in the events sheet; anything else is a similarity search
+            event_query = events.route(question) if events else None
+            if event_query is not None:
+                reviews = events.assemble_context(event_query, get_llm_token_counter(), 1500).text
+            else:
+                reviews = await asyncio.to_thread(retriever.invoke, question)
+            prompt = template.format(reviews=reviews, question=question)
+            async for piece in model.stream([{"role": "user", "content": prompt}]):
+                print(piece, end="", flush=True)
+            print()
+    finally:
+        await model.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from retrieval import CHROMA_PATH, COLLECTION_NAME
+
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_PATH = os.path.join(CHROMA_PATH, MANIFEST_FILE)
+
+
+def manifest_path(path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> str:
+    """
+    Where the manifest of a collection version lives.
+
+    Each version has its own, so a rollback also rolls back what the next
+    incremental run believes is ingested. The unversioned collection keeps
+    the original file name.
+    """
+    if collection_name == COLLECTION_NAME:
+        return os.path.join(path, MANIFEST_FILE)
+    return os.path.join(path, f"ingest_manifest_{collection_name}.json")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(url: str, text: str) -> str:
+    """
+    Builds a stable document ID from the page URL and the chunk's content.
+
+    The same chunk on the same page always gets the same ID, no matter which
+    order pages or chunks are processed in, so re-ingestion can upsert and
+    delete by ID instead of colliding with positional IDs.
+
+    Args:
+        url (str): The page the chunk came from.
+        text (str): The chunk text.
+
+    Returns:
+        str: The document ID.
+    """
+    return f"{text_hash(url)[:12]}_{text_hash(text)[:24]}"
+
+
+class IngestManifest:
+    """
+    Remembers what was ingested for each URL on the previous run.
+
+    Each entry stores the ETag and Last-Modified headers the page was served
+    with and the IDs of the chunks it produced. Re-ingestion sends them back
+    as conditional-request headers and diffs chunk IDs to decide what to
+    embed, upsert and delete.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.pages: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f).get("pages", {})
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """
+        Returns the If-None-Match / If-Modified-Since headers for a URL.
+
+        Args:
+            url (str): The page URL.
+
+        Returns:
+            Dict[str, str]: Request headers, empty if the page is new.
+        """
+        entry = self.pages.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def chunk_ids(self, url: str) -> List[str]:
+        return list(self.pages.get(url, {}).get("chunk_ids", []))
+
+    def update(self, url: str, chunk_ids: List[str], etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.pages[url] = {"etag": etag, "last_modified": last_modified, "chunk_ids": list(chunk_ids)}
+
+    def remove(self, url: str) -> List[str]:
+        """
+        Forgets a URL.
+
+        Args:
+            url (str): The page URL.
+
+        Returns:
+            List[str]: The chunk IDs that were recorded for it.
+        """
+        return list(self.pages.pop(url, {}).get("chunk_ids", []))
+
+    def save(self):
+        """Writes the manifest atomically, so a crash never leaves it half-written."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,196 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from timing import StageTimer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+TOKEN_BUCKETS = (250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, dict(zip(self.label_names, key)), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (plus +Inf), the sum and the total count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0, 0.0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, (total, count)) in self._values.items():
+                labels = dict(zip(self.label_names, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter whose samples are read from live objects at scrape time."""
+
+    def __init__(self, name: str, help_text: str, kind: str, callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        super().__init__(name, help_text)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self) -> List[Sample]:
+        try:
+            return [(self.name, labels, value) for labels, value in self.callback()]
+        except Exception:
+            return []
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        return self.register(CallbackMetric(name, help_text, "gauge", callback))
+
+    def counter_callback(self, name: str, help_text: str, callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        return self.register(CallbackMetric(name, help_text, "counter", callback))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter("rag_http_requests_total", "HTTP requests by route and status code.", ("route", "method", "status"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_http_request_duration_seconds", "Time until the response starts, by route.", ("route", "method")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent in each stage of answering a question.", ("endpoint", "stage")
+)
+ERRORS = REGISTRY.counter("rag_errors_total", "Failed questions by endpoint and exception type.", ("endpoint", "error"))
+ANSWER_CACHE_LOOKUPS = REGISTRY.counter("rag_answer_cache_lookups_total", "Answer cache lookups by result.", ("result",))
+CONTEXT_CHUNKS_FOUND = REGISTRY.histogram(
+    "rag_context_chunks_found", "Chunks returned by retrieval per question.", (), COUNT_BUCKETS
+)
+CONTEXT_CHUNKS_USED = REGISTRY.histogram(
+    "rag_context_chunks_used", "Context pieces sent to the LLM per question.", (), COUNT_BUCKETS
+)
+QUESTION_ROUTES = REGISTRY.counter(
+    "rag_question_routes_total", "Questions by how their context was found (search, events, prayer_times or contact).", ("route",)
+)
+PROMPT_TOKENS = REGISTRY.histogram("rag_prompt_tokens", "Prompt tokens sent to the LLM per question.", (), TOKEN_BUCKETS)
+
+
+def observe_question(
+    endpoint: str,
+    timer: StageTimer,
+    chunks_found: int,
+    chunks_used: int,
+    prompt_tokens: int,
+    cache_hit: Optional[bool],
+):
+    """
+    Records the metrics of one answered question.
+
+    Args:
+        endpoint (str): "ask" or "ask_stream".
+        timer (StageTimer): The request's stage durations.
+        chunks_found (int): Chunks returned by retrieval.
+        chunks_used (int): Context pieces sent to the LLM.
+        prompt_tokens (int): Tokens in the prompt.
+        cache_hit (Optional[bool]): Whether the answer cache hit, or None if it wasn't consulted.
+    """
+    for stage, milliseconds in timer.stages.items():
+        STAGE_SECONDS.observe(milliseconds / 1000, endpoint=endpoint, stage=stage)
+    STAGE_SECONDS.observe(timer.total_ms() / 1000, endpoint=endpoint, stage="total")
+    CONTEXT_CHUNKS_FOUND.observe(chunks_found)
+    CONTEXT_CHUNKS_USED.observe(chunks_used)
+    PROMPT_TOKENS.observe(prompt_tokens)
+    if cache_hit is not None:
+        ANSWER_CACHE_LOOKUPS.inc(result="hit" if cache_hit else "miss")
@@ -1,35 +1,46 @@
+import asyncio
+import hmac
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from langchain_ollama import OllamaLLM
-from langchain_core.prompts import ChatPromptTemplate
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from openai import OpenAI
+
+from admission import AdmissionController, Deadline, DeadlineExceeded, Overloaded
+from answer_cache import SemanticAnswerCache
+from context_budget import ContextAssembler
+from embedding_cache import get_embedding_cache
+from encoder import MODEL_NAME, BatchedEncoder, flush_embedding_cache
+from event_index import EventRouter
+from index_versions import CollectionVersions, VersionError
+from llm_backends import LLMBackend, LLMTimeoutError, create_backend
+from log_setup import get_logger, start_logging, stop_logging
+from metrics import ERRORS, QUESTION_ROUTES, REGISTRY, REQUEST_SECONDS, REQUESTS, observe_question
+from prayer_times import CenterInfoRouter, PrayerTimesFeed
+from readiness import ReadinessProbe
+from retrieval import ChromaStore, get_store
+from sessions import Session, SessionStore
+from timing import StageTimer
+
+logger = get_logger("api")
+
 # Import with error handling for the search function
 try:
     from search_chroma import search_chroma
 except ImportError as e:
-    print(f"Warning: Could not import search_chroma: {e}")
-    def search_chroma(query):
-        return [["No search functionality available - please fix the import error"]]
+    logger.warning("Could not import search_chroma: %s", e)
+    def search_chroma(query, query_embedding=None, store=None, full_results=False):
+        documents = [["No search functionality available - please fix the import error"]]
+        return {"ids": [[]], "documents": documents} if full_results else documents
 
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"], 
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-class AskRequest(BaseModel):
-    question: str
-    history: list = []
 
-token = os.environ["GITHUB_TOKEN"]
-endpoint = "https://models.github.ai/inference"
-model_name = "openai/gpt-4o-mini"
 system_prompt = """
 Here is the system prompt:
 You are a helpful assistant for the Islamic Center of Frisco. Use the provided context to answer questions accurately and helpfully.
@@ -44,85 +55,566 @@ provide speculative answers. If you do not have sufficient information to answer
 Always prioritize HONESTY and TRANSPARENCY in your responses.
 """
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Log records are written by a background thread, never on the event loop
+    start_logging()
+    # Load the embedding model once, before the first request is served
+    app.state.encoder = BatchedEncoder()
+    await app.state.encoder.start()
+    # Open the Chroma client and collection once and share them across requests
+    app.state.store = get_store()
+    await asyncio.to_thread(app.state.store.open)
+    # Load the keyword index, the NumPy vector index (VECTOR_BACKEND=numpy) and the reranker before taking traffic
+    try:
+        from hybrid_search import get_retriever
+
+        await asyncio.to_thread(get_retriever(app.state.store).warm_up)
+    except Exception:
+        logger.exception("Failed to warm up hybrid retrieval")
+    # Answers for paraphrased repeat questions, dropped whenever the collection is re-ingested
+    app.state.answer_cache = SemanticAnswerCache(generation_fn=app.state.store.generation)
+    # Merges, dedupes and trims retrieved chunks and history to the prompt token budget
+    app.state.context_assembler = ContextAssembler()
+    # Date, time and room questions about events are looked up in the events sheet instead of searched
+    app.state.events = await asyncio.to_thread(EventRouter.load)
+    # Prayer times are refreshed from the madinaapps feed in the background; contact details are static
+    app.state.center_info = CenterInfoRouter(PrayerTimesFeed())
+    await app.state.center_info.feed.start()
+    # Conversation history lives on the server, so requests only carry the session ID
+    app.state.sessions = SessionStore()
+    await asyncio.to_thread(app.state.sessions.prune)
+    # One LLM backend per process (LLM_BACKEND=openai|ollama|fake), with pooled connections
+    app.state.llm = create_backend()
+    # Bounds the questions in progress and queued, so a burst gets fast 429/503s instead of timeouts
+    app.state.admission = AdmissionController()
+    # /readyz re-checks the encoder, the collection and the LLM; /livez only says the loop is alive
+    app.state.readiness = ReadinessProbe(app.state.encoder, app.state.store, app.state.llm)
+    register_state_metrics(app)
+    # Run one question through retrieval so the first real request doesn't pay for cold caches
+    await warm_up(app)
+    readiness = await app.state.readiness.check(force=True)
+    if readiness["ready"]:
+        logger.info("Ready: LLM backend %s (%s)", app.state.llm.name, app.state.llm.model)
+    else:
+        logger.warning("Started, but not ready: %s", readiness["checks"])
+    yield
+    app.state.readiness.draining = True
+    await app.state.center_info.feed.stop()
+    await app.state.llm.aclose()
+    app.state.sessions.close()
+    await app.state.encoder.stop()
+    await asyncio.to_thread(flush_embedding_cache)
+    stop_logging()
+
+
+async def warm_up(app: FastAPI):
+    """
+    Embeds and searches a probe question (`WARMUP_QUESTION`) before the app reports ready.
+
+    This pages in the model weights, the HNSW segments and the keyword index,
+    so their one-off costs show up in the startup log instead of in the
+    latency of the first requests. A failure is logged, not raised, so an
+    empty or missing collection doesn't keep the API from starting.
+    """
+    question = os.getenv("WARMUP_QUESTION", "What are the prayer times?")
+    timer = StageTimer()
+    try:
+        await retrieve_context(question, app.state.encoder, app.state.store, app.state.context_assembler, timer)
+        logger.info("Warm-up query took %.1f ms (%s)", timer.total_ms(), timer.server_timing())
+    except Exception:
+        logger.exception("Warm-up query failed")
+
+
+def register_state_metrics(app: FastAPI):
+    """Exposes the answer cache, LLM backend, session store, admission and feed state on /metrics."""
+    cache_stats = lambda: app.state.answer_cache.stats()
+    llm_stats = lambda: app.state.llm.stats()
+    REGISTRY.gauge_callback("rag_answer_cache_entries", "Answers currently cached.",
+                            lambda: [({}, cache_stats()["entries"])])
+    REGISTRY.counter_callback("rag_answer_cache_evictions_total", "Answers evicted from the cache.",
+                              lambda: [({}, cache_stats()["evictions"])])
+    REGISTRY.counter_callback("rag_answer_cache_invalidations_total", "Times the cache was dropped after re-ingestion.",
+                              lambda: [({}, cache_stats()["invalidations"])])
+    REGISTRY.gauge_callback("rag_llm_in_flight", "LLM generations currently running.",
+                            lambda: [({"backend": llm_stats()["backend"]}, llm_stats()["in_flight"])])
+    REGISTRY.counter_callback("rag_llm_requests_total", "LLM requests, by whether they were coalesced into another.",
+                              lambda: [({"coalesced": "false"}, llm_stats()["generations"]),
+                                       ({"coalesced": "true"}, llm_stats()["coalesced"])])
+    REGISTRY.counter_callback("rag_llm_timeouts_total", "LLM generations that timed out.",
+                              lambda: [({}, llm_stats()["timeouts"])])
+    REGISTRY.gauge_callback("rag_sessions", "Conversation sessions held in memory.",
+                            lambda: [({}, app.state.sessions.stats()["sessions_in_memory"])])
+    embedding_cache = get_embedding_cache(MODEL_NAME)
+    if embedding_cache is not None:
+        REGISTRY.counter_callback("rag_embedding_cache_lookups_total", "Persistent embedding cache lookups by result.",
+                                  lambda: [({"result": "hit"}, embedding_cache.hits), ({"result": "miss"}, embedding_cache.misses)])
+    admission_stats = lambda: app.state.admission.stats()
+    REGISTRY.gauge_callback("rag_admission_active", "Questions being answered.",
+                            lambda: [({}, admission_stats()["active"])])
+    REGISTRY.gauge_callback("rag_admission_queued", "Questions waiting for a free slot.",
+                            lambda: [({}, admission_stats()["queued"])])
+    REGISTRY.counter_callback("rag_admission_rejected_total", "Questions turned away, by reason.",
+                              lambda: [({"reason": reason}, count) for reason, count in admission_stats()["rejected"].items()])
+    feed_stats = lambda: app.state.center_info.feed.stats()
+    REGISTRY.gauge_callback("rag_prayer_times_age_seconds", "Age of the prayer-times table being served.",
+                            lambda: [({}, feed_stats()["age_seconds"])] if feed_stats()["age_seconds"] is not None else [])
+    REGISTRY.counter_callback("rag_prayer_times_fetches_total", "Prayer-times feed fetches by result.",
+                              lambda: [({"result": result}, feed_stats()[result]) for result in ("updated", "not_modified", "failed")])
+    REGISTRY.gauge_callback("rag_readiness_check", "Whether each readiness check passed at the last /readyz.",
+                            lambda: [({"check": name}, ok) for name, ok in app.state.readiness.status().items()])
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"], 
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template rather than raw path, so session IDs don't create new series
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        REQUESTS.inc(route=path, method=request.method, status=status)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=path, method=request.method)
+
+
+class AskRequest(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+
+
+def get_encoder(request: Request) -> BatchedEncoder:
+    return request.app.state.encoder
+
+
+def get_chroma_store(request: Request) -> ChromaStore:
+    return request.app.state.store
+
+
+def get_llm_backend(request: Request) -> LLMBackend:
+    return request.app.state.llm
+
+
+def get_answer_cache(request: Request) -> SemanticAnswerCache:
+    return request.app.state.answer_cache
+
+
+def get_context_assembler(request: Request) -> ContextAssembler:
+    return request.app.state.context_assembler
+
+
+def get_session_store(request: Request) -> SessionStore:
+    return request.app.state.sessions
+
+
+def get_event_router(request: Request) -> Optional[EventRouter]:
+    return request.app.state.events
+
+
+def get_center_info(request: Request) -> CenterInfoRouter:
+    return request.app.state.center_info
+
+
+def require_admin(request: Request):
+    # Admin endpoints stay off unless a token is configured, and then need it in X-Admin-Token
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def get_readiness(request: Request) -> ReadinessProbe:
+    return request.app.state.readiness
+
+
+def get_admission(request: Request) -> AdmissionController:
+    return request.app.state.admission
+
+
+def client_id(request: Request) -> str:
+    # Behind a reverse proxy every request comes from the proxy; TRUST_PROXY_HEADERS=1 uses the forwarded address
+    if os.getenv("TRUST_PROXY_HEADERS", "0") == "1":
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def admit(request: Request, admission: AdmissionController, deadline: Deadline, endpoint: str) -> float:
+    """
+    Waits for the request's turn, or fails fast with 429/503 and a Retry-After header.
+
+    Returns:
+        float: The token to hand back to `admission.leave()` once the answer is sent.
+    """
+    try:
+        return await admission.enter(client_id(request), deadline)
+    except Overloaded as e:
+        logger.debug("Refused a question: %s", e.reason)
+        ERRORS.inc(endpoint=endpoint, error="RateLimited" if e.status_code == 429 else "Overloaded")
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+
+async def retrieve_context(
+    question: str,
+    encoder: BatchedEncoder,
+    store: ChromaStore,
+    assembler: ContextAssembler,
+    timer: Optional[StageTimer] = None,
+    events: Optional[EventRouter] = None,
+    center_info: Optional[CenterInfoRouter] = None,
+):
+    """
+    Embeds the question and fetches matching chunks without blocking the event loop.
+
+    Args:
+        question (str): The user's question.
+        encoder (BatchedEncoder): The shared query encoder.
+        store (ChromaStore): The shared Chroma store.
+        assembler (ContextAssembler): Merges, dedupes and trims the chunks to the context budget.
+        timer (Optional[StageTimer]): Records the route, embed, search and prompt stages.
+        events (Optional[EventRouter]): Answers date, time and room questions about events from the events sheet.
+        center_info (Optional[CenterInfoRouter]): Answers prayer-time and contact questions from the prayer-times feed,
+            and adds the table to the context of questions that only mention a prayer or the center's contact details.
+
+    Returns:
+        tuple: The raw chunks returned by Chroma, the context message built from them,
+        the query embedding (None for event, prayer-time and contact lookups), the IDs of
+        the retrieved documents and the assembled context.
+    """
+    timer = timer or StageTimer()
+    # 🕌 Questions that only ask for a prayer time or contact details come from the live table, not from search
+    extra = None
+    if center_info is not None:
+        with timer.measure("route"):
+            info_query = center_info.route(question)
+            if info_query is not None:
+                context = center_info.assemble_context(info_query, assembler.count_tokens, assembler.max_context_tokens)
+            else:
+                # "Is there parking for Jumuah?" still needs search, but the table rides along in the context
+                extra_query = center_info.supplement(question)
+                if extra_query is not None:
+                    extra = center_info.assemble_context(extra_query, assembler.count_tokens,
+                                                         assembler.max_context_tokens // 4)
+        if info_query is not None:
+            QUESTION_ROUTES.inc(route=info_query.kind)
+            doc_ids = [doc_id for piece in context.pieces for doc_id in piece.doc_ids]
+            logger.debug("Answering %r from the %s table", question, info_query.kind)
+            return [[piece.text for piece in context.pieces]], "Here is the context:" + context.text, None, doc_ids, context
+    budget = assembler.max_context_tokens - (extra.tokens if extra else 0)
+
+    # 📅 Event questions are an index lookup: no embedding, no ANN search
+    if events is not None:
+        with timer.measure("route"):
+            event_query = events.route(question)
+            if event_query is not None:
+                context = events.assemble_context(event_query, assembler.count_tokens, budget)
+                if extra:
+                    context = assembler.combine(extra, context)
+        if event_query is not None:
+            QUESTION_ROUTES.inc(route="events")
+            doc_ids = [doc_id for piece in context.pieces for doc_id in piece.doc_ids]
+            logger.debug("Answering %r from %d event(s) %s", question, len(doc_ids), event_query.description)
+            return [[piece.text for piece in context.pieces]], "Here is the context:" + context.text, None, doc_ids, context
+
+    QUESTION_ROUTES.inc(route="search")
+    # 🧠 Use Chroma to fetch relevant context
+    with timer.measure("embed"):
+        query_embedding = await encoder.encode(question)
+    with timer.measure("search"):
+        results = await run_in_threadpool(search_chroma, question, query_embedding.tolist(), store, True)
+    relevant_chunks = results["documents"] if results else None
+    doc_ids = [doc_id for id_list in results["ids"] for doc_id in id_list] if results else []
+    logger.debug("Retrieved %d chunk(s) for %r: %s", len(doc_ids), question, doc_ids)
+
+    # 🔗 Merge overlapping chunks, drop near-duplicates and trim to the token budget
+    with timer.measure("prompt"):
+        context = assembler.assemble_context(results, budget)
+        if extra:
+            context = assembler.combine(extra, context)
+            # The table's rows key the answer cache too, so a cached answer never outlives today's times
+            doc_ids = [doc_id for piece in extra.pieces for doc_id in piece.doc_ids] + doc_ids
+    if context.text:
+        dynamic_context = "Here is the context:" + context.text
+    else:
+        dynamic_context = "Here is the context: No relevant context found."
+    return relevant_chunks, dynamic_context, query_embedding, doc_ids, context
+
+
+def build_history(session: Session, question: str, assembler: ContextAssembler) -> str:
+    # Only the most recent turns that fit the history budget are sent to the LLM
+    return "Here is the history:" + '\n'.join(assembler.trim_history(session.history()) + [f"User: {question}"])
+
+
+def build_messages(question: str, dynamic_context: str, history: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "system",
+            "content": dynamic_context
+        },
+        {
+            "role": "system",
+            "content": history
+        },
+        {
+            "role": "user",
+            "content": question
+        }
+    ]
+
+
 @app.post('/ask')
-async def ask(request: AskRequest):
+async def ask(
+    request: AskRequest,
+    response: Response,
+    http_request: Request,
+    admission: AdmissionController = Depends(get_admission),
+    encoder: BatchedEncoder = Depends(get_encoder),
+    store: ChromaStore = Depends(get_chroma_store),
+    llm: LLMBackend = Depends(get_llm_backend),
+    answer_cache: SemanticAnswerCache = Depends(get_answer_cache),
+    assembler: ContextAssembler = Depends(get_context_assembler),
+    sessions: SessionStore = Depends(get_session_store),
+    events: Optional[EventRouter] = Depends(get_event_router),
+    center_info: CenterInfoRouter = Depends(get_center_info),
+):
     question = request.question
-    history = "Here is the history:" + '\n'.join(request.history + [f"User: {question}"])
-
-    print("hello")
+    timer = StageTimer()
+    # Work stops once the client's own timeout (X-Request-Timeout) or ASK_DEADLINE_SECONDS has passed
+    deadline = Deadline.from_header(http_request.headers.get("x-request-timeout"))
+    with timer.measure("queue"):
+        admitted = await admit(http_request, admission, deadline, "ask")
 
     try:
-        # 🧠 Use Chroma to fetch relevant context
-        relevant_chunks = search_chroma(question)
-        print("hello2")
-        print(relevant_chunks)
-
-        # 🔗 Process the returned chunks
-        # search_chroma returns results["documents"] which is a list of lists
-        if relevant_chunks and len(relevant_chunks) > 0:
-            # Flatten the nested list structure and join chunks
-            all_chunks = []
-            for chunk_list in relevant_chunks:
-                if isinstance(chunk_list, list):
-                    all_chunks.extend(chunk_list)
-                else:
-                    all_chunks.append(chunk_list)
-            
-            dynamic_context = "Here is the context:" + "\n\n".join(all_chunks)
-            print(type(dynamic_context))
-        else:
-            dynamic_context = "Here is the context: No relevant context found."
-
-        print("hello6")
-        client = OpenAI(
-            base_url=endpoint,
-            api_key=token,
-        )
-        print("hello7")
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "system",
-                    "content": dynamic_context
-                },
-                {
-                    "role": "system",
-                    "content": history
-                },
-                {
-                    "role": "user",
-                    "content": question
-                }
-            ],
-            model=model_name
-        )
-        print("hello3")
-        answer = response.choices[0].message.content
-        print("hello4")
-        history = history.split('\n')
-        history.append(f"Bot: {answer}")
-        print("hello5")
+        session = await run_in_threadpool(sessions.get, request.session_id)
+        # Follow-up questions depend on the conversation, so only first turns are cached
+        cacheable = session.is_new
+
+        relevant_chunks, dynamic_context, query_embedding, doc_ids, context = await deadline.run(retrieve_context(
+            question, encoder, store, assembler, timer, events, center_info
+        ))
+        # Event and prayer-time lookups depend on today's date and have no embedding to key the cache on
+        cacheable = cacheable and query_embedding is not None
+        with timer.measure("prompt"):
+            messages = build_messages(question, dynamic_context, build_history(session, question, assembler))
+            prompt_tokens = assembler.count_message_tokens(messages)
+
+        answer = answer_cache.get(query_embedding, doc_ids) if cacheable else None
+        cache_hit = answer is not None if cacheable else None
+        if answer is None:
+            logger.debug("Generating an answer from %d prompt token(s)", prompt_tokens)
+            with timer.measure("generate"):
+                answer = await deadline.run(llm.complete(messages))
+            if cacheable:
+                answer_cache.put(query_embedding, doc_ids, answer)
+        await run_in_threadpool(sessions.append, session.session_id, question, answer)
+        response.headers["Server-Timing"] = timer.server_timing()
+        observe_question("ask", timer, len(doc_ids), len(context.pieces), prompt_tokens, cache_hit)
+        logger.debug("Answered in %.1f ms (%s)", timer.total_ms(), timer.server_timing())
         
         return {
             'answer': answer, 
-            'history': history,
-            'context_chunks_found': len(relevant_chunks) if relevant_chunks else 0
+            'session_id': session.session_id,
+            'context_chunks_found': len(doc_ids),
+            'context_chunks_used': len(context.pieces),
+            'prompt_tokens': prompt_tokens
         }
 
+    except (LLMTimeoutError, DeadlineExceeded) as e:
+        logger.warning("Timed out in ask endpoint: %s", e)
+        ERRORS.inc(endpoint="ask", error=type(e).__name__)
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        print(f"Error in ask endpoint: {str(e)}")
+        logger.exception("Error in ask endpoint")
+        ERRORS.inc(endpoint="ask", error=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission.leave(admitted)
+
+
+def sse_event(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Gives the admission slot back however the stream ends, even if it never started."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+@app.post('/ask/stream')
+async def ask_stream(
+    request: AskRequest,
+    http_request: Request,
+    admission: AdmissionController = Depends(get_admission),
+    encoder: BatchedEncoder = Depends(get_encoder),
+    store: ChromaStore = Depends(get_chroma_store),
+    llm: LLMBackend = Depends(get_llm_backend),
+    answer_cache: SemanticAnswerCache = Depends(get_answer_cache),
+    assembler: ContextAssembler = Depends(get_context_assembler),
+    sessions: SessionStore = Depends(get_session_store),
+    events: Optional[EventRouter] = Depends(get_event_router),
+    center_info: CenterInfoRouter = Depends(get_center_info),
+):
+    """
+    Same as /ask, but sends the answer as Server-Sent Events while it is generated.
+
+    Each `data:` event carries a `{"token": ...}` fragment. A final `done` event
+    carries the session ID, the number of context chunks found, the prompt
+    token count and per-stage timings, and an `error` event is sent instead if
+    anything fails mid-stream. Refusals (429/503) happen before the stream opens.
+    """
+    question = request.question
+    timer = StageTimer()
+    deadline = Deadline.from_header(http_request.headers.get("x-request-timeout"))
+    with timer.measure("queue"):
+        admitted = await admit(http_request, admission, deadline, "ask_stream")
+
+    async def event_stream():
+        try:
+            session = await run_in_threadpool(sessions.get, request.session_id)
+            cacheable = session.is_new
+
+            relevant_chunks, dynamic_context, query_embedding, doc_ids, context = await deadline.run(retrieve_context(
+                question, encoder, store, assembler, timer, events, center_info
+            ))
+            cacheable = cacheable and query_embedding is not None
+            with timer.measure("prompt"):
+                messages = build_messages(question, dynamic_context, build_history(session, question, assembler))
+                prompt_tokens = assembler.count_message_tokens(messages)
+
+            answer = answer_cache.get(query_embedding, doc_ids) if cacheable else None
+            cache_hit = answer is not None if cacheable else None
+            if answer is not None:
+                yield sse_event({"token": answer})
+            else:
+                answer_parts = []
+                generate_started = timer.total_ms()
+                async for piece in deadline.iterate(llm.stream(messages)):
+                    if not answer_parts:
+                        timer.add("first_token", timer.total_ms() - generate_started)
+                    answer_parts.append(piece)
+                    yield sse_event({"token": piece})
+                timer.add("generate", timer.total_ms() - generate_started)
+                answer = ''.join(answer_parts)
+                if cacheable:
+                    answer_cache.put(query_embedding, doc_ids, answer)
+
+            await run_in_threadpool(sessions.append, session.session_id, question, answer)
+            observe_question("ask_stream", timer, len(doc_ids), len(context.pieces), prompt_tokens, cache_hit)
+            yield sse_event({
+                'session_id': session.session_id,
+                'context_chunks_found': len(doc_ids),
+                'context_chunks_used': len(context.pieces),
+                'prompt_tokens': prompt_tokens,
+                'timings': timer.as_dict()
+            }, event="done")
+
+        except (LLMTimeoutError, DeadlineExceeded) as e:
+            logger.warning("Timed out in ask/stream endpoint: %s", e)
+            ERRORS.inc(endpoint="ask_stream", error=type(e).__name__)
+            yield sse_event({"detail": str(e)}, event="error")
+        except Exception as e:
+            logger.exception("Error in ask/stream endpoint")
+            ERRORS.inc(endpoint="ask_stream", error=type(e).__name__)
+            yield sse_event({"detail": str(e)}, event="error")
+
+    return AdmittedStreamingResponse(
+        event_stream(),
+        release=lambda: admission.leave(admitted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get('/')
 async def root():
     return {"message": "Islamic Center of Frisco RAG System is running!"}
 
+@app.delete('/sessions/{session_id}')
+async def delete_session(session_id: str, sessions: SessionStore = Depends(get_session_store)):
+    await run_in_threadpool(sessions.delete, session_id)
+    return {"session_id": session_id, "deleted": True}
+
+@app.get('/llm/stats')
+async def llm_stats(llm: LLMBackend = Depends(get_llm_backend)):
+    return llm.stats()
+
+@app.get('/admission/stats')
+async def admission_stats(admission: AdmissionController = Depends(get_admission)):
+    return admission.stats()
+
+@app.get('/cache/stats')
+async def cache_stats(answer_cache: SemanticAnswerCache = Depends(get_answer_cache)):
+    return answer_cache.stats()
+
+@app.get('/admin/collections', dependencies=[Depends(require_admin)])
+async def collection_versions(store: ChromaStore = Depends(get_chroma_store)):
+    return await run_in_threadpool(CollectionVersions(store).status)
+
+@app.post('/admin/collections/{name}/activate', dependencies=[Depends(require_admin)])
+async def activate_collection(name: str, force: bool = False, store: ChromaStore = Depends(get_chroma_store)):
+    # Validates first unless forced; every worker follows the pointer file on its next query
+    try:
+        report = await run_in_threadpool(CollectionVersions(store).activate, name, not force)
+    except VersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"active": name, "validation": asdict(report) if report else None}
+
+@app.post('/admin/collections/rollback', dependencies=[Depends(require_admin)])
+async def rollback_collection(store: ChromaStore = Depends(get_chroma_store)):
+    try:
+        active = await run_in_threadpool(CollectionVersions(store).rollback)
+    except VersionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"active": active}
+
+@app.get('/metrics')
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get('/livez')
+async def livez():
+    # Only proves the event loop answers; restarting for a slow dependency wouldn't fix it
+    return {"status": "alive"}
+
+@app.get('/readyz')
+async def readyz(readiness: ReadinessProbe = Depends(get_readiness)):
+    result = await readiness.check()
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
 @app.get('/health')
 async def health():
+    # Kept for existing monitors; equivalent to /livez
     return {"status": "healthy", "message": "API is working correctly"}
 
 if __name__ == '__main__':
@@ -0,0 +1,589 @@
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from context_budget import AssembledContext, ContextPiece
+from event_index import _clock_minutes, format_minutes, local_today, parse_date, parse_days
+from keyword_index import STOPWORDS, tokenize
+from log_setup import get_logger
+
+logger = get_logger("prayer_times")
+
+PRAYER_TIMES_URL = "https://services.madinaapps.com/kiosk-rest/clients/242/prayerTimes"
+PRAYERS = {
+    "fajr": ("Fajr", ("fajr", "subh")),
+    "sunrise": ("Sunrise", ("sunrise", "shuruq", "shurooq")),
+    "dhuhr": ("Dhuhr", ("dhuhr", "zuhr", "duhr", "thuhr", "zohr")),
+    "asr": ("Asr", ("asr",)),
+    "maghrib": ("Maghrib", ("maghrib", "magrib")),
+    "isha": ("Isha", ("isha",)),
+    "jumuah": ("Jumuah", ("jumuah", "jummah", "jumah", "jumma", "juma")),
+}
+IQAMA_MARKERS = ("iqama", "iqamah", "jamaat", "jamat", "congregation")
+PM_PRAYERS = ("asr", "maghrib", "isha")
+NOON_PRAYERS = ("dhuhr", "jumuah")
+CLOCK = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2})?\s*(a\.?m\.?|p\.?m\.?)?")
+
+PRAYER_TOPIC = re.compile(r"\b(prayers?|salah|salat|namaz|adhan|azan|athan|iqamah?)\b")
+TIME_WORDS = re.compile(r"\b(times?|timings?|when|schedule|start|starts|begin|begins)\b")
+CONTACT_WORDS = re.compile(r"\b(phone|number|call|address|located|location|e-?mail|contact|reach|ein)\b")
+# Words a pure prayer-time question can contain besides prayer names and dates; a question with any other
+# word ("parking for Jumuah", "halaqa after Isha") goes to search, with the table as extra context
+PRAYER_VOCABULARY = frozenset(
+    "prayer prayers salah salat namaz adhan azan athan iqama iqamah jamaat jamat congregation time times "
+    "timing timings schedule start starts begin begins today tomorrow tonight week weekend day days daily "
+    "next icf islamic center frisco masjid mosque tell give please need whats there any".split()
+)
+DATE_WORD = re.compile(
+    r"\d+(?:st|nd|rd|th)?|(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*|(?:mon|tues|wednes|thurs|fri|satur|sun)days?"
+)
+# Words a pure contact question can contain; anything else ("Sunday School", "clinic phone") goes to search
+CONTACT_VOCABULARY = frozenset(
+    "phone number numbers call address located location email e mail contact contacts reach ein tax id info "
+    "information details main icf islamic center frisco masjid mosque get touch find can could give "
+    "please tell need whats there any".split()
+)
+
+
+@dataclass
+class PrayerTime:
+    prayer: str
+    adhan: Optional[int] = None
+    iqama: Optional[int] = None
+
+    def describe(self) -> str:
+        parts = []
+        if self.adhan is not None:
+            parts.append(f"adhan {format_minutes(self.adhan)}")
+        if self.iqama is not None:
+            parts.append(f"iqama {format_minutes(self.iqama)}")
+        return f"{PRAYERS[self.prayer][0]}: {', '.join(parts)}"
+
+
+@dataclass
+class PrayerTimesTable:
+    """The parsed feed: each day's prayers, keyed by date and prayer."""
+
+    days: Dict[date, Dict[str, PrayerTime]]
+    fetched_at: float
+
+    def to_dict(self) -> dict:
+        return {
+            "fetched_at": self.fetched_at,
+            "days": {
+                day.isoformat(): {
+                    prayer: {"adhan": entry.adhan, "iqama": entry.iqama} for prayer, entry in prayers.items()
+                }
+                for day, prayers in sorted(self.days.items())
+            },
+        }
+
+
+@dataclass(frozen=True)
+class CenterInfo:
+    name: str
+    address: str
+    main_phone: str
+    clinic_phone: str
+    email: str
+    ein: str
+    about: str
+
+    def lines(self) -> List[str]:
+        return [
+            f"Address: {self.address}",
+            f"Main phone: {self.main_phone}",
+            f"Clinic phone: {self.clinic_phone}",
+            f"Email: {self.email}",
+            f"EIN: {self.ein}",
+            f"About: {self.about}",
+        ]
+
+    def text(self) -> str:
+        return f"{self.name}\n" + "\n".join(self.lines())
+
+
+CENTER_INFO = CenterInfo(
+    name="Islamic Center of Frisco (ICF)",
+    address="11137 Frisco St, Frisco TX 75033",
+    main_phone="(469) 252-4532",
+    clinic_phone="(469) 213-8707",
+    email="contact@friscomasjid.org",
+    ein="20-8679388",
+    about="The Islamic Center of Frisco was established in May 2007. We are located approximately 27 miles north "
+          "of downtown Dallas.",
+)
+
+
+def _prayer_key(key: str) -> Optional[Tuple[str, bool]]:
+    # "fajr", "fajrIqama", "iqamah_fajr", "Fajr Jamaat" ... → ("fajr", is_iqama)
+    name = re.sub(r"[^a-z]", "", str(key).lower())
+    for prayer, (_, aliases) in PRAYERS.items():
+        if any(name.startswith(alias) or name.endswith(alias) for alias in aliases):
+            return prayer, any(marker in name for marker in IQAMA_MARKERS)
+    return None
+
+
+def parse_clock(value, prayer: str) -> Optional[int]:
+    """
+    Parses a prayer time into minutes after midnight.
+
+    Accepts "5:45 AM", "17:45", "05:45:00" and ISO datetimes. Feeds that
+    write afternoon times on a 12-hour clock without AM/PM ("4:30" for Asr)
+    are read as PM for the prayers that are always after noon.
+
+    Args:
+        value: The time as found in the feed.
+        prayer (str): The prayer's key, e.g. "asr".
+
+    Returns:
+        Optional[int]: The minutes, or None if no time was found.
+    """
+    match = CLOCK.search(str(value).lower()) if isinstance(value, str) else None
+    if match is None:
+        return None
+    hour, minute, meridiem = match.groups()
+    minutes = _clock_minutes(hour, minute, meridiem.replace(".", "") if meridiem else None)
+    if minutes is None or meridiem:
+        return minutes
+    hours = int(hour)
+    if (prayer in PM_PRAYERS and hours < 12) or (prayer in NOON_PRAYERS and 1 <= hours <= 10):
+        minutes += 12 * 60
+    return minutes
+
+
+def _record_date(record: dict) -> Optional[date]:
+    for key, value in record.items():
+        name = str(key).lower()
+        if "date" in name and "hijri" not in name and isinstance(value, str):
+            found = parse_date(value.split("T")[0])
+            if found:
+                return found
+    return None
+
+
+def _prayer_entries(value) -> Iterator[Tuple[str, bool, object]]:
+    """Yields (prayer, is_iqama, raw time) for one field of a day record."""
+    if isinstance(value, list):
+        # [{"name": "Fajr", "adhan": "5:45", "iqama": "6:15"}, ...]
+        for item in value:
+            if isinstance(item, dict):
+                label = item.get("name") or item.get("prayer") or item.get("title")
+                found = _prayer_key(label) if label else None
+                if found:
+                    yield from _prayer_fields(found[0], item)
+
+
+def _prayer_fields(prayer: str, entry: dict) -> Iterator[Tuple[str, bool, object]]:
+    # {"adhan": "5:45", "iqama": "6:15"} or {"begins": ..., "jamaat": ...}
+    for key, value in entry.items():
+        name = re.sub(r"[^a-z]", "", str(key).lower())
+        if name in ("name", "prayer", "title"):
+            continue
+        yield prayer, any(marker in name for marker in IQAMA_MARKERS), value
+
+
+def _read_day(record: dict) -> Dict[str, PrayerTime]:
+    times: Dict[str, PrayerTime] = {}
+    for key, value in record.items():
+        entries = list(_prayer_entries(value))
+        found = _prayer_key(key)
+        if found and isinstance(value, dict):
+            entries = list(_prayer_fields(found[0], value))
+        elif found:
+            entries = [(found[0], found[1], value)]
+        for prayer, is_iqama, raw in entries:
+            minutes = parse_clock(raw, prayer)
+            if minutes is None:
+                continue
+            time_ = times.setdefault(prayer, PrayerTime(prayer))
+            if is_iqama:
+                time_.iqama = minutes
+            elif time_.adhan is None:
+                time_.adhan = minutes
+    return times
+
+
+def _day_records(node) -> Iterator[dict]:
+    if isinstance(node, dict):
+        if _read_day(node):
+            yield node
+            return
+        for value in node.values():
+            yield from _day_records(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _day_records(item)
+
+
+def parse_prayer_times(payload, default_day: date, fetched_at: Optional[float] = None) -> PrayerTimesTable:
+    """
+    Builds the typed table from the prayer-times JSON.
+
+    The feed's exact shape isn't documented, so day records are found
+    wherever they are nested: any object with prayer-named fields ("fajr",
+    "fajrIqama", "iqamah_fajr", ...) or a list of {"name": "Fajr", ...}
+    entries. A record without a date field is taken to be for `default_day`.
+
+    Args:
+        payload: The decoded JSON.
+        default_day (date): The local date the response was fetched on.
+        fetched_at (Optional[float]): When it was fetched (epoch seconds); defaults to now.
+
+    Returns:
+        PrayerTimesTable: The parsed days; empty if nothing looked like prayer times.
+    """
+    days: Dict[date, Dict[str, PrayerTime]] = {}
+    for record in _day_records(payload):
+        days.setdefault(_record_date(record) or default_day, {}).update(_read_day(record))
+    return PrayerTimesTable(days, fetched_at if fetched_at is not None else time.time())
+
+
+class PrayerTimesFeed:
+    """
+    Keeps the prayer-times table current from the madinaapps feed.
+
+    A background task fetches `url` whenever the table expires: after
+    `ttl_seconds`, or at local midnight if the table doesn't cover the next
+    day. It revalidates with If-None-Match / If-Modified-Since, so an
+    unchanged feed costs a 304. A failed fetch keeps the last good table and
+    retries with exponential backoff from `retry_seconds`. The last good
+    response is also written to `snapshot_path`, so a restart while the
+    feed is down still has times to serve. Point `PRAYER_TIMES_URL` at a
+    local stub server to test all of this offline.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        retry_seconds: Optional[float] = None,
+        snapshot_path: Optional[str] = None,
+        timezone: Optional[str] = None,
+        timeout: float = 10.0,
+    ):
+        if url is None:
+            url = os.getenv("PRAYER_TIMES_URL", PRAYER_TIMES_URL)
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("PRAYER_TIMES_TTL_SECONDS", "3600"))
+        if retry_seconds is None:
+            retry_seconds = float(os.getenv("PRAYER_TIMES_RETRY_SECONDS", "30"))
+        if snapshot_path is None:
+            snapshot_path = os.getenv("PRAYER_TIMES_SNAPSHOT", "prayer_times.json")
+        if timezone is None:
+            timezone = os.getenv("EVENTS_TIMEZONE", "America/Chicago")
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = max(1.0, retry_seconds)
+        self.snapshot_path = snapshot_path
+        self.timezone = timezone
+        self.timeout = timeout
+        self.table: Optional[PrayerTimesTable] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.counts = {"updated": 0, "not_modified": 0, "failed": 0}
+        self._payload = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def today(self) -> date:
+        return local_today(self.timezone)
+
+    def expires_in(self) -> float:
+        """Seconds until the table should be fetched again; 0 if there is none."""
+        if self.table is None:
+            return 0.0
+        remaining = self.table.fetched_at + self.ttl_seconds - time.time()
+        tomorrow = self.today() + timedelta(days=1)
+        if tomorrow not in self.table.days:
+            try:
+                from zoneinfo import ZoneInfo
+
+                now = datetime.now(ZoneInfo(self.timezone))
+                midnight = datetime.combine(tomorrow, datetime.min.time(), now.tzinfo)
+                remaining = min(remaining, (midnight - now).total_seconds() + 60)
+            except Exception:
+                pass
+        return max(0.0, remaining)
+
+    def load_snapshot(self) -> bool:
+        """Restores the last good response saved by a previous run, if any."""
+        if not self.snapshot_path:
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            fetched_at = float(snapshot["fetched_at"])
+            default_day = date.fromisoformat(snapshot["day"])
+            table = parse_prayer_times(snapshot["payload"], default_day, fetched_at)
+        except FileNotFoundError:
+            return False
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Ignoring unreadable prayer times snapshot %s: %s", self.snapshot_path, e)
+            return False
+        if not table.days:
+            return False
+        self.table, self._payload = table, snapshot["payload"]
+        self.etag, self.last_modified = snapshot.get("etag"), snapshot.get("last_modified")
+        return True
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            "url": self.url,
+            "payload": self._payload,
+            "day": self.today().isoformat(),
+            "fetched_at": self.table.fetched_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning("Could not save prayer times snapshot: %s", e)
+
+    async def refresh(self, client: Optional[httpx.AsyncClient] = None) -> bool:
+        """
+        Fetches the feed once, revalidating the table we hold.
+
+        Args:
+            client (Optional[httpx.AsyncClient]): Client to use; defaults to the feed's own.
+
+        Returns:
+            bool: Whether the table is now current; on failure the last good table is kept.
+        """
+        client = client or self._client
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(timeout=self.timeout)
+        headers = {}
+        if self.table is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        try:
+            response = await client.get(self.url, headers=headers)
+            if response.status_code == 304 and self.table is not None:
+                self.table.fetched_at = time.time()
+                self.counts["not_modified"] += 1
+                self._save_snapshot()
+                return True
+            response.raise_for_status()
+            payload = response.json()
+            table = parse_prayer_times(payload, self.today())
+            if not table.days:
+                raise ValueError("no prayer times found in the response")
+        except (httpx.HTTPError, ValueError) as e:
+            self.counts["failed"] += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            age = f"{time.time() - self.table.fetched_at:.0f}s old" if self.table else "none"
+            logger.warning("Prayer times fetch failed (%s); keeping last good table (%s)", self.last_error, age)
+            return False
+        finally:
+            if own_client:
+                await client.aclose()
+
+        self.table, self._payload = table, payload
+        self.etag = response.headers.get("etag")
+        self.last_modified = response.headers.get("last-modified")
+        self.last_error = None
+        self.counts["updated"] += 1
+        self._save_snapshot()
+        logger.info("Loaded prayer times for %d day(s) from %s", len(table.days), self.url)
+        return True
+
+    async def start(self):
+        """Restores the snapshot and starts refreshing in the background; doesn't wait for the network."""
+        if await asyncio.to_thread(self.load_snapshot):
+            logger.info("Restored prayer times for %d day(s) from %s", len(self.table.days), self.snapshot_path)
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self):
+        backoff = self.retry_seconds
+        while True:
+            await asyncio.sleep(self.expires_in())
+            if await self.refresh():
+                backoff = self.retry_seconds
+            else:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max(self.retry_seconds, self.ttl_seconds))
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "days": len(self.table.days) if self.table else 0,
+            "age_seconds": round(time.time() - self.table.fetched_at, 1) if self.table else None,
+            "expires_in_seconds": round(self.expires_in(), 1),
+            "last_error": self.last_error,
+            **self.counts,
+        }
+
+
+@dataclass
+class InfoQuery:
+    kind: str  # "prayer_times" or "contact"
+    days: List[date] = field(default_factory=list)
+    prayers: List[str] = field(default_factory=list)
+
+
+class CenterInfoRouter:
+    """
+    Answers prayer-time and contact questions from the feed's table and `CENTER_INFO`.
+
+    Like `EventRouter`, `route()` recognises the question and the matching
+    rows are handed to the LLM as context, with no embedding or vector
+    search. Only questions that ask for nothing but a prayer time or the
+    center's contact details are routed; a question that merely mentions a
+    prayer or a phone number ("Is there parking for Jumuah?") still goes
+    through retrieval, and `supplement()` adds the table to its context. A
+    prayer question about a day the table doesn't cover (or asked before the
+    first fetch) is never routed.
+    """
+
+    def __init__(self, feed: PrayerTimesFeed, info: CenterInfo = CENTER_INFO):
+        self.feed = feed
+        self.info = info
+
+    def _prayer_times(self, text: str, today: Optional[date]) -> Optional[InfoQuery]:
+        table = self.feed.table
+        if table is None:
+            return None
+        today = today or self.feed.today()
+        days = parse_days(text, today) or [today]
+        if any(day not in table.days for day in days):
+            return None
+        return InfoQuery("prayer_times", days, [prayer for prayer in PRAYERS if _mentions(text, prayer)])
+
+    def route(self, question: str, today: Optional[date] = None) -> Optional[InfoQuery]:
+        """
+        Recognises a question that the prayer-times table or the contact details answer on their own.
+
+        Args:
+            question (str): The user's question.
+            today (Optional[date]): Overrides the local date.
+
+        Returns:
+            Optional[InfoQuery]: What to look up, or None if the question needs retrieval.
+        """
+        text = _normalize(question)
+        words = _content_words(text)
+        if _mentions_prayers(text) and TIME_WORDS.search(text):
+            aliases = {alias for _, names in PRAYERS.values() for alias in names}
+            if all(word in PRAYER_VOCABULARY or word in aliases or DATE_WORD.fullmatch(word) for word in words):
+                return self._prayer_times(text, today)
+            return None
+        if CONTACT_WORDS.search(text) and words <= CONTACT_VOCABULARY:
+            return InfoQuery("contact")
+        return None
+
+    def supplement(self, question: str, today: Optional[date] = None) -> Optional[InfoQuery]:
+        """
+        Picks the table to add as extra context for a question that goes through retrieval.
+
+        Args:
+            question (str): The user's question, which `route()` didn't route.
+            today (Optional[date]): Overrides the local date.
+
+        Returns:
+            Optional[InfoQuery]: The prayer times if the question mentions a prayer, the contact
+            details if it mentions a way to reach the center, otherwise None.
+        """
+        text = _normalize(question)
+        if _mentions_prayers(text):
+            return self._prayer_times(text, today)
+        if CONTACT_WORDS.search(text):
+            return InfoQuery("contact")
+        return None
+
+    def assemble_context(self, query: InfoQuery, count_tokens: Callable[[str], int], max_tokens: int) -> AssembledContext:
+        """
+        Lists the requested prayer times, or the center's contact details, as context.
+
+        Args:
+            query (InfoQuery): What `route()` returned.
+            count_tokens (Callable[[str], int]): The LLM token counter.
+            max_tokens (int): The context budget.
+
+        Returns:
+            AssembledContext: One piece per day or for the contact details; doc IDs are
+            "prayer_times:<date>" or "center:contact".
+        """
+        if query.kind == "contact":
+            text = self.info.text()
+            return AssembledContext(text, [ContextPiece(text, 1.0, "center", 0, 0, ["center:contact"])], count_tokens(text))
+
+        table = self.feed.table
+        header = f"Prayer times at {self.info.name} (adhan is the call to prayer, iqama is when the congregation starts):"
+        lines, pieces = [header], []
+        tokens = count_tokens(header)
+        for day in query.days:
+            prayers = table.days.get(day, {})
+            wanted = [prayers[name] for name in (query.prayers or PRAYERS) if name in prayers]
+            missing = [PRAYERS[name][0] for name in query.prayers if name not in prayers]
+            block = [f"{day.strftime('%A, %B')} {day.day}, {day.year}:"] + [f"- {time_.describe()}" for time_ in wanted]
+            if missing:
+                block.append(f"- No {', '.join(missing)} time is listed for this day.")
+            text = "\n".join(block)
+            block_tokens = count_tokens(text)
+            if tokens + block_tokens > max_tokens:
+                break
+            lines.append(text)
+            tokens += block_tokens
+            pieces.append(ContextPiece(text, 1.0, "prayer_times", day.toordinal(), day.toordinal(),
+                                       [f"prayer_times:{day.isoformat()}"]))
+        dropped = len(query.days) - len(pieces)
+        return AssembledContext("\n".join(lines), pieces, tokens, dropped_over_budget=dropped)
+
+
+def _normalize(question: str) -> str:
+    return question.lower().replace("’", "'")
+
+
+def _content_words(text: str) -> set:
+    return {token.split("'")[0] for token in tokenize(text)} - STOPWORDS
+
+
+def _mentions(text: str, prayer: str) -> bool:
+    return any(re.search(rf"\b{alias}'?s?\b", text) for alias in PRAYERS[prayer][1])
+
+
+def _mentions_prayers(text: str) -> bool:
+    return bool(PRAYER_TOPIC.search(text)) or any(_mentions(text, prayer) for prayer in PRAYERS)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python prayer_times.py [URL]: fetch once (e.g. from a local stub server) and print the parsed table
+    feed = PrayerTimesFeed(url=sys.argv[1] if len(sys.argv) > 1 else None, snapshot_path="")
+    if not asyncio.run(feed.refresh()):
+        print(f"[✗] {feed.last_error}")
+        sys.exit(1)
+    for day, prayers in sorted(feed.table.days.items()):
+        print(f"[✓] {day.isoformat()}: " + "; ".join(time_.describe() for time_ in prayers.values()))
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from encoder import BatchedEncoder
+from llm_backends import LLMBackend
+from log_setup import get_logger
+from retrieval import ChromaStore
+
+logger = get_logger("readiness")
+
+
+class ReadinessProbe:
+    """
+    Decides whether this process should receive traffic.
+
+    A process is ready once the query encoder is warm, the Chroma collection
+    is open and holds documents, and the LLM backend answers a ping within
+    `llm_timeout` seconds. The checks run concurrently and the verdict is
+    cached for `cache_seconds`, so a load balancer polling /readyz every
+    second costs one collection count and one LLM ping per interval, not one
+    per poll. Concurrent polls while a check is running share its result.
+    """
+
+    def __init__(
+        self,
+        encoder: BatchedEncoder,
+        store: ChromaStore,
+        llm: LLMBackend,
+        cache_seconds: Optional[float] = None,
+        llm_timeout: Optional[float] = None,
+        store_timeout: Optional[float] = None,
+    ):
+        if cache_seconds is None:
+            cache_seconds = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+        if llm_timeout is None:
+            llm_timeout = float(os.getenv("READINESS_LLM_TIMEOUT_SECONDS", "2"))
+        if store_timeout is None:
+            store_timeout = float(os.getenv("READINESS_STORE_TIMEOUT_SECONDS", "2"))
+        self.encoder = encoder
+        self.store = store
+        self.llm = llm
+        self.cache_seconds = cache_seconds
+        self.llm_timeout = llm_timeout
+        self.store_timeout = store_timeout
+        # Set while the app shuts down, so the load balancer drains this process first
+        self.draining = False
+        self.last_result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def check(self, force: bool = False) -> dict:
+        """
+        Returns the readiness verdict, re-running the checks if the cached one expired.
+
+        Args:
+            force (bool): Ignore the cached verdict.
+
+        Returns:
+            dict: `ready` plus, per check, whether it passed, a detail message and its duration.
+        """
+        if self.draining:
+            return {"ready": False, "checks": {"draining": {"ok": False, "detail": "shutting down"}}}
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if force or self.last_result is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+                checks = await asyncio.gather(
+                    self._run("encoder", self._check_encoder, None),
+                    self._run("collection", self._check_collection, self.store_timeout),
+                    self._run("llm", self._check_llm, self.llm_timeout),
+                )
+                result = {"ready": all(check["ok"] for _, check in checks), "checks": dict(checks)}
+                if self.last_result is not None and result["ready"] != self.last_result["ready"]:
+                    log = logger.info if result["ready"] else logger.warning
+                    log("Readiness changed to %s: %s", result["ready"], result["checks"])
+                self.last_result = result
+                self._checked_at = time.monotonic()
+            return self.last_result
+
+    async def _run(self, name: str, check: Callable[[], Awaitable[str]], timeout: Optional[float]):
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(check(), timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            detail, ok = f"no answer within {timeout:g}s", False
+        except Exception as e:
+            detail, ok = f"{type(e).__name__}: {e}", False
+        return name, {"ok": ok, "detail": detail, "ms": round((time.perf_counter() - started) * 1000, 3)}
+
+    async def _check_encoder(self) -> str:
+        if not self.encoder.ready:
+            raise RuntimeError("embedding model is not loaded")
+        return "warm"
+
+    async def _check_collection(self) -> str:
+        if not self.store.is_open:
+            raise RuntimeError("collection is not open")
+        # A locked SQLite file blocks here, which the timeout turns into "not ready". The property is read
+        # on the worker thread too: it may reopen the collection (after a version swap), which also blocks.
+        count = await asyncio.to_thread(lambda: self.store.collection.count())
+        if not count:
+            raise RuntimeError("collection is empty")
+        return f"{count} documents"
+
+    async def _check_llm(self) -> str:
+        await self.llm.ping()
+        return f"{self.llm.name} ({self.llm.model}) reachable"
+
+    def status(self) -> Dict[str, float]:
+        """Per-check pass/fail (1/0) of the last verdict, for /metrics."""
+        if self.last_result is None:
+            return {}
+        return {name: float(check["ok"]) for name, check in self.last_result["checks"].items()}
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma")
+COLLECTION_NAME = "frisco_events"
+GENERATION_FILE = "ingest_generation_{collection}"
+ACTIVE_FILE = "active_{collection}.json"
+
+
+def pointer_path(path: str, collection_name: str) -> str:
+    return os.path.join(path, ACTIVE_FILE.format(collection=collection_name))
+
+
+def read_pointer(path: str, collection_name: str) -> Optional[dict]:
+    """
+    Reads the file naming the collection version served under `collection_name`.
+
+    Returns:
+        Optional[dict]: `collection` (the active version) and `history` (previously
+        active versions, newest first), or None if the collection isn't versioned.
+    """
+    try:
+        with open(pointer_path(path, collection_name), "r", encoding="utf-8") as f:
+            pointer = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return pointer if isinstance(pointer, dict) and pointer.get("collection") else None
+
+
+def write_pointer(path: str, collection_name: str, active: str, history: List[str]):
+    """Switches `collection_name` to the version `active` with one atomic rename."""
+    os.makedirs(path, exist_ok=True)
+    target = pointer_path(path, collection_name)
+    tmp_path = target + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"collection": active, "history": history, "activated_at": time.time()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, target)
+
+
+class ChromaStore:
+    """
+    Holds one persistent Chroma client and collection for the whole process.
+
+    The client is opened lazily (or eagerly via `open()` at startup) under a
+    lock, so the SQLite file and HNSW segments are loaded once and then shared
+    by every request. Queries can be issued from any thread; Chroma's local
+    segments take their own read locks around the ANN search.
+
+    If a pointer file (`active_<name>.json`, see `index_versions`) exists for
+    the name, the store serves the collection version it points at and
+    follows it when it changes: each access stats the file, and a swap
+    opens the new version for the next query while queries already running
+    finish on the old one.
+    """
+
+    def __init__(self, path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME):
+        self.path = path
+        self.name = collection_name
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._open_name: Optional[str] = None
+        self._active_name: Optional[str] = None
+        self._pointer_mtime: Optional[int] = None
+
+    def _resolve(self) -> str:
+        try:
+            mtime = os.stat(pointer_path(self.path, self.name)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._active_name is None or mtime != self._pointer_mtime:
+            pointer = read_pointer(self.path, self.name) if mtime is not None else None
+            self._active_name = pointer["collection"] if pointer else self.name
+            self._pointer_mtime = mtime
+        return self._active_name
+
+    @property
+    def collection_name(self) -> str:
+        """The collection actually served: the active version, or the name itself if it isn't versioned."""
+        return self._resolve()
+
+    def open(self):
+        """
+        Opens the persistent client and the active collection if they aren't open yet.
+
+        Returns:
+            chromadb.Collection: The shared collection.
+        """
+        name = self._resolve()
+        if self._collection is None or self._open_name != name:
+            with self._lock:
+                if self._client is None:
+                    # Imported here so tools that only need the paths don't pay for chromadb
+                    import chromadb
+
+                    self._client = chromadb.PersistentClient(path=self.path)
+                if self._collection is None or self._open_name != name:
+                    self._collection = self._client.get_or_create_collection(name=name)
+                    self._open_name = name
+        return self._collection
+
+    @property
+    def is_open(self) -> bool:
+        return self._collection is not None
+
+    @property
+    def client(self):
+        self.open()
+        return self._client
+
+    @property
+    def collection(self):
+        return self.open()
+
+    def query(self, query_embedding: List[float], n_results: int = 5) -> dict:
+        """
+        Runs a nearest-neighbour search against the shared collection.
+
+        Args:
+            query_embedding (List[float]): The embedded query.
+            n_results (int): How many documents to return.
+
+        Returns:
+            dict: The raw Chroma query result.
+        """
+        return self.collection.query(query_embeddings=[list(query_embedding)], n_results=n_results)
+
+    def get(self, ids: List[str]) -> dict:
+        """
+        Looks up documents by ID; unknown IDs are skipped.
+
+        Args:
+            ids (List[str]): Document IDs.
+
+        Returns:
+            dict: `ids`, `documents` and `metadatas` of the documents found.
+        """
+        return self.collection.get(ids=ids, include=["documents", "metadatas"])
+
+    def generation(self) -> int:
+        """
+        Returns a value that changes every time the served collection changes.
+
+        Ingestion may run in another process, so this is the newer of the
+        modification times of the active collection's marker file and of the
+        pointer file, rather than in-memory state. Building a new version
+        writes only that version's marker, so it doesn't disturb the caches
+        of the version being served until it is activated.
+
+        Returns:
+            int: The mtime in nanoseconds, or 0 if nothing was ingested yet.
+        """
+        name = self._resolve()
+        try:
+            marker = os.stat(os.path.join(self.path, GENERATION_FILE.format(collection=name))).st_mtime_ns
+        except FileNotFoundError:
+            marker = 0
+        return max(marker, self._pointer_mtime or 0)
+
+    def mark_ingested(self):
+        """Bumps the active collection's ingestion marker so caches built on the old contents are dropped."""
+        os.makedirs(self.path, exist_ok=True)
+        marker = os.path.join(self.path, GENERATION_FILE.format(collection=self._resolve()))
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+
+
+_stores: Dict[Tuple[str, str], ChromaStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME) -> ChromaStore:
+    """
+    Returns the process-wide store for a Chroma path and collection name.
+
+    Args:
+        path (str): Directory of the persistent Chroma database.
+        collection_name (str): Name of the collection to open.
+
+    Returns:
+        ChromaStore: The shared store.
+    """
+    key = (path, collection_name)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ChromaStore(path, collection_name)
+    return store
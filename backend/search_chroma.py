@@ -1,33 +1,55 @@
 import json
+import os
+from typing import List, Optional
 
-import chromadb
+from encoder import encode_texts
+from hybrid_search import get_retriever
+from log_setup import get_logger
+from retrieval import ChromaStore, get_store
+from vector_index import get_vector_backend
 
-from vector_db_pipline import vectorize_text_segments
+logger = get_logger("search")
 
 def search_chroma(
     query: str,
+    query_embedding: Optional[List[float]] = None,
+    store: Optional[ChromaStore] = None,
+    full_results: bool = False,
 ):
     """
-    Uploads vector embeddings along with their original documents into a persistent Chroma database.
+    Searches the persistent Chroma collection for documents relevant to a query.
+
+    By default keyword (BM25) and vector hits are fused by reciprocal rank;
+    set `RETRIEVAL_MODE=vector` to use the vector search alone. Vector search
+    uses Chroma's HNSW index, or the exact NumPy index with
+    `VECTOR_BACKEND=numpy`. `RETRIEVAL_N_RESULTS` (5) documents are returned;
+    `evaluation.py` measures what other values cost and gain.
 
     Args:
-        embeddings (List[List[float]]): List of embedding vectors.
-        documents (List[str]): List of original text documents.
-        ids (List[str]): Unique identifiers for each document.
+        query (str): The user's question.
+        query_embedding (Optional[List[float]]): Precomputed embedding of the query.
+        store (Optional[ChromaStore]): Shared store to search; defaults to the process-wide one.
+        full_results (bool): Return the whole Chroma result (ids, distances, ...) instead of just the documents.
 
     Returns:
-        None
+        List[List[str]]: The matching documents, one list per query, or the raw result if `full_results` is set.
     """
     try:
-        # ✅ Initialize persistent ChromaDB client
-        client = chromadb.PersistentClient(path="chroma")
-        # ✅ Create or connect to a collection
-        collection = client.get_or_create_collection(name="frisco_events")
+        # ✅ Reuse the already-open client and collection
+        if store is None:
+            store = get_store()
 
-        # embed query
-        query_embeddings = vectorize_text_segments([query])[0]
-        # ✅ Upload documents, embeddings, and their IDs
-        results = collection.query(query_embeddings=query_embeddings, n_results=5)
+        # embed query, unless the caller already did (e.g. the batched encoder)
+        if query_embedding is None:
+            query_embeddings = encode_texts([query])[0].tolist()
+        else:
+            query_embeddings = list(query_embedding)
+        # ✅ Only the ANN and keyword searches happen per request
+        n_results = int(os.getenv("RETRIEVAL_N_RESULTS", "5"))
+        if os.getenv("RETRIEVAL_MODE", "hybrid") == "vector":
+            results = get_vector_backend(store).query(query_embeddings, n_results=n_results)
+        else:
+            results = get_retriever(store).search(query, query_embeddings, n_results=n_results)
 
          # Step 3: Write to a text file
         # with open('put your own file path here', 'w') as file:
@@ -36,9 +58,11 @@ def search_chroma(
         # print(
         #     f"[✓] Search results for query '{query}': {len(results['documents'])} found."
         # )
+        if full_results:
+            return results
         return results["documents"]
 
-    except Exception as e:
-        print(f"[✗] Failed to upload to ChromaDB: {e}")
+    except Exception:
+        logger.exception("Failed to search ChromaDB")
 
 
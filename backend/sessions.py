@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    turns: List[str] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def is_new(self) -> bool:
+        return not self.turns and not self.summary
+
+    def history(self) -> List[str]:
+        """Returns the lines to show the LLM: the rolling summary (if any), then the recent turns."""
+        if self.summary:
+            return [f"Earlier in this conversation the user asked about: {self.summary}"] + self.turns
+        return list(self.turns)
+
+
+class SessionStore:
+    """
+    Keeps each conversation's history on the server, keyed by session ID.
+
+    Sessions live in an in-memory LRU of at most `max_sessions` entries and
+    expire after `ttl_seconds` without activity. Only the last `max_turns`
+    question/answer pairs are kept verbatim; older questions are folded into
+    a short rolling summary capped at `max_summary_chars`, so a session's
+    size stays bounded however long the conversation runs. If `db_path` is
+    set, sessions are also written through to SQLite and survive restarts
+    and LRU eviction.
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_turns: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        db_path: Optional[str] = None,
+        max_summary_chars: int = 500,
+    ):
+        if max_sessions is None:
+            max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+        if max_turns is None:
+            max_turns = int(os.getenv("SESSION_MAX_TURNS", "10"))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+        if db_path is None:
+            db_path = os.getenv("SESSION_DB") or None
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_summary_chars = max_summary_chars
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, session: Session) -> bool:
+        return time.time() - session.updated_at > self.ttl_seconds
+
+    def _load(self, session_id: str) -> Optional[Session]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT summary, turns, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Session(session_id, row[0], json.loads(row[1]), row[2])
+
+    def _save(self, session: Session):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, summary, turns, updated_at) VALUES (?, ?, ?, ?)",
+            (session.session_id, session.summary, json.dumps(session.turns), session.updated_at),
+        )
+        self._db.commit()
+
+    def _cache(self, session: Session):
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, session_id: Optional[str]) -> Session:
+        """
+        Returns a session, starting a new one if the ID is unknown, expired or missing.
+
+        Args:
+            session_id (Optional[str]): The client's session ID.
+
+        Returns:
+            Session: The session. A new session gets a fresh ID if none was given.
+        """
+        with self._lock:
+            if not session_id:
+                session = Session(uuid.uuid4().hex)
+                self._cache(session)
+                return session
+            session = self._sessions.get(session_id) or self._load(session_id)
+            if session is None or self._expired(session):
+                session = Session(session_id)
+            self._cache(session)
+            return session
+
+    def append(self, session_id: str, question: str, answer: str) -> Session:
+        """
+        Records one question/answer turn, folding the oldest turns into the summary.
+
+        Args:
+            session_id (str): The session ID.
+            question (str): The user's question.
+            answer (str): The bot's answer.
+
+        Returns:
+            Session: The updated session.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id) or self._load(session_id) or Session(session_id)
+            session.turns.extend([f"User: {question}", f"Bot: {answer}"])
+            overflow = len(session.turns) - 2 * self.max_turns
+            if overflow > 0:
+                dropped, session.turns = session.turns[:overflow], session.turns[overflow:]
+                asked = [line[len("User: "):] for line in dropped if line.startswith("User: ")]
+                summary = "; ".join(filter(None, [session.summary] + asked))
+                # Keep the newest part of the summary when it outgrows its cap
+                session.summary = summary[-self.max_summary_chars:]
+            session.updated_at = time.time()
+            self._cache(session)
+            self._save(session)
+            return session
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._db.commit()
+
+    def prune(self) -> int:
+        """
+        Drops expired sessions from memory and SQLite.
+
+        Returns:
+            int: How many sessions were dropped from memory.
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session.updated_at < cutoff]
+            for session_id in expired:
+                del self._sessions[session_id]
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+                self._db.commit()
+        return len(expired)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+                "persistent": self._db is not None,
+            }
@@ -1,6 +1,26 @@
 import requests
 import json
 
+# Also replayed by benchmark.py
+SAMPLE_QUESTIONS = [
+    "When was ICF established?",
+    "Tell me about the Sunday School program",
+    "What health services do you offer?",
+    "How many students are in Sunday School?"
+]
+
+# Questions based on your chunk content
+SPECIFIC_QUESTIONS = [
+    "When was the Islamic Center of Frisco established?",
+    "How many volunteers run the Sunday School?", 
+    "How many students are in Sunday School and how many are on the waitlist?",
+    "What does the Safwah Youth Seminary program focus on?",
+    "Tell me about the free health clinic",
+    "What is the Uswah Adult Seminary program?",
+    "Where is ICF located relative to downtown Dallas?",
+    "What programs does the Quran Academy offer?"
+]
+
 def interactive_chatbot():
     """Interactive chatbot for Islamic Center of Frisco"""
     url = "http://127.0.0.1:5000/ask"
@@ -23,7 +43,8 @@ def interactive_chatbot():
         print("💡 Make sure to start the server first: python ollamaLLM.py\n")
         return
     
-    history = []
+    # The server keeps the conversation; we only hold on to the session ID it gives us
+    session_id = None
     
     while True:
         # Get user question
@@ -42,12 +63,13 @@ def interactive_chatbot():
         # Send question to API
         data = {
             "question": question,
-            "history": history
+            "session_id": session_id
         }
         
         try:
             print("🤖 Chatbot: ", end="", flush=True)
-            response = requests.post(url, json=data, timeout=30)
+            # Tell the server how long we'll wait, so it stops working on the answer when we give up
+            response = requests.post(url, json=data, timeout=30, headers={"X-Request-Timeout": "30"})
             
             if response.status_code == 200:
                 result = response.json()
@@ -60,9 +82,11 @@ def interactive_chatbot():
                 else:
                     print("   ❓ (No specific information found in our database)")
                 
-                # Update conversation history
-                history = result['history']
+                # Keep talking in the same session
+                session_id = result['session_id']
                 
+            elif response.status_code in (429, 503):
+                print(f"We're busy right now, please try again in {response.headers.get('Retry-After', 'a few')} seconds.")
             else:
                 print(f"❌ Sorry, I encountered an error: {response.status_code}")
                 
@@ -75,13 +99,6 @@ def quick_test():
     """Quick test with sample questions"""
     url = "http://127.0.0.1:5000/ask"
     
-    sample_questions = [
-        "When was ICF established?",
-        "Tell me about the Sunday School program",
-        "What health services do you offer?",
-        "How many students are in Sunday School?"
-    ]
-    
     print("🧪 Quick Test Mode - Sample Questions")
     print("=" * 40)
     
@@ -95,13 +112,13 @@ def quick_test():
         print("❌ Cannot connect to API. Start server with: python ollamaLLM.py")
         return
     
-    for i, question in enumerate(sample_questions, 1):
+    for i, question in enumerate(SAMPLE_QUESTIONS, 1):
         print(f"\n{i}. 🙋 Question: {question}")
         
-        data = {"question": question, "history": []}
+        data = {"question": question}
         
         try:
-            response = requests.post(url, json=data, timeout=30)
+            response = requests.post(url, json=data, timeout=30, headers={"X-Request-Timeout": "30"})
             
             if response.status_code == 200:
                 result = response.json()
@@ -120,28 +137,16 @@ def test_specific_content():
     print("🎯 Testing Specific ICF Content")
     print("=" * 35)
     
-    # Questions based on your chunk content
-    specific_questions = [
-        "When was the Islamic Center of Frisco established?",
-        "How many volunteers run the Sunday School?", 
-        "How many students are in Sunday School and how many are on the waitlist?",
-        "What does the Safwah Youth Seminary program focus on?",
-        "Tell me about the free health clinic",
-        "What is the Uswah Adult Seminary program?",
-        "Where is ICF located relative to downtown Dallas?",
-        "What programs does the Quran Academy offer?"
-    ]
-    
     try:
         requests.get("http://127.0.0.1:5000/health", timeout=5)
     except:
         print("❌ Server not running. Start with: python ollamaLLM.py")
         return
     
-    for question in specific_questions:
+    for question in SPECIFIC_QUESTIONS:
         print(f"\n🙋 Q: {question}")
         
-        data = {"question": question, "history": []}
+        data = {"question": question}
         
         try:
             response = requests.post(url, json=data, timeout=300)
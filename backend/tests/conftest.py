@@ -0,0 +1,200 @@
+import http.server
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+
+class Clock:
+    """Stands in for `time.monotonic` or `time.time`; moves only when told to."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeModel:
+    """
+    Stands in for a SentenceTransformer: each text maps to a fixed vector.
+
+    Every `encode` call is recorded in `batches`; set `error` to make it raise.
+    """
+
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.error: Optional[Exception] = None
+
+    @staticmethod
+    def vector(text: str) -> np.ndarray:
+        return np.array([len(text), sum(map(ord, text)) % 101, 1.0], dtype=np.float32)
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return np.array([self.vector(text) for text in texts], dtype=np.float32).reshape(len(texts), 3)
+
+
+class FakeCollection:
+    """The part of `chromadb.Collection` the backend uses, kept in memory in insertion order."""
+
+    def __init__(self):
+        self.rows: Dict[str, Tuple[str, Optional[dict], Optional[List[float]]]] = {}
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        for i, doc_id in enumerate(ids):
+            self.rows[doc_id] = (
+                documents[i] if documents is not None else None,
+                metadatas[i] if metadatas is not None else None,
+                [float(x) for x in embeddings[i]] if embeddings is not None else None,
+            )
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.rows.pop(doc_id, None)
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def get(self, ids=None, include=("documents", "metadatas"), limit=None, offset=0):
+        found = [doc_id for doc_id in self.rows if ids is None or doc_id in ids]
+        found = found[offset:None if limit is None else offset + limit]
+        result = {"ids": found}
+        for position, field in enumerate(("documents", "metadatas", "embeddings")):
+            if field in include:
+                result[field] = [self.rows[doc_id][position] for doc_id in found]
+        return result
+
+    def query(self, query_embeddings, n_results=10):
+        ids = list(self.rows)
+        vectors = np.array([self.rows[doc_id][2] for doc_id in ids], dtype=np.float32)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in query_embeddings:
+            distances = ((vectors - np.asarray(query, dtype=np.float32)) ** 2).sum(axis=1) if ids else np.zeros(0)
+            top = np.argsort(distances, kind="stable")[:n_results]
+            result["ids"].append([ids[i] for i in top])
+            result["documents"].append([self.rows[ids[i]][0] for i in top])
+            result["metadatas"].append([self.rows[ids[i]][1] for i in top])
+            result["distances"].append([float(distances[i]) for i in top])
+        return result
+
+
+class FakeStore:
+    """A `retrieval.ChromaStore` over a `FakeCollection`, with a generation bumped by `mark_ingested`."""
+
+    def __init__(self, path: str, name: str = "docs"):
+        self.path = path
+        self.name = name
+        self.collection_name = name
+        self.collection = FakeCollection()
+        self.marker = 1
+
+    def generation(self) -> int:
+        return self.marker
+
+    def mark_ingested(self):
+        self.marker += 1
+
+    def query(self, query_embedding, n_results=5):
+        return self.collection.query([query_embedding], n_results)
+
+    def get(self, ids):
+        return self.collection.get(ids=ids)
+
+
+class StubServer:
+    """
+    A local HTTP server whose responses are set per path.
+
+    Each route is a function from the request headers to (status, headers,
+    body). Every request is recorded as (path, headers) in `requests`.
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, Callable[[dict], Tuple[int, dict, bytes]]] = {}
+        self.requests: List[Tuple[str, dict]] = []
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                headers = {key.lower(): value for key, value in self.headers.items()}
+                with stub._lock:
+                    stub.requests.append((self.path, headers))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    route = stub.routes.get(self.path)
+                    status, response_headers, body = route(headers) if route else (404, {}, b"not found")
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+                self.send_response(status)
+                for key, value in response_headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,), daemon=True)
+
+    def page(self, path: str, body: str, status: int = 200, content_type: str = "text/html", **headers):
+        """Serves a fixed body at `path`."""
+        headers = {"Content-Type": content_type, **{key.replace("_", "-"): value for key, value in headers.items()}}
+        self.routes[path] = lambda request_headers: (status, headers, body.encode("utf-8"))
+
+    def paths(self) -> List[str]:
+        return [path for path, _ in self.requests]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A `FakeModel` loaded as the shared embedding model, with the embedding cache off."""
+    import encoder
+
+    fake = FakeModel()
+    monkeypatch.setitem(encoder._models, encoder.MODEL_NAME, fake)
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_ENTRIES", "0")
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FakeStore(str(tmp_path))
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    server.start()
+    yield server
+    server.stop()
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import (
+    AdmissionController, ConcurrencyLimiter, Deadline, DeadlineExceeded, Overloaded, TokenBucketLimiter,
+)
+
+
+def test_token_bucket_allows_a_burst_then_refills(monkeypatch, clock):
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=2)
+    assert limiter.take("client") == 0
+    assert limiter.take("client") == 0
+    assert limiter.take("client") == pytest.approx(1.0)
+    assert limiter.take("other") == 0
+    clock.advance(1)
+    assert limiter.take("client") == 0
+
+
+def test_token_bucket_rate_zero_disables_the_limit():
+    limiter = TokenBucketLimiter(rate_per_minute=0, burst=1)
+    assert all(limiter.take("client") == 0 for _ in range(100))
+
+
+def test_token_bucket_forgets_the_least_recent_clients():
+    limiter = TokenBucketLimiter(rate_per_minute=1, burst=1, max_clients=2)
+    for client in ("a", "b", "c"):
+        limiter.take(client)
+    # "a" was dropped, so it starts again with a full bucket
+    assert limiter.take("a") == 0
+    assert limiter.take("c") > 0
+
+
+def test_deadline_header_can_only_shorten_the_default():
+    assert Deadline.from_header("5", default=30).remaining() == pytest.approx(5, abs=0.1)
+    assert Deadline.from_header("90", default=30).remaining() == pytest.approx(30, abs=0.1)
+    assert Deadline.from_header("soon", default=30).remaining() == pytest.approx(30, abs=0.1)
+
+
+def test_deadline_run_cancels_slow_work():
+    async def main():
+        with pytest.raises(DeadlineExceeded):
+            await Deadline(0.01).run(asyncio.sleep(1))
+
+    asyncio.run(main())
+
+
+def test_slots_are_handed_to_waiters_in_arrival_order():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=5)
+        order = []
+
+        async def request(name):
+            started = await limiter.acquire(Deadline(5))
+            order.append(name)
+            await asyncio.sleep(0.01)
+            limiter.release(started)
+
+        first = await limiter.acquire(Deadline(5))
+        tasks = [asyncio.create_task(request(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0.01)
+        assert limiter.queued == 3
+        limiter.release(first)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+        assert limiter.active == 0 and limiter.queued == 0
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_refused_with_503():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1)
+        await limiter.acquire(Deadline(5))
+        waiter = asyncio.create_task(limiter.acquire(Deadline(5)))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as refused:
+            await limiter.acquire(Deadline(5))
+        assert refused.value.status_code == 503
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_wait_longer_than_the_deadline_is_refused_up_front():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=10)
+        limiter.release(await limiter.acquire(Deadline(5)))
+        limiter._service_seconds = 2.0
+        await limiter.acquire(Deadline(5))
+        with pytest.raises(Overloaded, match="exceeds the deadline"):
+            await limiter.acquire(Deadline(1))
+        assert limiter.queued == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def main():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=5)
+        first = await limiter.acquire(Deadline(5))
+        waiter = asyncio.create_task(limiter.acquire(Deadline(5)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release(first)
+        assert limiter.active == 0 and limiter.queued == 0
+
+    asyncio.run(main())
+
+
+def test_controller_rate_limits_before_queueing():
+    async def main():
+        controller = AdmissionController(ConcurrencyLimiter(1, 1), TokenBucketLimiter(rate_per_minute=1, burst=1))
+        controller.leave(await controller.enter("client", Deadline(5)))
+        with pytest.raises(Overloaded) as refused:
+            await controller.enter("client", Deadline(5))
+        assert refused.value.status_code == 429
+        assert refused.value.retry_after >= 1
+        assert controller.stats()["rejected"] == {"rate_limited": 1, "overloaded": 0}
+
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(max_entries=8, ttl_seconds=60, similarity_threshold=0.9)
+
+
+def test_paraphrase_with_same_context_hits(cache):
+    cache.put([1.0, 0.0], ["b", "a"], "answer")
+    assert cache.get([0.99, 0.05], ["a", "b"]) == "answer"
+    assert cache.stats()["hits"] == 1
+
+
+def test_different_context_or_question_misses(cache):
+    cache.put([1.0, 0.0], ["a"], "answer")
+    assert cache.get([1.0, 0.0], ["a", "c"]) is None
+    assert cache.get([0.0, 1.0], ["a"]) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.9)
+    cache.put([1.0, 0.0], ["a"], "first")
+    cache.put([0.0, 1.0], ["b"], "second")
+    assert cache.get([1.0, 0.0], ["a"]) == "first"
+    cache.put([1.0, 1.0], ["c"], "third")
+    assert cache.get([0.0, 1.0], ["b"]) is None
+    assert cache.get([1.0, 0.0], ["a"]) == "first"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch, clock):
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    cache = SemanticAnswerCache(max_entries=8, ttl_seconds=10, similarity_threshold=0.9)
+    cache.put([1.0, 0.0], ["a"], "answer")
+    clock.advance(5)
+    assert cache.get([1.0, 0.0], ["a"]) == "answer"
+    clock.advance(10)
+    assert cache.get([1.0, 0.0], ["a"]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_generation_change_drops_everything(store):
+    cache = SemanticAnswerCache(max_entries=8, ttl_seconds=60, similarity_threshold=0.9, generation_fn=store.generation)
+    cache.put(np.array([1.0, 0.0]), ["a"], "answer")
+    store.mark_ingested()
+    assert cache.get([1.0, 0.0], ["a"]) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticAnswerCache(max_entries=0)
+    cache.put([1.0, 0.0], ["a"], "answer")
+    assert cache.get([1.0, 0.0], ["a"]) is None
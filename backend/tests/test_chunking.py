@@ -0,0 +1,94 @@
+import pytest
+
+from chunking import BoilerplateFilter, TokenChunker, extract_blocks
+
+NAV = "Home About Programs Donate Contact"
+FOOTER = "Islamic Center of Frisco 11137 Frisco St"
+
+
+def words(count: int, word: str = "word") -> str:
+    return " ".join(f"{word}{i}" for i in range(count))
+
+
+@pytest.fixture
+def chunker():
+    # One token per word keeps the expected sizes readable
+    return TokenChunker(max_tokens=10, overlap_tokens=4, min_tokens=2, count_tokens=lambda text: len(text.split()))
+
+
+@pytest.fixture
+def boilerplate(tmp_path):
+    return BoilerplateFilter(path=str(tmp_path / "boilerplate.json"), min_pages=3, min_ratio=0.5)
+
+
+def test_extract_blocks_keeps_block_elements_apart():
+    html = """<html><head><title>ICF</title><style>p {}</style></head><body>
+        <nav><ul><li>Home</li><li>About</li></ul></nav>
+        <h1>Sunday   School</h1>
+        <p>Classes start in <b>September</b>.</p>
+        <script>track()</script><!-- comment -->
+    </body></html>"""
+
+    assert extract_blocks(html) == ["Home", "About", "Sunday School", "Classes start in September ."]
+
+
+def test_blocks_repeated_across_pages_are_boilerplate(boilerplate):
+    pages = [[NAV, "Sunday School", FOOTER], [NAV, "Quran Academy", FOOTER], [NAV, "Clinic", FOOTER],
+             [NAV, "Donate", "Zakat"]]
+    for blocks in pages:
+        boilerplate.observe(blocks)
+
+    assert boilerplate.filter([NAV, "Sunday School", "home about programs  donate contact", FOOTER]) == [
+        "Sunday School"
+    ]
+
+
+def test_nothing_is_boilerplate_before_min_pages(boilerplate):
+    boilerplate.observe([NAV, "Sunday School"])
+    boilerplate.observe([NAV, "Quran Academy"])
+
+    assert boilerplate.filter([NAV]) == [NAV]
+
+
+def test_boilerplate_counts_persist(boilerplate):
+    for page in range(3):
+        boilerplate.observe([NAV, f"page {page}"])
+    boilerplate.save()
+
+    assert BoilerplateFilter(path=boilerplate.path).is_boilerplate(NAV)
+
+
+def test_blocks_are_packed_up_to_max_tokens_with_overlap(chunker):
+    blocks = [words(4, "a"), words(4, "b"), words(4, "c"), words(3, "d")]
+
+    chunks = chunker.chunk(blocks, "https://friscomasjid.org/programs")
+
+    assert [chunk.text.split("\n") for chunk in chunks] == [
+        [blocks[0], blocks[1]],
+        [blocks[1], blocks[2]],
+        [blocks[2], blocks[3]],
+    ]
+    assert [chunk.tokens for chunk in chunks] == [8, 8, 7]
+    assert [chunk.metadata for chunk in chunks] == [
+        {"source": "https://friscomasjid.org/programs", "chunk_index": i} for i in range(3)
+    ]
+
+
+def test_oversized_block_is_split_on_sentences(chunker):
+    block = f"{words(6, 'a')}. {words(6, 'b')}. {words(6, 'c')}."
+
+    chunks = chunker.chunk([block])
+
+    assert all(chunk.tokens <= 10 for chunk in chunks)
+    assert [chunk.text for chunk in chunks] == [f"{words(6, 'a')}.", f"{words(6, 'b')}.", f"{words(6, 'c')}."]
+
+
+def test_oversized_sentence_is_split_on_words(chunker):
+    chunks = chunker.chunk([words(25)])
+
+    assert all(chunk.tokens <= 10 for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks).split() == words(25).split()
+
+
+def test_chunks_below_min_tokens_are_dropped(chunker):
+    assert chunker.chunk(["Menu"]) == []
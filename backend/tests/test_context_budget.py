@@ -0,0 +1,80 @@
+import pytest
+
+from context_budget import AssembledContext, ContextAssembler, ContextPiece
+
+
+def count_words(text):
+    return len(text.split())
+
+
+@pytest.fixture
+def assembler():
+    return ContextAssembler(max_context_tokens=100, max_history_tokens=10, count_tokens=count_words)
+
+
+def results(*documents):
+    """Chroma-shaped results from (id, text, source, chunk_index, score) tuples."""
+    return {
+        "ids": [[doc[0] for doc in documents]],
+        "documents": [[doc[1] for doc in documents]],
+        "metadatas": [[{"source": doc[2], "chunk_index": doc[3]} for doc in documents]],
+        "scores": [[doc[4] for doc in documents]],
+    }
+
+
+def test_adjacent_chunks_are_joined_without_repeating_the_overlap(assembler):
+    context = assembler.assemble_context(results(
+        ("b", "gamma delta epsilon zeta", "page", 1, 0.5),
+        ("a", "alpha beta gamma delta", "page", 0, 0.9),
+    ))
+    assert len(context.pieces) == 1
+    assert context.text == "alpha beta gamma delta\nepsilon zeta"
+    assert context.pieces[0].doc_ids == ["a", "b"]
+    assert context.pieces[0].score == 0.9
+
+
+def test_pieces_are_ordered_by_score(assembler):
+    context = assembler.assemble_context(results(
+        ("low", "one two three four", "x", 0, 0.1),
+        ("high", "five six seven eight", "y", 0, 0.8),
+    ))
+    assert [piece.doc_ids for piece in context.pieces] == [["high"], ["low"]]
+
+
+def test_near_duplicates_are_dropped(assembler):
+    text = "the clinic is open every saturday for uninsured patients"
+    context = assembler.assemble_context(results(
+        ("a", text, "x", 0, 0.9),
+        ("b", text + " too", "y", 0, 0.5),
+    ))
+    assert [piece.doc_ids for piece in context.pieces] == [["a"]]
+    assert context.dropped_duplicates == 1
+
+
+def test_pieces_over_budget_are_dropped_and_the_best_is_truncated_to_fit(assembler):
+    context = assembler.assemble_context(results(
+        ("a", "one two three four five six seven", "x", 0, 0.9),
+        ("b", "eight nine", "y", 0, 0.5),
+    ), max_tokens=5)
+    assert context.text == "one two three four five"
+    assert context.tokens == 5
+    assert context.dropped_over_budget == 1
+
+
+def test_empty_results_give_an_empty_context(assembler):
+    context = assembler.assemble_context({"ids": [[]], "documents": [[]]})
+    assert context.text == "" and context.pieces == [] and context.tokens == 0
+
+
+def test_history_keeps_the_newest_lines_that_fit():
+    assembler = ContextAssembler(max_context_tokens=100, max_history_tokens=7, count_tokens=count_words)
+    history = ["User: one two three", "Bot: four five six", "User: seven eight", "Bot: nine ten"]
+    assert assembler.trim_history(history) == history[2:]
+
+
+def test_combined_blocks_keep_both_in_order(assembler):
+    table = AssembledContext("Isha: 9:45 PM", [ContextPiece("Isha: 9:45 PM", 1.0, doc_ids=["prayer_times:today"])], 3)
+    context = assembler.combine(table, assembler.assemble_context(results(("a", "parking is free", "x", 0, 0.9))))
+    assert context.text == "Isha: 9:45 PM\n\nparking is free"
+    assert [piece.doc_ids for piece in context.pieces] == [["prayer_times:today"], ["a"]]
+    assert context.tokens == 6
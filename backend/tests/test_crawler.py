@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from crawler import Crawler, crawl_site, normalize_url
+
+
+def links(*hrefs):
+    return "".join(f'<a href="{href}">link</a>' for href in hrefs)
+
+
+@pytest.fixture
+def site(stub_server):
+    stub_server.page("/", links("/about", "/about/", "/about#team", "/events?b=2&a=1", "/flyer.pdf",
+                                "mailto:info@example.org", "https://elsewhere.example/"))
+    stub_server.page("/about", links("/", "/events?a=1&b=2"))
+    stub_server.page("/events?a=1&b=2", links("/missing"))
+    return stub_server
+
+
+@pytest.fixture
+def crawler(stub_server):
+    """Builds a crawler confined to the stub server."""
+    return lambda **kwargs: Crawler(stub_server.url + "/", is_allowed=lambda url: url.startswith(stub_server.url), **kwargs)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.ORG:80/a/b/#top", "http://example.org/a/b"),
+    ("https://example.org:443", "https://example.org/"),
+    ("https://example.org:8443/x?b=2&a=1", "https://example.org:8443/x?a=1&b=2"),
+    ("mailto:someone@example.org", None),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_each_page_is_fetched_once(site):
+    result = crawl_site(site.url + "/", None, is_allowed=lambda url: url.startswith(site.url), requests_per_second=0)
+    assert sorted(page.url for page in result.pages) == [
+        site.url + "/", site.url + "/about", site.url + "/events?a=1&b=2",
+    ]
+    # The spellings of /about and /events dedupe, and the PDF and other hosts are never requested
+    assert sorted(site.paths()) == ["/", "/about", "/events?a=1&b=2", "/missing"]
+
+
+def test_failures_are_recorded_and_unreached_pages_reported(site):
+    result = crawl_site(site.url + "/", None, is_allowed=lambda url: url.startswith(site.url), requests_per_second=0)
+    assert list(result.failed) == [site.url + "/missing"]
+    assert "404" in result.failed[site.url + "/missing"]
+    assert result.unreached == set()
+
+    limited = crawl_site(site.url + "/", None, is_allowed=lambda url: url.startswith(site.url),
+                         requests_per_second=0, max_pages=2)
+    assert len(limited.pages) == 2
+    assert site.url + "/events?a=1&b=2" in limited.unreached
+
+
+def test_concurrency_is_bounded(stub_server, crawler):
+    stub_server.page("/", links(*[f"/page{i}" for i in range(12)]))
+    for i in range(12):
+        stub_server.page(f"/page{i}", "leaf")
+    stub_server.delay = 0.05
+    pages = asyncio.run(crawler(max_concurrency=3, requests_per_second=0, save_dir=None).crawl())
+    assert len(pages) == 13
+    assert 1 < stub_server.max_in_flight <= 3
+
+
+def test_requests_to_one_host_are_spaced_out(stub_server, crawler):
+    stub_server.page("/", links(*[f"/page{i}" for i in range(4)]))
+    for i in range(4):
+        stub_server.page(f"/page{i}", "leaf")
+    started = time.perf_counter()
+    asyncio.run(crawler(max_concurrency=5, requests_per_second=20, save_dir=None).crawl())
+    # Five requests at 20 per second take at least four intervals
+    assert time.perf_counter() - started >= 4 / 20
+
+
+def test_unchanged_pages_are_revalidated_and_read_from_the_saved_copy(stub_server, crawler, tmp_path):
+    def conditional(body):
+        def respond(headers):
+            if headers.get("if-none-match") == '"v1"':
+                return 304, {"ETag": '"v1"'}, b""
+            return 200, {"Content-Type": "text/html", "ETag": '"v1"'}, body.encode("utf-8")
+        return respond
+
+    stub_server.routes["/"] = conditional(links("/child"))
+    stub_server.routes["/child"] = conditional("child page")
+    first = asyncio.run(crawler(requests_per_second=0, save_dir=str(tmp_path)).crawl())
+    assert not any(page.not_modified for page in first)
+    with open(tmp_path / "urls.json", encoding="utf-8") as f:
+        assert json.load(f) == {"index.html": stub_server.url + "/", "child.html": stub_server.url + "/child"}
+
+    etags = {page.url: page.etag for page in first}
+    second = asyncio.run(crawler(
+        requests_per_second=0, save_dir=str(tmp_path), conditional_headers=lambda url: {"If-None-Match": etags[url]},
+    ).crawl())
+    # Links on the unchanged start page are still followed, from the saved copy
+    assert sorted(page.url for page in second) == [stub_server.url + "/", stub_server.url + "/child"]
+    assert all(page.not_modified for page in second)
+    assert [page.html for page in second if page.url.endswith("/child")] == ["child page"]
+    assert [headers.get("if-none-match") for _, headers in stub_server.requests[2:]] == ['"v1"', '"v1"']
@@ -0,0 +1,94 @@
+import types
+
+import numpy as np
+import pytest
+
+import embedding_cache as embedding_cache_module
+from embedding_cache import EmbeddingCache, get_embedding_cache
+from encoder import MODEL_NAME, encode_texts
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(embedding_cache_module, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return EmbeddingCache(MODEL_NAME, str(tmp_path), max_entries=100)
+
+
+def vectors(*values):
+    return np.array([[value, value + 0.5] for value in values], dtype=np.float32)
+
+
+def misses(cache, texts):
+    return cache.get_many(texts)[1]
+
+
+def test_vectors_are_served_before_and_after_a_flush(cache, tmp_path):
+    assert misses(cache, ["a", "b"]) == [0, 1]
+
+    cache.put_many(["a", "b"], vectors(1, 2))
+    found, missed = cache.get_many(["b", "c", "a"])
+    assert missed == [1]
+    np.testing.assert_array_equal(np.vstack([found[0], found[2]]), vectors(2, 1))
+
+    cache.flush()
+    reopened = EmbeddingCache(MODEL_NAME, str(tmp_path))
+    found, missed = reopened.get_many(["a", "b"])
+    assert missed == []
+    np.testing.assert_array_equal(np.vstack(found), vectors(1, 2))
+
+
+def test_a_flush_from_another_instance_is_picked_up(cache, tmp_path):
+    other = EmbeddingCache(MODEL_NAME, str(tmp_path))
+    assert misses(other, ["a"]) == [0]
+
+    cache.put_many(["a"], vectors(1))
+    cache.flush()
+
+    assert misses(other, ["a"]) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(MODEL_NAME, str(tmp_path), max_entries=3)
+    cache.put_many(["a", "b", "c"], vectors(1, 2, 3))
+    cache.flush()
+
+    clock.advance(10)
+    cache.get_many(["b"])
+    cache.put_many(["d"], vectors(4))
+    cache.flush()
+
+    assert misses(cache, ["a", "b", "c", "d"]) == [0, 2]
+    assert cache.stats()["evictions"] == 2
+
+
+def test_vectors_of_a_new_size_replace_the_old_ones(cache):
+    cache.put_many(["a"], vectors(1))
+    cache.flush()
+
+    cache.put_many(["b"], np.ones((1, 4), dtype=np.float32))
+    cache.flush()
+
+    assert misses(cache, ["a", "b"]) == [0]
+    assert cache.get_many(["b"])[0][0].shape == (4,)
+
+
+def test_encode_texts_only_encodes_misses_once(model, tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_ENTRIES", "100")
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path))
+
+    encode_texts(["a", "b"])
+    result = encode_texts(["b", "c", "c", "a"])
+
+    assert model.batches == [["a", "b"], ["c"]]
+    np.testing.assert_array_equal(result, np.vstack([model.vector(text) for text in ["b", "c", "c", "a"]]))
+
+
+def test_cache_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_MAX_ENTRIES", "0")
+
+    assert get_embedding_cache(MODEL_NAME) is None
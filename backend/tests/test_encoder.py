@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from encoder import BatchedEncoder, encode_texts
+
+
+def encode_all(encoder: BatchedEncoder, texts):
+    async def run():
+        await encoder.start()
+        try:
+            return await asyncio.gather(*(encoder.encode(text) for text in texts), return_exceptions=True)
+        finally:
+            await encoder.stop()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_queries_share_one_forward_pass(model):
+    texts = ["prayer times", "parking", "sunday school", "clinic hours"]
+    vectors = encode_all(BatchedEncoder(max_batch_size=32, max_wait_ms=50), texts)
+
+    assert model.batches == [texts]
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, model.vector(text))
+
+
+def test_batches_are_capped_at_max_batch_size(model):
+    texts = [f"question {i}" for i in range(5)]
+    vectors = encode_all(BatchedEncoder(max_batch_size=2, max_wait_ms=50), texts)
+
+    assert [len(batch) for batch in model.batches] == [2, 2, 1]
+    assert [text for batch in model.batches for text in batch] == texts
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, model.vector(text))
+
+
+def test_a_failed_batch_fails_each_caller_and_the_encoder_recovers(model):
+    encoder = BatchedEncoder(max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        await encoder.start()
+        try:
+            model.error = RuntimeError("out of memory")
+            failed = await asyncio.gather(encoder.encode("a"), encoder.encode("b"), return_exceptions=True)
+            model.error = None
+            return failed, await encoder.encode("c")
+        finally:
+            await encoder.stop()
+
+    failed, recovered = asyncio.run(run())
+
+    assert [str(error) for error in failed] == ["out of memory", "out of memory"]
+    np.testing.assert_array_equal(recovered, model.vector("c"))
+
+
+def test_encode_needs_a_started_encoder(model):
+    encoder = BatchedEncoder()
+    assert not encoder.ready
+    with pytest.raises(RuntimeError):
+        asyncio.run(encoder.encode("a"))
+
+
+def test_encode_texts_encodes_a_batch_in_one_call(model):
+    vectors = encode_texts(["a", "bb", "ccc"])
+
+    assert model.batches == [["a", "bb", "ccc"]]
+    assert vectors.dtype == np.float32 and vectors.shape == (3, 3)
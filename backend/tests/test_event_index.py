@@ -0,0 +1,91 @@
+from datetime import date
+
+import pytest
+
+from event_index import Event, EventIndex, EventRouter, MINUTES_PER_DAY, parse_days, parse_time_range
+
+WEDNESDAY = date(2025, 6, 11)
+SUNDAY = date(2025, 6, 15)
+
+
+def window(day, start, end):
+    base = day.toordinal() * MINUTES_PER_DAY
+    return base + start, base + end
+
+
+@pytest.fixture
+def index():
+    lunch_start, lunch_end = parse_time_range("11-1pm")
+    return EventIndex([
+        Event(row=0, title="Halaqa", room="", date=WEDNESDAY, start=19 * 60, end=None),
+        Event(row=1, title="Open house", room="", date=WEDNESDAY, start=None, end=None, time_text="All day"),
+        Event(row=2, title="Community lunch", room="Hall", date=WEDNESDAY, start=lunch_start, end=lunch_end),
+        Event(row=3, title="Tafsir", room="Library", date=WEDNESDAY, start=18 * 60, end=20 * 60),
+        Event(row=4, title="Youth night", room="Gym", date=WEDNESDAY, start=18 * 60, end=20 * 60),
+        Event(row=5, title="Sunday tafsir", room="Library", date=SUNDAY, start=18 * 60, end=19 * 60),
+        Event(row=6, title="Undated", room="", date=None, start=10 * 60, end=None),
+    ], default_duration=60)
+
+
+@pytest.fixture
+def router(index):
+    return EventRouter(index, timezone="UTC", upcoming_days=7)
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("7:00 PM - 9:00 PM", (19 * 60, 21 * 60)),
+    ("7-9pm", (19 * 60, 21 * 60)),
+    ("10 AM to 1 PM", (10 * 60, 13 * 60)),
+    ("19:00", (19 * 60, None)),
+    ("11-1pm", (11 * 60, 13 * 60)),
+    ("10-12pm", (10 * 60, 12 * 60)),
+    ("After Isha", (None, None)),
+])
+def test_parse_time_range(cell, expected):
+    assert parse_time_range(cell) == expected
+
+
+def test_overlapping_uses_the_default_duration_and_whole_days(index):
+    assert [e.title for e in index.lookup([window(WEDNESDAY, 19 * 60 + 59, 20 * 60)])] == [
+        "Open house", "Tafsir", "Youth night", "Halaqa",
+    ]
+    assert [e.title for e in index.lookup([window(WEDNESDAY, 20 * 60, 21 * 60)])] == ["Open house"]
+    assert index.lookup([window(date(2025, 6, 12), 0, MINUTES_PER_DAY)]) == []
+    assert len(index) == 7
+
+
+def test_lookup_filters_by_room_and_reports_each_event_once(index):
+    evening = window(WEDNESDAY, 17 * 60, MINUTES_PER_DAY)
+    late = window(WEDNESDAY, 19 * 60, MINUTES_PER_DAY)
+    assert [e.title for e in index.lookup([evening, late], room="library")] == ["Tafsir"]
+    assert index.find_room("anything in the library tonight?") == "Library"
+    assert index.find_room("anything in the kitchen?") is None
+
+
+def test_parse_days_relative_to_today():
+    assert parse_days("what's on today", WEDNESDAY) == [WEDNESDAY]
+    assert parse_days("events tomorrow", WEDNESDAY) == [date(2025, 6, 12)]
+    assert parse_days("this friday", WEDNESDAY) == [date(2025, 6, 13)]
+    assert parse_days("next wednesday", WEDNESDAY) == [date(2025, 6, 18)]
+    assert parse_days("this weekend", WEDNESDAY) == [date(2025, 6, 14), SUNDAY]
+    assert parse_days("june 20th", WEDNESDAY) == [date(2025, 6, 20)]
+    assert parse_days("2025-07-04", WEDNESDAY) == [date(2025, 7, 4)]
+    # Early-year dates asked about late in the year roll over
+    assert parse_days("jan 5", date(2025, 12, 1)) == [date(2026, 1, 5)]
+
+
+def test_route_finds_an_event_that_crosses_noon(router, index):
+    query = router.route("Any events in the hall today around noon?", today=WEDNESDAY)
+    assert [e.title for e in index.lookup(query.windows, query.room)] == ["Community lunch"]
+
+
+def test_route_ignores_questions_that_are_not_about_events(router):
+    assert router.route("What time is Jummah today?", today=WEDNESDAY) is None
+    assert router.route("Tell me about the events program", today=WEDNESDAY) is None
+
+
+def test_route_without_a_day_searches_the_upcoming_days_in_a_room(router, index):
+    query = router.route("Any classes in the library?", today=date(2025, 6, 12))
+    assert query.room == "Library"
+    assert query.description == "in the next 7 days in Library"
+    assert [e.title for e in index.lookup(query.windows, query.room)] == ["Sunday tafsir"]
@@ -0,0 +1,106 @@
+import pytest
+
+from hybrid_search import HybridRetriever, reciprocal_rank_fusion
+from keyword_index import BM25Index, tokenize
+
+DOCUMENTS = {
+    "jumuah": ("Jumuah khutbah starts at 1:30 PM in the main hall", [1.0, 0.0]),
+    "parking": ("Overflow parking is available at the high school on Fridays", [0.9, 0.1]),
+    "clinic": ("The free clinic sees uninsured patients on Saturdays", [0.0, 1.0]),
+    "tajweed": ("Tajweed classes meet on Tuesday evenings in the library", [0.5, 0.5]),
+}
+
+
+class ReverseReranker:
+    def rerank(self, query, candidates):
+        return [doc_id for doc_id, _ in reversed(candidates)]
+
+
+@pytest.fixture
+def keyword_index(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.add(DOCUMENTS, [text for text, _ in DOCUMENTS.values()])
+    return index
+
+
+@pytest.fixture
+def filled_store(store):
+    store.collection.upsert(
+        ids=list(DOCUMENTS),
+        documents=[text for text, _ in DOCUMENTS.values()],
+        metadatas=[{"source": f"https://friscomasjid.org/{doc_id}"} for doc_id in DOCUMENTS],
+        embeddings=[vector for _, vector in DOCUMENTS.values()],
+    )
+    return store
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("When is the Jumu'ah khutbah, and where do I park?") == ["jumu'ah", "khutbah", "park"]
+
+
+def test_bm25_ranks_documents_matching_more_and_rarer_terms_first(keyword_index):
+    ranked = [doc_id for doc_id, _ in keyword_index.search("parking on Fridays for the khutbah")]
+
+    assert ranked[0] == "parking"
+    assert set(ranked) == {"parking", "jumuah"}
+    assert keyword_index.search("the and of") == []
+
+
+def test_bm25_remove_and_reload(keyword_index):
+    keyword_index.remove(["clinic"])
+    keyword_index.save()
+
+    reloaded = BM25Index(keyword_index.path)
+    assert reloaded.load()
+    assert "clinic" not in reloaded and len(reloaded) == 3
+    assert reloaded.search("clinic") == []
+    assert reloaded.search("tajweed") == keyword_index.search("tajweed")
+
+
+def test_rrf_favours_documents_found_by_both_retrievers():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+    assert dict(fused)["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert dict(fused)["c"] == pytest.approx(1 / 63)
+
+
+def test_hybrid_search_fuses_vector_and_keyword_rankings(filled_store, keyword_index):
+    retriever = HybridRetriever(filled_store, keyword_index=keyword_index, vectors=filled_store, candidates=2)
+
+    # The vector side alone ranks jumuah and parking first; only the keyword side knows tajweed
+    result = retriever.search("tajweed classes", [1.0, 0.0], n_results=3)
+
+    assert result["ids"][0][0] == "tajweed"
+    assert set(result["ids"][0]) == {"tajweed", "jumuah", "parking"}
+    assert result["documents"][0][0] == DOCUMENTS["tajweed"][0]
+    assert result["metadatas"][0][0] == {"source": "https://friscomasjid.org/tajweed"}
+    assert result["scores"][0] == sorted(result["scores"][0], reverse=True)
+
+
+def test_keyword_hits_deleted_from_the_collection_are_dropped(filled_store, keyword_index):
+    filled_store.collection.delete(["tajweed"])
+    retriever = HybridRetriever(filled_store, keyword_index=keyword_index, vectors=filled_store, candidates=2)
+
+    assert "tajweed" not in retriever.search("tajweed classes", [1.0, 0.0], n_results=3)["ids"][0]
+
+
+def test_reranker_order_decides_the_scores(filled_store, keyword_index):
+    retriever = HybridRetriever(filled_store, keyword_index=keyword_index, vectors=filled_store,
+                                candidates=4, reranker=ReverseReranker())
+    fused = HybridRetriever(filled_store, keyword_index=keyword_index, vectors=filled_store, candidates=4)
+
+    fused_order = fused.search("clinic", [0.0, 1.0], n_results=4)["ids"][0]
+    result = retriever.search("clinic", [0.0, 1.0], n_results=4)
+
+    assert result["ids"][0] == list(reversed(fused_order))
+    assert result["scores"][0] == [1.0, 0.5, pytest.approx(1 / 3), 0.25]
+
+
+def test_missing_keyword_index_is_rebuilt_from_the_collection(filled_store, tmp_path):
+    keyword_index = BM25Index(str(tmp_path / "missing.json"))
+    retriever = HybridRetriever(filled_store, keyword_index=keyword_index, vectors=filled_store)
+
+    assert retriever.search("free clinic", [0.0, 1.0], n_results=1)["ids"][0] == ["clinic"]
+    assert retriever.keyword_index is keyword_index and len(keyword_index) == len(DOCUMENTS)
+    assert (tmp_path / "missing.json").exists()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_backends import FakeBackend, LLMBackend, LLMTimeoutError
+
+MESSAGES = [{"role": "user", "content": "When is Jumuah?"}]
+OTHER = [{"role": "user", "content": "Is there parking?"}]
+
+
+class BrokenBackend(FakeBackend):
+    async def _stream(self, messages):
+        yield "The"
+        await asyncio.sleep(0.01)
+        raise ConnectionError("upstream reset")
+
+
+def test_backends_must_implement_stream():
+    with pytest.raises(TypeError):
+        LLMBackend("model")
+
+
+def test_identical_concurrent_requests_share_one_generation():
+    backend = FakeBackend(latency_ms=20)
+
+    async def run():
+        return await asyncio.gather(backend.complete(MESSAGES), backend.complete(MESSAGES),
+                                    backend.complete(MESSAGES), backend.complete(OTHER))
+
+    answers = asyncio.run(run())
+
+    assert answers == [FakeBackend.answer_for(MESSAGES)] * 3 + [FakeBackend.answer_for(OTHER)]
+    stats = backend.stats()
+    assert (stats["requests"], stats["coalesced"], stats["generations"], stats["in_flight"]) == (4, 2, 2, 0)
+
+
+def test_late_joiner_replays_what_was_already_generated():
+    backend = FakeBackend(token_latency_ms=5)
+
+    async def run():
+        first = backend.stream(MESSAGES)
+        early = [await first.__anext__(), await first.__anext__()]
+        late = await backend.complete(MESSAGES)
+        return early + [piece async for piece in first], late
+
+    first, late = asyncio.run(run())
+
+    assert "".join(first) == late == FakeBackend.answer_for(MESSAGES)
+    assert backend.generations == 1 and backend.coalesced == 1
+
+
+def test_generation_is_cancelled_once_every_caller_leaves():
+    backend = FakeBackend(token_latency_ms=50)
+
+    async def run():
+        stream = backend.stream(MESSAGES)
+        await stream.__anext__()
+        task = backend._in_flight[next(iter(backend._in_flight))].task
+        await stream.aclose()
+        await asyncio.gather(task, return_exceptions=True)
+        return task
+
+    task = asyncio.run(run())
+
+    assert task.cancelled()
+    assert backend.stats()["in_flight"] == 0
+
+
+def test_generation_continues_while_someone_still_listens():
+    backend = FakeBackend(token_latency_ms=5)
+
+    async def run():
+        leaving = backend.stream(MESSAGES)
+        await leaving.__anext__()
+        staying = asyncio.create_task(backend.complete(MESSAGES))
+        await asyncio.sleep(0.01)
+        await leaving.aclose()
+        return await staying
+
+    assert asyncio.run(run()) == FakeBackend.answer_for(MESSAGES)
+
+
+def test_errors_reach_every_caller():
+    backend = BrokenBackend()
+
+    async def run():
+        return await asyncio.gather(backend.complete(MESSAGES), backend.complete(MESSAGES), return_exceptions=True)
+
+    errors = asyncio.run(run())
+
+    assert [str(error) for error in errors] == ["upstream reset", "upstream reset"]
+    assert backend.errors == 1 and backend.generations == 1
+
+
+def test_slow_generation_times_out():
+    backend = FakeBackend(latency_ms=200, timeout=0.05)
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(backend.complete(MESSAGES))
+    assert backend.timeouts == 1
+
+
+def test_upstream_generations_are_limited():
+    backend = FakeBackend(latency_ms=50, max_concurrency=2)
+    prompts = [[{"role": "user", "content": f"question {i}"}] for i in range(4)]
+
+    async def run():
+        return await asyncio.gather(*(backend.complete(messages) for messages in prompts))
+
+    started = time.perf_counter()
+    asyncio.run(run())
+
+    assert time.perf_counter() - started >= 0.1
+    assert backend.generations == 4
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from manifest import IngestManifest, chunk_id
+from vector_db_pipline import html_to_chroma_pipeline
+
+PAGE = "https://friscomasjid.org/programs"
+INTRO = "The Sunday School meets every Sunday morning from September to May in the main building classrooms."
+TAJWEED = "Tajweed classes for adults are held on Tuesday evenings after Isha in the library on the second floor."
+HIFZ = "The full-time hifz program accepts new students each August after an interview and a recitation test."
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestManifest(str(tmp_path / "manifest.json"))
+
+
+def ingest(manifest, store, segments, url=PAGE):
+    return html_to_chroma_pipeline(url, manifest, segments=segments, store=store)
+
+
+def test_chunk_ids_depend_only_on_url_and_content():
+    assert chunk_id(PAGE, INTRO) == chunk_id(PAGE, INTRO)
+    assert chunk_id(PAGE, INTRO) != chunk_id(PAGE, TAJWEED)
+    assert chunk_id(PAGE, INTRO) != chunk_id("https://friscomasjid.org/about", INTRO)
+
+
+def test_conditional_headers_come_from_the_last_run(manifest):
+    assert manifest.conditional_headers(PAGE) == {}
+
+    manifest.update(PAGE, ["a"], etag='"v1"', last_modified="Wed, 11 Jun 2025 08:00:00 GMT")
+    manifest.update("https://friscomasjid.org/about", ["b"], etag='"v2"')
+    manifest.save()
+    reloaded = IngestManifest(manifest.path)
+
+    assert reloaded.conditional_headers(PAGE) == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Wed, 11 Jun 2025 08:00:00 GMT",
+    }
+    assert reloaded.conditional_headers("https://friscomasjid.org/about") == {"If-None-Match": '"v2"'}
+    assert reloaded.remove(PAGE) == ["a"]
+    assert reloaded.chunk_ids(PAGE) == []
+
+
+def test_reingestion_embeds_only_new_chunks_and_deletes_stale_ones(model, manifest, store):
+    ingest(manifest, store, [INTRO, TAJWEED, INTRO])
+    assert model.batches == [[INTRO, TAJWEED]]
+    assert manifest.chunk_ids(PAGE) == [chunk_id(PAGE, INTRO), chunk_id(PAGE, TAJWEED)]
+
+    ingest(manifest, store, [TAJWEED, HIFZ])
+
+    assert model.batches[1:] == [[HIFZ]]
+    assert set(store.collection.rows) == {chunk_id(PAGE, TAJWEED), chunk_id(PAGE, HIFZ)}
+    assert IngestManifest(manifest.path).chunk_ids(PAGE) == [chunk_id(PAGE, TAJWEED), chunk_id(PAGE, HIFZ)]
+    assert store.collection.rows[chunk_id(PAGE, HIFZ)][1] == {"source": PAGE, "chunk_index": 1}
+
+
+def test_unchanged_page_touches_nothing(model, manifest, store):
+    ingest(manifest, store, [INTRO, TAJWEED])
+    generation = store.generation()
+
+    ingest(manifest, store, [INTRO, TAJWEED])
+
+    assert len(model.batches) == 1
+    assert store.generation() == generation
+
+
+def test_failed_upload_is_not_recorded(model, manifest, store, monkeypatch):
+    def fail(**kwargs):
+        raise ConnectionError("chroma is down")
+
+    monkeypatch.setattr(store.collection, "upsert", fail)
+
+    assert ingest(manifest, store, [INTRO]) is False
+    assert manifest.chunk_ids(PAGE) == []
+    assert not os.path.exists(manifest.path)
+
+
+def test_not_modified_page_is_skipped(model, manifest, store, stub_server, tmp_path, monkeypatch):
+    # Keeps the default boilerplate counts out of the working tree
+    monkeypatch.chdir(tmp_path)
+    html = f"<html><body><p>{INTRO}</p><p>{TAJWEED}</p></body></html>"
+
+    def route(headers):
+        if headers.get("if-none-match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"Content-Type": "text/html", "ETag": '"v1"'}, html.encode("utf-8")
+
+    stub_server.routes["/programs"] = route
+    url = stub_server.url + "/programs"
+
+    html_to_chroma_pipeline(url, manifest, store=store)
+    assert manifest.conditional_headers(url) == {"If-None-Match": '"v1"'}
+    assert len(model.batches) == 1 and store.collection.count() > 0
+
+    assert html_to_chroma_pipeline(url, manifest, store=store) is True
+    assert stub_server.requests[-1][1]["if-none-match"] == '"v1"'
+    assert len(model.batches) == 1
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from datetime import date
+
+import pytest
+
+from prayer_times import CenterInfoRouter, PrayerTimesFeed, parse_clock, parse_prayer_times
+
+FRIDAY = date(2025, 6, 13)
+FEED = {"data": [
+    {"date": "2025-06-13", "fajr": "4:45", "fajrIqama": "5:15", "dhuhr": "1:30", "asr": "5:15",
+     "maghrib": "8:35", "isha": "10:00", "ishaIqama": "10:15", "jumuah": "1:30"},
+    {"date": "2025-06-14", "fajr": "4:45", "isha": "10:01"},
+]}
+
+
+@pytest.fixture
+def feed(stub_server, tmp_path):
+    stub_server.page("/prayerTimes", json.dumps(FEED), content_type="application/json", ETag='"v1"')
+    feed = PrayerTimesFeed(url=stub_server.url + "/prayerTimes", snapshot_path=str(tmp_path / "prayer_times.json"))
+    feed.today = lambda: FRIDAY
+    return feed
+
+
+@pytest.fixture
+def router():
+    feed = PrayerTimesFeed(snapshot_path="")
+    feed.table = parse_prayer_times(FEED, FRIDAY)
+    return CenterInfoRouter(feed)
+
+
+def test_flat_day_records_with_iqama_fields():
+    table = parse_prayer_times(FEED, FRIDAY)
+    assert sorted(table.days) == [FRIDAY, date(2025, 6, 14)]
+    friday = table.days[FRIDAY]
+    assert (friday["fajr"].adhan, friday["fajr"].iqama) == (4 * 60 + 45, 5 * 60 + 15)
+    # Afternoon prayers written on a 12-hour clock without AM/PM are read as PM
+    assert friday["asr"].adhan == 17 * 60 + 15
+    assert friday["jumuah"].adhan == 13 * 60 + 30
+    assert friday["isha"].describe() == "Isha: adhan 10:00 PM, iqama 10:15 PM"
+
+
+def test_list_of_named_prayers_without_a_date_is_for_today():
+    payload = {"prayers": [
+        {"name": "Fajr", "adhan": "05:10:00", "iqama": "05:40:00"},
+        {"name": "Maghrib", "begins": "8:30 PM", "jamaat": "8:35 PM"},
+    ]}
+    day = parse_prayer_times(payload, FRIDAY).days[FRIDAY]
+    assert (day["fajr"].adhan, day["fajr"].iqama) == (5 * 60 + 10, 5 * 60 + 40)
+    assert (day["maghrib"].adhan, day["maghrib"].iqama) == (20 * 60 + 30, 20 * 60 + 35)
+
+
+def test_nested_objects_per_prayer():
+    payload = {"timings": {"date": "06/13/2025", "Dhuhr": {"adhan": "13:30", "iqamah": "13:45"}}}
+    day = parse_prayer_times(payload, date(2025, 1, 1)).days[FRIDAY]
+    assert (day["dhuhr"].adhan, day["dhuhr"].iqama) == (13 * 60 + 30, 13 * 60 + 45)
+
+
+def test_payload_without_prayer_times_is_empty():
+    assert parse_prayer_times({"status": "ok", "items": []}, FRIDAY).days == {}
+    assert parse_clock("After Isha", "isha") is None
+
+
+def test_unchanged_feed_is_revalidated_with_its_etag(feed, stub_server):
+    def conditional(headers):
+        if headers.get("if-none-match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"Content-Type": "application/json", "ETag": '"v1"'}, json.dumps(FEED).encode()
+
+    stub_server.routes["/prayerTimes"] = conditional
+    assert asyncio.run(feed.refresh())
+    assert asyncio.run(feed.refresh())
+    assert [headers.get("if-none-match") for _, headers in stub_server.requests] == [None, '"v1"']
+    assert feed.counts == {"updated": 1, "not_modified": 1, "failed": 0}
+    assert FRIDAY in feed.table.days
+
+
+def test_failed_fetch_keeps_the_last_good_table(feed, stub_server):
+    assert asyncio.run(feed.refresh())
+    stub_server.page("/prayerTimes", "unavailable", status=503)
+    assert not asyncio.run(feed.refresh())
+    assert feed.last_error.startswith("HTTPStatusError")
+    assert FRIDAY in feed.table.days
+
+    stub_server.page("/prayerTimes", json.dumps({"status": "ok"}), content_type="application/json")
+    assert not asyncio.run(feed.refresh())
+    assert feed.counts["failed"] == 2 and FRIDAY in feed.table.days
+
+
+def test_restart_while_the_feed_is_down_serves_the_snapshot(feed, stub_server):
+    assert asyncio.run(feed.refresh())
+    stub_server.page("/prayerTimes", "unavailable", status=503)
+
+    restarted = PrayerTimesFeed(url=feed.url, snapshot_path=feed.snapshot_path)
+    assert restarted.load_snapshot()
+    assert not asyncio.run(restarted.refresh())
+    assert restarted.table.days[FRIDAY]["isha"].iqama == 22 * 60 + 15
+    # The restored validators are sent, so a recovered feed can answer 304
+    assert stub_server.requests[-1][1].get("if-none-match") == '"v1"'
+
+
+@pytest.mark.parametrize("question, prayers", [
+    ("When is Isha today?", ["isha"]),
+    ("What time is Jumuah?", ["jumuah"]),
+    ("What are the prayer times on Friday?", []),
+])
+def test_time_questions_are_answered_from_the_table(router, question, prayers):
+    query = router.route(question, today=FRIDAY)
+    assert (query.kind, query.days, query.prayers) == ("prayer_times", [FRIDAY], prayers)
+
+
+@pytest.mark.parametrize("question", [
+    "Is there parking for Jumuah?",
+    "Who gives the Jumuah khutbah?",
+    "Is there a halaqa after Isha tonight?",
+    "When does the Isha halaqa start?",
+])
+def test_questions_that_only_mention_a_prayer_still_search_with_the_table(router, question):
+    assert router.route(question, today=FRIDAY) is None
+    assert router.supplement(question, today=FRIDAY).kind == "prayer_times"
+
+
+def test_days_the_table_does_not_cover_are_not_routed(router):
+    assert router.route("When is Fajr on June 20th?", today=FRIDAY) is None
+    assert router.supplement("Is Fajr early on June 20th?", today=FRIDAY) is None
+
+
+def test_contact_questions(router):
+    assert router.route("What is the phone number?", today=FRIDAY).kind == "contact"
+    assert router.route("Where is ICF located?", today=FRIDAY).kind == "contact"
+    assert router.route("What is the clinic phone number?", today=FRIDAY) is None
+    assert router.supplement("What is the clinic phone number?", today=FRIDAY).kind == "contact"
+    assert router.route("What does Sunday School cost?", today=FRIDAY) is None
@@ -0,0 +1,85 @@
+import time
+import types
+
+import pytest
+
+import sessions as sessions_module
+from sessions import SessionStore
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    clock.now = time.time()
+    monkeypatch.setattr(sessions_module, "time", types.SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def sessions(tmp_path, clock):
+    store = SessionStore(max_sessions=100, max_turns=2, ttl_seconds=3600, db_path=str(tmp_path / "sessions.db"))
+    yield store
+    store.close()
+
+
+def ask(sessions, session_id, *questions):
+    for question in questions:
+        session = sessions.append(session_id, question, f"answer to {question}")
+    return session
+
+
+def test_old_turns_fold_into_the_summary(sessions):
+    session = ask(sessions, "s1", "When is Jumuah?", "Is there parking?", "Who gives the khutbah?")
+
+    assert session.turns == ["User: Is there parking?", "Bot: answer to Is there parking?",
+                             "User: Who gives the khutbah?", "Bot: answer to Who gives the khutbah?"]
+    assert session.summary == "When is Jumuah?"
+
+    session = ask(sessions, "s1", "Is there a halaqa after Isha?")
+
+    assert session.summary == "When is Jumuah?; Is there parking?"
+    assert session.history()[0] == "Earlier in this conversation the user asked about: When is Jumuah?; Is there parking?"
+    assert session.history()[1:] == session.turns
+
+
+def test_summary_keeps_its_newest_part():
+    sessions = SessionStore(max_turns=1, max_summary_chars=20, db_path="")
+    session = ask(sessions, "s1", "first question", "second question", "third question")
+
+    assert len(session.summary) == 20
+    assert session.summary.endswith("second question")
+
+
+def test_sessions_survive_a_restart_and_eviction(sessions, tmp_path):
+    ask(sessions, "s1", "When is Jumuah?", "Is there parking?", "Who gives the khutbah?")
+    sessions.close()
+
+    restarted = SessionStore(max_sessions=1, max_turns=2, db_path=str(tmp_path / "sessions.db"))
+    ask(restarted, "s2", "Where is the clinic?")
+    session = restarted.get("s1")
+    restarted.close()
+
+    assert restarted.stats()["sessions_in_memory"] == 1
+    assert session.summary == "When is Jumuah?"
+    assert len(session.turns) == 4
+
+
+def test_missing_or_expired_sessions_start_fresh(sessions, clock):
+    new = sessions.get(None)
+    assert new.is_new and new.session_id
+
+    ask(sessions, "s1", "When is Jumuah?")
+    clock.advance(3601)
+
+    assert sessions.get("s1").is_new
+
+
+def test_prune_drops_expired_sessions(sessions, clock):
+    ask(sessions, "old", "When is Jumuah?")
+    clock.advance(3000)
+    ask(sessions, "fresh", "Is there parking?")
+    clock.advance(1000)
+
+    assert sessions.prune() == 1
+    assert sessions.stats()["sessions_in_memory"] == 1
+    assert sessions._load("old") is None
+    assert sessions.get("fresh").turns
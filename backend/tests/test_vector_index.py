@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from vector_index import NumpyVectorIndex, normalize_rows, quantize_int8
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(50, 16))
+
+
+@pytest.fixture
+def filled_store(store, vectors):
+    ids = [f"doc-{i}" for i in range(len(vectors))]
+    store.collection.upsert(ids, [f"text of {doc_id}" for doc_id in ids], [{"source": doc_id} for doc_id in ids], vectors)
+    return store
+
+
+def test_quantize_int8_of_nothing_is_empty():
+    quantized, scales = quantize_int8(np.zeros((0, 0), dtype=np.float32))
+    assert quantized.shape == (0, 0) and quantized.dtype == np.int8
+    assert scales.shape == (0,)
+
+
+def test_quantize_int8_round_trips_closely():
+    vectors = normalize_rows(np.random.default_rng(1).normal(size=(20, 64)))
+    quantized, scales = quantize_int8(vectors)
+    restored = quantized.astype(np.float32) * scales[:, None]
+    assert np.abs(restored - vectors).max() <= scales.max() / 2 + 1e-6
+    # All-zero rows keep a usable scale instead of dividing by zero
+    assert quantize_int8(np.zeros((1, 4), dtype=np.float32))[1][0] == 1.0
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_query_finds_the_nearest_documents(filled_store, vectors, dtype):
+    index = NumpyVectorIndex(filled_store, dtype)
+    result = index.query(vectors[7] + 0.01, n_results=3)
+    assert result["ids"][0][0] == "doc-7"
+    assert result["documents"][0][0] == "text of doc-7"
+    assert result["metadatas"][0][0] == {"source": "doc-7"}
+    distances = result["distances"][0]
+    assert distances == sorted(distances)
+    assert distances[0] == pytest.approx(0, abs=0.01)
+    assert index.stats()["dtype"] == dtype and index.stats()["documents"] == 50
+
+
+def test_int8_ranks_like_float32(filled_store, vectors):
+    queries = np.random.default_rng(2).normal(size=(5, vectors.shape[1]))
+    exact = NumpyVectorIndex(filled_store, "float32").query_batch(queries, n_results=5)
+    approximate = NumpyVectorIndex(filled_store, "int8").query_batch(queries, n_results=5)
+    for exact_ids, approximate_ids in zip(exact["ids"], approximate["ids"]):
+        assert exact_ids[0] == approximate_ids[0]
+        assert len(set(exact_ids) & set(approximate_ids)) >= 4
+
+
+def test_get_skips_unknown_ids(filled_store):
+    found = NumpyVectorIndex(filled_store).get(["doc-3", "missing", "doc-1"])
+    assert found["ids"] == ["doc-3", "doc-1"]
+    assert found["documents"] == ["text of doc-3", "text of doc-1"]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_empty_collection_returns_no_results(store, dtype):
+    index = NumpyVectorIndex(store, dtype)
+    result = index.query([0.1, 0.2, 0.3], n_results=3)
+    assert result["ids"] == [[]] and result["distances"] == [[]]
+    assert len(index) == 0
+
+
+def test_new_generation_is_exported_and_loaded(filled_store, vectors):
+    index = NumpyVectorIndex(filled_store)
+    assert index.query(vectors[0], n_results=1)["ids"] == [["doc-0"]]
+
+    filled_store.collection.delete([f"doc-{i}" for i in range(len(vectors))])
+    filled_store.collection.upsert(["fresh"], ["fresh text"], [{}], [vectors[0]])
+    # Same generation: the existing export is still used
+    assert index.query(vectors[0], n_results=1)["ids"] == [["doc-0"]]
+    filled_store.mark_ingested()
+    assert index.query(vectors[0], n_results=1)["ids"] == [["fresh"]]
+    assert len(index) == 1
+
+    # Another process sharing the directory loads the export instead of rebuilding it
+    filled_store.collection.delete(["fresh"])
+    assert NumpyVectorIndex(filled_store).get(["fresh"])["ids"] == ["fresh"]
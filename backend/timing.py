@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StageTimer:
+    """
+    Collects wall-clock durations of the named stages of one request.
+
+    Durations are in milliseconds and accumulate if a stage runs more than
+    once. `server_timing()` renders them as a `Server-Timing` header value,
+    so browsers' dev tools and the benchmark can read them from responses.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - started) * 1000)
+
+    def add(self, stage: str, milliseconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + milliseconds
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_dict(self) -> Dict[str, float]:
+        return {stage: round(ms, 3) for stage, ms in self.stages.items()}
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={ms:.3f}" for stage, ms in self.stages.items())
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """
+    Parses a `Server-Timing` header into {stage: milliseconds}.
+
+    Args:
+        header (str): The header value, e.g. "embed;dur=3.1, search;dur=7.4".
+
+    Returns:
+        Dict[str, float]: Stage durations; entries without a duration are skipped.
+    """
+    stages = {}
+    for entry in header.split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    stages[name] = float(param[4:])
+                except ValueError:
+                    pass
+    return stages
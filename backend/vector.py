@@ -1,43 +1,159 @@
-from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.documents import Document
-import os
-import pandas as pd
-df = pd.read_csv("ICF-events.csv")
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")
-#print(df.to_string())
-db_location = "./chrome_langchain_db"
-add_documents = not os.path.exists(db_location)
-
-if add_documents:
-    documents = []
-    ids = []
-    
-    for i, row in df.iterrows():
-        
-        document = Document(
-            page_content=row["Title"] + " " + row["Room"],
-            metadata={"time": row["Time"], "date": row["Date"]},
-            id=str(i)
-        )
-        ids.append(str(i))
-      
-        documents.append(document)
-        
-vector_store = Chroma(
-    collection_name="restaurant_reviews",
-    persist_directory=db_location,
-    embedding_function=embeddings
-)
-
-
-if add_documents:
-    vector_store.add_documents(documents=documents, ids=ids)
-    
-retriever = vector_store.as_retriever(
-    search_kwargs={"k": 5}
-)
-#        document = Document(
- #           page_content=row["Date"] + " " + row["Time"]+ " " + row["Room"]+ " "+row["Title"],
-  #          id=str(i)
-   #     )
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+CSV_PATH = "ICF-events.csv"
+db_location = "./chrome_langchain_db"
+BUILT_MARKER = ".built"
+# Before stores were versioned, the one store was built straight into `db_location`
+LEGACY_DATABASE = "chroma.sqlite3"
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def _load_documents():
+    # pandas and langchain are only needed when the store is first built
+    import pandas as pd
+    from langchain_core.documents import Document
+
+    df = pd.read_csv(CSV_PATH)
+    #print(df.to_string())
+    documents = []
+    ids = []
+
+    for i, row in df.iterrows():
+
+        document = Document(
+            page_content=row["Title"] + " " + row["Room"],
+            metadata={"time": row["Time"], "date": row["Date"]},
+            id=str(i)
+        )
+        ids.append(str(i))
+
+        documents.append(document)
+    return documents, ids
+
+
+def _built_versions():
+    """Fully built store directories under `db_location`, newest first."""
+    if not os.path.isdir(db_location):
+        return []
+    built = [
+        name for name in os.listdir(db_location)
+        if os.path.exists(os.path.join(db_location, name, BUILT_MARKER))
+    ]
+    return sorted(built, key=lambda name: os.path.getmtime(os.path.join(db_location, name, BUILT_MARKER)), reverse=True)
+
+
+def _has_legacy_store():
+    return os.path.exists(os.path.join(db_location, LEGACY_DATABASE))
+
+
+def _is_uuid(name):
+    try:
+        uuid.UUID(name)
+        return True
+    except ValueError:
+        return False
+
+
+def _remove_legacy_store():
+    """Deletes the unversioned store: its SQLite file and Chroma's UUID-named segment directories."""
+    if not _has_legacy_store():
+        return
+    os.remove(os.path.join(db_location, LEGACY_DATABASE))
+    for name in os.listdir(db_location):
+        path = os.path.join(db_location, name)
+        if _is_uuid(name) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _store_version():
+    """
+    The store directory to open: a name under `db_location`, or None for the legacy store at its root.
+
+    Stores are named after the CSV's contents, so an edited sheet gets a fresh
+    store instead of being ignored.
+    """
+    try:
+        with open(CSV_PATH, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except FileNotFoundError:
+        versions = _built_versions()
+        if versions:
+            return versions[0]
+        if _has_legacy_store():
+            return None
+        raise
+
+
+def get_retriever():
+    """
+    Returns the LangChain retriever over the events CSV, opening it on first use.
+
+    Nothing is imported or read when this module is imported; the first call
+    loads langchain and opens the Chroma store for the current CSV. Each
+    version of the CSV is embedded into its own directory under
+    `db_location`, marked as built only once every row is in, so an edited
+    sheet is picked up, a half-built store is never used, and the store of
+    the previous sheet stays on disk until the next one replaces it.
+
+    A store built into `db_location` itself by earlier releases is still
+    served while there is no CSV to build from, and is deleted once a
+    versioned store has been built.
+
+    Returns:
+        VectorStoreRetriever: A retriever returning the 5 closest events.
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                from langchain_chroma import Chroma
+                from langchain_ollama import OllamaEmbeddings
+
+                embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+                version = _store_version()
+                if version is None:
+                    persist_directory, add_documents = db_location, False
+                else:
+                    persist_directory = os.path.join(db_location, version)
+                    add_documents = not os.path.exists(os.path.join(persist_directory, BUILT_MARKER))
+                if add_documents:
+                    # Left over from an interrupted build
+                    shutil.rmtree(persist_directory, ignore_errors=True)
+
+                vector_store = Chroma(
+                    collection_name="restaurant_reviews",
+                    persist_directory=persist_directory,
+                    embedding_function=embeddings
+                )
+
+                if add_documents:
+                    documents, ids = _load_documents()
+                    vector_store.add_documents(documents=documents, ids=ids)
+                    open(os.path.join(persist_directory, BUILT_MARKER), "w").close()
+                    # Keep the new store and the one before it
+                    for old in _built_versions()[2:]:
+                        shutil.rmtree(os.path.join(db_location, old), ignore_errors=True)
+                    _remove_legacy_store()
+
+                _retriever = vector_store.as_retriever(
+                    search_kwargs={"k": int(os.getenv("RETRIEVAL_N_RESULTS", "5"))}
+                )
+    return _retriever
+
+
+def __getattr__(name):
+    # `from vector import retriever` keeps working, but only builds the store when it is asked for
+    if name == "retriever":
+        return get_retriever()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+#        document = Document(
+ #           page_content=row["Date"] + " " + row["Time"]+ " " + row["Room"]+ " "+row["Title"],
+  #          id=str(i)
+   #     )
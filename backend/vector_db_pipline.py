@@ -1,19 +1,26 @@
+import argparse
+import json
+import mmap
 import os
-from typing import List
+from typing import Iterator, List, Optional, Tuple, Union
 
-import chromadb
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
-from bs4.element import Comment
 
-HTML_DIR = "./html_files"
+from chunking import BoilerplateFilter, TokenChunker, extract_blocks
+from encoder import encode_texts
+from keyword_index import get_keyword_index
+from manifest import IngestManifest, chunk_id, manifest_path
+from prayer_times import CENTER_INFO, PRAYER_TIMES_URL
+from retrieval import ChromaStore, get_store
 
-from urllib.parse import urljoin, urlparse
+HTML_DIR = "./html_files"
+SNAPSHOT_INDEX = "urls.json"
+ABOUT_US_TEXT = """The Islamic Center of Frisco was established in May 2007. We are located approximately 27 miles north of downtown Dallas. Along with providing daily prayer facilities, ICF also offers various Islamic education services including our successful Quran Academy, Sunday School, and Safwah Seminary educational programs, a vibrant youth group, educational seminars, youth and adult education classes, summer school, nikkah services, and Islamic counseling."""
 
-VISITED = set()
+from urllib.parse import urlparse
 
-header_and_footer = True
+EXCLUDED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pdf', '.img')
 
 def is_internal(url):
     return urlparse(url).netloc in ("friscomasjid.org", "www.friscomasjid.org")
@@ -25,56 +32,21 @@ def sanitize_filename(url):
 
 
 def download_html_assets_recursive(url: str, save_dir: str = HTML_DIR):
-    if url in VISITED or not is_internal(url):
-        return
-    VISITED.add(url)
+    """
+    Crawls every internal page reachable from `url` and saves it under `save_dir`.
 
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Save page
-        os.makedirs(save_dir, exist_ok=True)
-        filename = sanitize_filename(url) + ".html"
-        with open(os.path.join(save_dir, filename), "w", encoding="utf-8") as f:
-            f.write(response.text)
-        print(f"[✓] Saved: {url}")
-
-        # Recurse
-        for link in soup.find_all("a", href=True):
-            next_url = urljoin(url, link["href"])
-            download_html_assets_recursive(next_url, save_dir)
+    Kept for existing callers; the work is done by the concurrent crawler.
 
-    except Exception as e:
-        print(f"[✗] Failed at {url}: {e}")
-        
-def get_filtered_absolute_links(url, domain):
-    try:
-        counter = 0
-        response = requests.get(url)
-        response.raise_for_status()  
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        links = soup.find_all('a')
-
-        absolute_links = set()
-        excluded_extensions = ('.png', '.jpg', '.jpeg', '.pdf', '.img')
-        
-        for link in links:
-            href = link.get('href')
-            if href:
-                absolute_link = urljoin(url, href) 
-                if (absolute_link.startswith(domain) and not any(absolute_link.endswith(ext) for ext in excluded_extensions)):
-                    print(absolute_link)
-                    absolute_links.add(absolute_link)
-                    counter+=1
-        print(len(absolute_links))
-        return absolute_links
-
-    except requests.RequestException as e:
-        print(f"Error fetching {url}: {e}")
-        return {}
+    Args:
+        url (str): The start URL.
+        save_dir (str): Directory to save the pages in.
+
+    Returns:
+        List[str]: The URLs that were saved.
+    """
+    from crawler import crawl_site
+
+    return [page.url for page in crawl_site(url, save_dir).pages]
 
 
 def load_html_files_from_directory(directory: str) -> list[str]:
@@ -106,172 +78,371 @@ def load_html_files_from_directory(directory: str) -> list[str]:
     return html_contents
 
 
-def extract_text_from_html(html_content: str) -> List[str]:
-    from itertools import chain
-
-    def chunk_text(texts: List[str], chunk_size=250, overlap=50) -> List[str]:
-        """
-        Combine and chunk text segments into overlapping chunks of words.
-        """
-        all_text = " ".join(texts)
-        words = all_text.split()
-        chunks = []
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = words[i : i + chunk_size]
-            if len(chunk) >= 30:
-                chunks.append(" ".join(chunk))
-        return chunks
-    
-    response = requests.get(html_content)
-    html = response.text
-
-    # Step 2: Use BeautifulSoup to parse it
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Step 3: Function to filter visible elements
-    def tag_visible(element):
-        if element.parent.name in ['style', 'script', 'head', 'title', 'meta', '[document]']:
-            return False
-        if isinstance(element, Comment):
-            return False
-        return True
+def iter_html_snapshot(directory: str = HTML_DIR) -> Iterator[Tuple[str, mmap.mmap]]:
+    """
+    Yields every saved page in a crawl snapshot as a read-only memory map.
+
+    Each map is closed when the iterator advances, so callers must finish
+    with one page before asking for the next.
 
-    # Step 4: Extract visible text
-    texts = soup.find_all(string=True)
-    visible_texts = filter(tag_visible, texts)
-    visible_strings = [t.strip() for t in visible_texts if t.strip()]
-    visible_strings = visible_strings[265:]
-    visible_strings = visible_strings[:-23]
+    Args:
+        directory (str): Directory the crawler saved pages into.
 
-    # Chunk long combined text
-    chunked_segments = chunk_text(visible_strings)
+    Yields:
+        Tuple[str, mmap.mmap]: The page URL and its memory-mapped HTML.
+    """
+    if not os.path.exists(directory):
+        print(f"[✗] Directory '{directory}' does not exist.")
+        return
 
-    for text in visible_strings:
-        print(text)
+    index_path = os.path.join(directory, SNAPSHOT_INDEX)
+    if not os.path.exists(index_path):
+        print(f"[✗] No {SNAPSHOT_INDEX} in '{directory}'; crawl the site once before an offline rebuild.")
+        return
+    with open(index_path, "r", encoding="utf-8") as f:
+        urls_by_file = json.load(f)
+
+    for filename, url in sorted(urls_by_file.items()):
+        filepath = os.path.join(directory, filename)
+        try:
+            with open(filepath, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield url, mapped
+        except OSError as e:
+            print(f"[✗] Could not read {filename}: {e}")
+
+
+def fetch_page(url: str, manifest: Optional[IngestManifest] = None) -> Optional[requests.Response]:
+    """
+    Fetches a page, sending the validators recorded on the last ingestion run.
 
-    print(chunked_segments)
+    Args:
+        url (str): The page URL.
+        manifest (Optional[IngestManifest]): Manifest holding the page's ETag / Last-Modified.
 
-    return list(set(chunked_segments))
+    Returns:
+        Optional[requests.Response]: The response, or None if the server answered 304 Not Modified.
+    """
+    headers = manifest.conditional_headers(url) if manifest else {}
+    response = requests.get(url, headers=headers, timeout=10)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response
+
+
+def extract_text_from_html(
+    html_content: Union[str, bytes, mmap.mmap],
+    parser: str = "html.parser",
+    boilerplate: Optional[BoilerplateFilter] = None,
+    chunker: Optional[TokenChunker] = None,
+) -> List[str]:
+    """
+    Extracts the page's own content as ordered, token-sized chunks.
+
+    Navigation, header and footer blocks are recognised by how often they
+    repeat across the site (see `chunking.BoilerplateFilter`) instead of by
+    fixed offsets into the page's strings.
+
+    Args:
+        html_content: The page HTML.
+        parser (str): BeautifulSoup parser backend.
+        boilerplate (Optional[BoilerplateFilter]): Learned boilerplate; defaults to the saved one.
+        chunker (Optional[TokenChunker]): Chunker to use; defaults to a `TokenChunker()`.
+
+    Returns:
+        List[str]: The chunk texts, in page order.
+    """
+    blocks = extract_blocks(html_content, parser)
+    if boilerplate is None:
+        boilerplate = BoilerplateFilter()
+    if chunker is None:
+        chunker = TokenChunker()
+    return [chunk.text for chunk in chunker.chunk(boilerplate.filter(blocks))]
 
 
-def vectorize_text_segments(text_segments: List[str]) -> List[List[float]]:
+def vectorize_text_segments(text_segments: List[str]) -> np.ndarray:
     """
-    Converts a list of text segments into embeddings using OpenAI.
+    Converts a list of text segments into embeddings using the shared SentenceTransformer.
+
+    Segments embedded by an earlier run (or asked before as a query) come
+    from the persistent embedding cache instead of the model.
 
     Args:
         text_segments (List[str]): List of textual content to vectorize.
 
     Returns:
-        List[List[float]]: A list of vector embeddings.
+        np.ndarray: A float32 matrix with one embedding per row. It is kept as an
+        array (a quarter of the memory of nested Python float lists) all the way to Chroma.
     """
-    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    embeddings = model.encode(text_segments, convert_to_numpy=True).tolist()
-    return embeddings
+    return encode_texts(text_segments)
 
 
 def upload_embeddings_to_chroma(
-    embeddings: List[List[float]], documents: List[str], ids: List[str]
+    embeddings: np.ndarray,
+    documents: List[str],
+    ids: List[str],
+    metadatas: Optional[List[dict]] = None,
+    store: Optional[ChromaStore] = None,
 ):
     """
     Uploads vector embeddings along with their original documents into a persistent Chroma database.
 
     Args:
-        embeddings (List[List[float]]): List of embedding vectors.
+        embeddings (np.ndarray): Float32 matrix of embedding vectors.
         documents (List[str]): List of original text documents.
         ids (List[str]): Unique identifiers for each document.
+        metadatas (Optional[List[dict]]): Per-document metadata such as the source URL and chunk position.
+        store (Optional[ChromaStore]): The collection version to write to; defaults to the served one.
 
     Returns:
-        None
+        bool: Whether the upload succeeded; callers only record the chunks as ingested if it did.
     """
     try:
-        # ✅ Initialize persistent ChromaDB client
-        client = chromadb.PersistentClient(path="chroma")
-
-        # ✅ Create or connect to a collection
-        collection = client.get_or_create_collection(name="frisco_events")
-        #client.delete_collection("frisco_events")
-
-        # ✅ Upload documents, embeddings, and their IDs
-        collection.add(documents=documents, embeddings=embeddings, ids=ids)
+        # ✅ Reuse the process-wide ChromaDB client and collection
+        store = store or get_store()
+        collection = store.collection
+
+        # ✅ Upload documents, embeddings, and their IDs (IDs are content-derived, so re-uploads overwrite)
+        collection.upsert(documents=documents, embeddings=embeddings, ids=ids, metadatas=metadatas)
+        # ✅ Keep the keyword index in step with the collection
+        keyword_index = get_keyword_index(store.path, store.collection_name)
+        keyword_index.add(ids, documents)
+        keyword_index.save()
+        # ✅ Invalidate answers cached against the old contents
+        store.mark_ingested()
 
         print(f"[✓] Uploaded {len(ids)} embeddings to ChromaDB.")
+        return True
 
     except Exception as e:
         print(f"[✗] Failed to upload to ChromaDB: {e}")
+        return False
+
 
-def extract_prayer_times_and_contact():
-    response = requests.get("https://services.madinaapps.com/kiosk-rest/clients/242/prayerTimes")
-    contact_string = """
-    About Us The Islamic Center of Frisco was established in May 2007. We are located approximately 27 miles north of downtown Dallas.  Along with providing
-    daily prayer facilities, ICF also offers various Islamic education services including our successful Quran Academy, Sunday School, and Safwah Seminary
-    educational programs, a vibrant youth group, educational seminars, youth and adult education classes, summer school, nikkah services, and Islamic counseling. 
-    Contact Us Address: 11137 Frisco St, Frisco TX 75033 Main Phone: (469) 252-4532 | Clinic Phone: (469) 213-8707 | contact@friscomasjid.org EIN: 20-8679388
+def delete_from_chroma(ids: List[str], store: Optional[ChromaStore] = None):
     """
-    upload_embeddings_to_chroma(vectorize_text_segments(contact_string), contact_string, "doc_-1_-1")
-    return response.text.split("]")
+    Deletes documents that no longer exist on the site from the Chroma collection.
 
-def html_to_chroma_pipeline(url: str, i: int) -> bool:
-    #print(f"\n🌐 Step 1: Crawling {url}")
-    #download_html_assets_recursive(url)
+    Args:
+        ids (List[str]): IDs of the documents to delete.
+        store (Optional[ChromaStore]): The collection version to delete from; defaults to the served one.
 
-    #print("📂 Step 2: Loading HTML files...")
-    #html_files = load_html_files_from_directory(HTML_DIR)
-    #print(f"  └ Loaded {len(html_files)} HTML file(s)")
+    Returns:
+        bool: Whether the documents are gone; on failure callers keep them in the manifest to retry.
+    """
+    if not ids:
+        return True
+    try:
+        store = store or get_store()
+        store.collection.delete(ids=ids)
+        keyword_index = get_keyword_index(store.path, store.collection_name)
+        keyword_index.remove(ids)
+        keyword_index.save()
+        store.mark_ingested()
+        print(f"[✓] Deleted {len(ids)} stale document(s) from ChromaDB.")
+        return True
+
+    except Exception as e:
+        print(f"[✗] Failed to delete from ChromaDB: {e}")
+        return False
 
-    all_text_segments = []
-    all_ids = []
+def extract_prayer_times_and_contact() -> List[str]:
+    """
+    Returns the segments ingested under the prayer-times URL: the About Us and contact text.
+
+    Prayer times themselves are no longer embedded; the API serves them from
+    the background-refreshed table in `prayer_times`, so they are never
+    stale. The contact text is kept in the collection for questions that
+    mention it alongside other topics, and goes through the same chunk IDs
+    and manifest as every other page (fragments embedded by earlier runs
+    are deleted as stale).
+
+    Returns:
+        List[str]: The segments.
+    """
+    contact_string = (
+        f"About Us {ABOUT_US_TEXT} Contact Us Address: {CENTER_INFO.address} Main Phone: {CENTER_INFO.main_phone} | "
+        f"Clinic Phone: {CENTER_INFO.clinic_phone} | {CENTER_INFO.email} EIN: {CENTER_INFO.ein}"
+    )
+    return [contact_string]
+
+def html_to_chroma_pipeline(
+    url: str,
+    manifest: Optional[IngestManifest] = None,
+    html: Optional[Union[str, bytes, mmap.mmap]] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    segments: Optional[List[str]] = None,
+    store: Optional[ChromaStore] = None,
+) -> bool:
+    """
+    Extracts, embeds and uploads one page, touching only chunks that changed.
+
+    Args:
+        url (str): The page URL.
+        manifest (Optional[IngestManifest]): Record of the previous ingestion run.
+        html: The page HTML if it was already fetched (by the crawler or from the
+            on-disk snapshot); otherwise the page is fetched here.
+        etag (Optional[str]): ETag the already-fetched HTML was served with.
+        last_modified (Optional[str]): Last-Modified the already-fetched HTML was served with.
+        segments (Optional[List[str]]): Segments already extracted from the page (e.g. by
+            `extraction.parallel_extract`); skips fetching and parsing entirely.
+        store (Optional[ChromaStore]): The collection version to write to; defaults to the served one.
+
+    Returns:
+        bool: True if the page passed the About Us validation check.
+    """
+    if manifest is None:
+        manifest = IngestManifest()
 
     print("📝 Step 3: Extracting text segments from HTML...")
 
-    if(url != "https://services.madinaapps.com/kiosk-rest/clients/242/prayerTimes"):
-        segments = extract_text_from_html(url)
+    if segments is not None:
+        pass
+    elif(url != PRAYER_TIMES_URL):
+        if html is None:
+            response = fetch_page(url, manifest)
+            if response is None:
+                print(f"[✓] Unchanged since last run: {url}")
+                return True
+            html = response.content
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        segments = extract_text_from_html(html)
     else:
         segments = extract_prayer_times_and_contact()
         #print(f"  └ File {i}: extracted {len(segments)} segments")
-    all_text_segments.extend(segments)
-    all_ids.extend([f"doc_{i}_{j}" for j in range(len(segments))])
 
-    if not all_text_segments:
+    # Stable, content-derived IDs; a chunk repeated on the page is stored once.
+    # Dicts keep insertion order, so chunks stay in page order.
+    segments_by_id = {}
+    for segment in segments:
+        segments_by_id.setdefault(chunk_id(url, segment), segment)
+    positions = {doc_id: index for index, doc_id in enumerate(segments_by_id)}
+
+    if not segments_by_id:
         print("[✗] No text segments extracted. Exiting.")
         return
 
-    print(f"\n🔍 Total text segments to embed: {len(all_text_segments)}")
+    old_ids = set(manifest.chunk_ids(url))
+    new_ids = [doc_id for doc_id in segments_by_id if doc_id not in old_ids]
+    stale_ids = [doc_id for doc_id in old_ids if doc_id not in segments_by_id]
 
-    print("🧠 Step 4: Vectorizing text segments ...")
-    embeddings = vectorize_text_segments(all_text_segments)
-    print(f"  └ Got {len(embeddings)} embeddings")
+    print(f"\n🔍 Text segments to embed: {len(new_ids)} new or changed, {len(segments_by_id) - len(new_ids)} unchanged")
 
-    if not embeddings:
-        print("[✗] Embedding generation failed or returned nothing.")
-        return
+    if new_ids:
+        print("🧠 Step 4: Vectorizing text segments ...")
+        new_segments = [segments_by_id[doc_id] for doc_id in new_ids]
+        embeddings = vectorize_text_segments(new_segments)
+        print(f"  └ Got {len(embeddings)} embeddings")
+
+        if len(embeddings) == 0:
+            print("[✗] Embedding generation failed or returned nothing.")
+            return
+
+        print("📤 Step 5: Uploading to ChromaDB...")
+        metadatas = [{"source": url, "chunk_index": positions[doc_id]} for doc_id in new_ids]
+        if not upload_embeddings_to_chroma(embeddings, new_segments, new_ids, metadatas, store):
+            # Not recorded in the manifest, so the next run tries the page again
+            return False
 
-    print("📤 Step 5: Uploading to ChromaDB...")
-    upload_embeddings_to_chroma(embeddings, all_text_segments, all_ids)
+    if not delete_from_chroma(stale_ids, store):
+        return False
+    manifest.update(url, list(segments_by_id), etag=etag, last_modified=last_modified)
+    manifest.save()
 
     print("✅ Pipeline complete!")
 
-    segments123 = extract_text_from_html(url)
-    if all(""""The Islamic Center of Frisco was established in May 2007. We are located approximately 27 miles north of downtown Dallas. Along with providing daily prayer facilities, ICF also offers various Islamic education services including our successful Quran Academy, Sunday School, and Safwah Seminary educational programs, a vibrant youth group, educational seminars, youth and adult education classes, summer school, nikkah services, and Islamic counseling.""" not in element for element in segments123): 
+    # Validate against the segments we already extracted rather than fetching the page again
+    if all(ABOUT_US_TEXT not in element for element in segments): 
         return True
     return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest friscomasjid.org into ChromaDB.")
+    parser.add_argument("--offline", action="store_true",
+                        help=f"rebuild from the HTML snapshot in {HTML_DIR} without any network calls")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for HTML parsing and chunking (default: CPU count)")
+    parser.add_argument("--parser", default=None,
+                        help="BeautifulSoup parser: lxml, html.parser or auto (default: $HTML_PARSER or auto)")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="chunks per embedding / upsert batch")
+    # Applying the night's diff to the served collection costs only the diff. A new version costs a copy
+    # of every embedding (--versioned) or a full re-embed (--rebuild), so it is for changes worth validating.
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--in-place", dest="mode", action="store_const", const="in-place",
+                      help="apply the site's changes to the served collection (default)")
+    mode.add_argument("--versioned", dest="mode", action="store_const", const="versioned",
+                      help="copy the served collection into a new version, apply the changes there, "
+                           "validate and swap it in")
+    mode.add_argument("--rebuild", dest="mode", action="store_const", const="rebuild",
+                      help="ingest every page into an empty new version (e.g. after a chunking or model change), "
+                           "validate and swap it in")
+    parser.set_defaults(mode="in-place")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="build and validate a new version, but leave the swap to index_versions.py or /admin")
+    args = parser.parse_args()
+
+    from index_versions import CollectionVersions
+    from ingest_pipeline import IngestionPipeline, crawl_documents, snapshot_documents
+
     # Start crawling from homepage instead of just /programs/events
     website_url = "https://friscomasjid.org"
-    domain = "https://friscomasjid.org" 
-    filtered_links = {"https://services.madinaapps.com/kiosk-rest/clients/242/prayerTimes"}
-    filtered_links.update(get_filtered_absolute_links(website_url, domain))
-    for element in filtered_links:
-        print(element)
-    counter = 0
-    bad_links = []
-    for i, link in enumerate(filtered_links):
-        bad_links.append(link)
-        if(html_to_chroma_pipeline(link, i)):
-            counter+=1
-            bad_links.remove(link)
-    print(counter)
-    print(bad_links)
+    versions = CollectionVersions()
+    in_place = args.mode == "in-place"
+    # Otherwise queries keep hitting the served version while the new one is built
+    store = versions.store if in_place else versions.create(clone=args.mode == "versioned")
+    manifest = IngestManifest(manifest_path(store.path, store.collection_name))
+    unchanged_links = set()
+    failed_links = {}
+    unreached_links = set()
+
+    # The contact text is built locally, so it goes in offline too
+    html_to_chroma_pipeline(PRAYER_TIMES_URL, manifest, store=store)
+    unchanged_links.add(PRAYER_TIMES_URL)
+    if args.offline:
+        documents = snapshot_documents(HTML_DIR)
+    else:
+        # Crawl the whole site once; each page's HTML streams straight into extraction
+        documents = crawl_documents(website_url, manifest, on_unchanged=unchanged_links.add,
+                                    on_failed=failed_links.__setitem__, on_unreached=unreached_links.add)
+
+    # fetch → extract/chunk (process pool) → embed in batches → upsert in batches, with bounded queues between
+    pipeline = IngestionPipeline(manifest, store, batch_size=args.batch_size, workers=args.workers, parser=args.parser)
+    result = pipeline.run(documents)
+
+    # Pages that disappeared from the site take their chunks with them. A page the crawl couldn't fetch
+    # isn't gone, and a failure near the start page hides most of the site, so then nothing is deleted.
+    seen_links = result.seen_urls | unchanged_links
+    if failed_links:
+        print(f"[✗] {len(failed_links)} page(s) failed; keeping every page missing from this crawl:")
+        for link, error in sorted(failed_links.items()):
+            print(f"  {link}: {error}")
+    else:
+        for link in set(manifest.pages) - seen_links - unreached_links:
+            if delete_from_chroma(manifest.chunk_ids(link), store):
+                manifest.remove(link)
+    manifest.save()
+    print(len(seen_links) - len(result.bad_urls))
+    print(result.bad_urls)
     print()
     print()
-        
\ No newline at end of file
+
+    if not in_place:
+        report = versions.validate(store.collection_name)
+        if not report.ok:
+            print(f"[✗] {store.collection_name} failed validation; still serving {versions.active()}:")
+            for failure in report.failures:
+                print(f"  {failure}")
+            raise SystemExit(1)
+        if args.no_activate:
+            print(f"[✓] {store.collection_name} passed validation; activate it with "
+                  f"`python index_versions.py activate {store.collection_name}`")
+        else:
+            versions.activate(store.collection_name, validate=False)
+            versions.gc()
+            print(f"[✓] Now serving {store.collection_name}")
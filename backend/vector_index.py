@@ -0,0 +1,417 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from log_setup import get_logger
+from retrieval import ChromaStore, get_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent rebuilds aren't serialised across processes
+    fcntl = None
+
+logger = get_logger("vector_index")
+
+INDEX_DIRECTORY = "numpy_index_{collection}"
+META_FILE = "meta.json"
+LOCK_FILE = "lock"
+DTYPES = ("float32", "int8")
+# Rows converted to float32 at a time when scoring an int8 matrix, bounding the temporary copy
+INT8_BLOCK_ROWS = 8192
+
+
+def index_directory(path: str, collection_name: str) -> str:
+    return os.path.join(path, INDEX_DIRECTORY.format(collection=collection_name))
+
+
+def vector_backend_name() -> str:
+    backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown VECTOR_BACKEND {backend!r}; expected 'chroma' or 'numpy'")
+    return backend
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes rows to int8 with one scale per row.
+
+    Args:
+        vectors (np.ndarray): Float rows, normally unit length.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The int8 rows and the float32 scale that maps each back.
+    """
+    if vectors.size == 0:
+        return np.zeros(vectors.shape, dtype=np.int8), np.zeros(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+class _IndexState(NamedTuple):
+    # Swapped as a whole, so a query never mixes positions from one export with rows of another
+    vectors: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Optional[dict]]
+    positions: Dict[str, int]
+
+
+EMPTY_STATE = _IndexState(None, None, [], [], [], {})
+
+
+class NumpyVectorIndex:
+    """
+    Exact nearest-neighbour search over one contiguous matrix of normalized vectors.
+
+    The collection is small enough that a brute-force matrix product beats
+    walking an HNSW graph, and it needs no graph to load at startup. The
+    vectors are exported from the Chroma collection (which stays the source
+    of truth) into `.npy` files next to it, as float32 or as int8 with a
+    float32 scale per row (`VECTOR_INDEX_DTYPE`), and opened memory-mapped
+    read-only, so every uvicorn worker shares the same page-cache pages.
+
+    `query` and `query_batch` return Chroma-shaped results, with distances
+    as squared L2 between unit vectors (Chroma's default space), so the
+    index can stand in for `ChromaStore` in the retrievers. The export is
+    redone whenever the store's ingestion marker changes; the files carry
+    the marker in their names, so a process still reading the previous
+    export keeps its mapping until it reloads. Each collection version
+    gets its own export directory, so a swap loads the new version's files.
+    """
+
+    def __init__(self, store: ChromaStore, dtype: Optional[str] = None):
+        if dtype is None:
+            dtype = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector index dtype {dtype!r}; expected one of {DTYPES}")
+        self.store = store
+        self.dtype = dtype
+        self.directory = index_directory(store.path, store.collection_name)
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._state = EMPTY_STATE
+
+    @property
+    def path(self) -> str:
+        return self.store.path
+
+    @property
+    def collection_name(self) -> str:
+        return self.store.collection_name
+
+    def __len__(self) -> int:
+        return len(self._state.ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _files(self, generation: int) -> Dict[str, str]:
+        return {
+            "vectors": f"vectors-{self.dtype}-{generation}.npy",
+            "scales": f"scales-{generation}.npy",
+            "rows": f"rows-{generation}.json",
+        }
+
+    def refresh(self):
+        """Loads the export for the store's current generation, building it first if nobody has."""
+        generation = self.store.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            if generation == self._generation:
+                return
+            self.directory = index_directory(self.store.path, self.store.collection_name)
+            if not self.load(generation):
+                os.makedirs(self.directory, exist_ok=True)
+                # One process exports; the others wait here and then load its files
+                with open(self._path(LOCK_FILE), "a+b") as lock_file:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        if not self.load(generation):
+                            self.build(generation)
+                            self.load(generation)
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._generation = generation
+
+    def load(self, generation: int) -> bool:
+        """
+        Memory-maps the export for `generation`, if it exists in this index's dtype.
+
+        Args:
+            generation (int): The store's ingestion marker.
+
+        Returns:
+            bool: Whether an export was loaded.
+        """
+        try:
+            with open(self._path(META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        files = meta.get("files", {}).get(self.dtype)
+        if meta.get("generation") != generation or not files:
+            return False
+        try:
+            vectors = np.load(self._path(files["vectors"]), mmap_mode="r")
+            scales = np.load(self._path(files["scales"]), mmap_mode="r") if self.dtype == "int8" else None
+            with open(self._path(files["rows"]), encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return False
+        self._state = _IndexState(
+            vectors, scales, rows["ids"], rows["documents"], rows["metadatas"],
+            {doc_id: position for position, doc_id in enumerate(rows["ids"])},
+        )
+        return True
+
+    def build(self, generation: int, page_size: int = 1000):
+        """
+        Exports the collection's vectors, documents and metadata for `generation`.
+
+        Files of older generations are removed; processes that still map
+        them keep reading them until they reload.
+
+        Args:
+            generation (int): The store's ingestion marker the export is valid for.
+            page_size (int): Documents fetched from Chroma per request.
+        """
+        started = time.perf_counter()
+        collection = self.store.collection
+        ids: List[str] = []
+        documents: List[str] = []
+        metadatas: List[Optional[dict]] = []
+        pages: List[np.ndarray] = []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"] or [None] * len(page["ids"]))
+            pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+            offset += len(page["ids"])
+
+        vectors = normalize_rows(np.concatenate(pages)) if pages else np.zeros((0, 0), dtype=np.float32)
+        files = self._files(generation)
+        if self.dtype == "int8":
+            vectors, scales = quantize_int8(vectors)
+            self._save_array(files["scales"], scales)
+        self._save_array(files["vectors"], vectors)
+        self._save_json(files["rows"], {"ids": ids, "documents": documents, "metadatas": metadatas})
+
+        meta = self._read_meta()
+        if meta.get("generation") != generation:
+            meta = {"generation": generation, "files": {}}
+        meta["dim"] = int(vectors.shape[1]) if vectors.size else 0
+        meta["count"] = len(ids)
+        meta["files"][self.dtype] = files
+        self._save_json(META_FILE, meta)
+        self._remove_stale(meta)
+        logger.info("Exported %d vectors (%s) in %.1f ms", len(ids), self.dtype, (time.perf_counter() - started) * 1000)
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._path(META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_array(self, name: str, array: np.ndarray):
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, self._path(name))
+
+    def _save_json(self, name: str, data: dict):
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path(name))
+
+    def _remove_stale(self, meta: dict):
+        keep = {META_FILE, LOCK_FILE} | {name for files in meta["files"].values() for name in files.values()}
+        for name in os.listdir(self.directory):
+            if name not in keep and not name.endswith(".tmp"):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+
+    def scores(self, query_embeddings: np.ndarray, state: Optional[_IndexState] = None) -> np.ndarray:
+        """
+        Cosine similarity of every query against every indexed vector.
+
+        Args:
+            query_embeddings (np.ndarray): One query per row.
+            state (Optional[_IndexState]): The export to score against; defaults to the current one.
+
+        Returns:
+            np.ndarray: A (queries, documents) float32 matrix.
+        """
+        state = state or self._state
+        queries = normalize_rows(np.atleast_2d(query_embeddings))
+        vectors = state.vectors
+        if state.scales is None:
+            return queries @ vectors.T
+        scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+        for start in range(0, len(vectors), INT8_BLOCK_ROWS):
+            block = vectors[start:start + INT8_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = (queries @ block.T) * state.scales[start:start + len(block)]
+        return scores
+
+    def search(self, query_embeddings: np.ndarray, n_results: int,
+               state: Optional[_IndexState] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the `n_results` most similar vectors for each query.
+
+        Args:
+            query_embeddings (np.ndarray): One query per row.
+            n_results (int): How many neighbours to return per query.
+            state (Optional[_IndexState]): The export to search; defaults to the current one, refreshed first.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row positions and cosine similarities, best first, one row per query.
+        """
+        if state is None:
+            self.refresh()
+            state = self._state
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if state.vectors is None or not len(state.ids):
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        scores = self.scores(queries, state)
+        k = min(n_results, scores.shape[1])
+        if k < scores.shape[1]:
+            # Selects the top k in linear time; only those k are then sorted
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def query_batch(self, query_embeddings: Union[np.ndarray, Sequence[Sequence[float]]], n_results: int = 5) -> dict:
+        """
+        Runs several nearest-neighbour searches with one matrix product.
+
+        Args:
+            query_embeddings: The embedded queries, one per row.
+            n_results (int): How many documents to return per query.
+
+        Returns:
+            dict: A Chroma-shaped result with one list of `ids`, `documents`, `metadatas` and `distances` per query.
+        """
+        self.refresh()
+        # Read once: positions found in this export must index this export's rows
+        state = self._state
+        positions, scores = self.search(np.asarray(query_embeddings, dtype=np.float32), n_results, state)
+        return {
+            "ids": [[state.ids[p] for p in row] for row in positions],
+            "documents": [[state.documents[p] for p in row] for row in positions],
+            "metadatas": [[state.metadatas[p] for p in row] for row in positions],
+            # Squared L2 between unit vectors, the same scale Chroma reports by default
+            "distances": [[float(2 - 2 * s) for s in row] for row in scores],
+        }
+
+    def query(self, query_embedding: List[float], n_results: int = 5) -> dict:
+        """
+        Runs a nearest-neighbour search, like `ChromaStore.query`.
+
+        Args:
+            query_embedding (List[float]): The embedded query.
+            n_results (int): How many documents to return.
+
+        Returns:
+            dict: A Chroma-shaped query result.
+        """
+        return self.query_batch([query_embedding], n_results)
+
+    def get(self, ids: List[str]) -> dict:
+        """
+        Looks up documents by ID, like `ChromaStore.get`; unknown IDs are skipped.
+
+        Args:
+            ids (List[str]): Document IDs.
+
+        Returns:
+            dict: `ids`, `documents` and `metadatas` of the documents found.
+        """
+        self.refresh()
+        state = self._state
+        positions = [state.positions[doc_id] for doc_id in ids if doc_id in state.positions]
+        return {
+            "ids": [state.ids[p] for p in positions],
+            "documents": [state.documents[p] for p in positions],
+            "metadatas": [state.metadatas[p] for p in positions],
+        }
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "dtype": self.dtype,
+            "documents": len(state.ids),
+            "dim": int(state.vectors.shape[1]) if state.vectors is not None and state.vectors.ndim == 2 else 0,
+            "bytes": int(state.vectors.nbytes + (state.scales.nbytes if state.scales is not None else 0))
+            if state.vectors is not None else 0,
+        }
+
+
+_indexes: Dict[Tuple[str, str, str], NumpyVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(store: Optional[ChromaStore] = None, dtype: Optional[str] = None) -> NumpyVectorIndex:
+    """
+    Returns the process-wide NumPy index over a store.
+
+    Args:
+        store (Optional[ChromaStore]): The store to mirror; defaults to the process-wide one.
+        dtype (Optional[str]): "float32" or "int8"; defaults to `VECTOR_INDEX_DTYPE`.
+
+    Returns:
+        NumpyVectorIndex: The shared index.
+    """
+    store = store or get_store()
+    dtype = dtype or os.getenv("VECTOR_INDEX_DTYPE", "float32")
+    key = (store.path, store.name, dtype)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = NumpyVectorIndex(store, dtype)
+    return index
+
+
+def get_vector_backend(store: Optional[ChromaStore] = None) -> Union[ChromaStore, NumpyVectorIndex]:
+    """
+    Returns what vector searches should go to, per `VECTOR_BACKEND`.
+
+    `VECTOR_BACKEND=chroma` (the default) searches the Chroma collection's
+    HNSW index; `VECTOR_BACKEND=numpy` searches the `NumpyVectorIndex`
+    exported from it. Both provide `query()` and `get()`.
+
+    Args:
+        store (Optional[ChromaStore]): The store to search; defaults to the process-wide one.
+
+    Returns:
+        Union[ChromaStore, NumpyVectorIndex]: The backend.
+    """
+    store = store or get_store()
+    if vector_backend_name() == "numpy":
+        return get_vector_index(store)
+    return store
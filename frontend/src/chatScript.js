@@ -4,7 +4,8 @@ import "./chatStyling.css";
 const ChatComponent = () => {
   const chatDisplay = useRef(null);
   const messageInput = useRef(null);
-  const [conversationHistory, setConversationHistory] = useState([]);
+  // The server keeps the conversation history; we only send back its session ID
+  const [sessionId, setSessionId] = useState(null);
   const [userMessage, setUserMessage] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [chatDisplayHeight, setChatDisplayHeight] = useState(400);
@@ -67,19 +68,59 @@ const ChatComponent = () => {
     chatDisplay.current.appendChild(loading);
     chatDisplay.current.scrollTop = chatDisplay.current.scrollHeight;
 
-    fetch("http://localhost:5000/ask", {
+    fetch("http://localhost:5000/ask/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ question: msg, history: conversationHistory }),
+      body: JSON.stringify({ question: msg, session_id: sessionId }),
     })
-      .then((res) => res.json())
-      .then((data) => {
-        chatDisplay.current.removeChild(loading);
-        appendMessage(data.answer, "bot");
-        setConversationHistory(data.history);
+      .then(async (res) => {
+        if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+        // Show tokens as they arrive instead of waiting for the full answer
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        let botBubble = null;
+
+        const handleEvent = (rawEvent) => {
+          let eventName = "message";
+          let data = "";
+          rawEvent.split("\n").forEach((line) => {
+            if (line.startsWith("event:")) eventName = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          });
+          if (!data) return;
+          const payload = JSON.parse(data);
+
+          if (eventName === "error") throw new Error(payload.detail);
+          if (eventName === "done") {
+            setSessionId(payload.session_id);
+            return;
+          }
+          if (!botBubble) {
+            chatDisplay.current.removeChild(loading);
+            appendMessage("", "bot");
+            botBubble = chatDisplay.current.lastChild;
+          }
+          botBubble.textContent += payload.token;
+          chatDisplay.current.scrollTop = chatDisplay.current.scrollHeight;
+        };
+
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split("\n\n");
+          buffer = events.pop();
+          events.forEach(handleEvent);
+        }
+        if (!botBubble) {
+          chatDisplay.current.removeChild(loading);
+          appendMessage("", "bot");
+        }
       })
       .catch(() => {
-        chatDisplay.current.removeChild(loading);
+        if (loading.parentNode) chatDisplay.current.removeChild(loading);
         appendMessage("Error", "bot");
       })
       .finally(() => setIsLoading(false));